@@ -0,0 +1,154 @@
+import math
+from collections import deque
+
+# Оценки не выше порога считаются шумом и обнуляются перед сглаживанием
+NOISE_THRESHOLD = 0.05
+# Размер окна центрированного скользящего среднего
+SMOOTHING_WINDOW = 5
+
+
+class EmotionAggregator:
+    """Потоковая статистика временной шкалы эмоций с O(1) памяти на эмоцию
+
+    Точки подаются по одной по мере поступления предсказаний. Сглаженное значение
+    точки i - среднее порогованных оценок точек i-2..i+2 (на краях окно усекается),
+    поэтому оно выдается с задержкой в половину окна; finish() выдает остаток.
+    EmotionTimeline строит графики и сводку через этот же класс, поэтому
+    потоковые и пакетные результаты совпадают.
+    """
+
+    def __init__(self, emotions, noise_threshold=NOISE_THRESHOLD, smoothing_window=SMOOTHING_WINDOW):
+        self.emotions = tuple(emotions)
+        self.noise_threshold = noise_threshold
+        self.half_window = smoothing_window // 2
+        self.count = 0
+        self.finished = False
+
+        # Сырые оценки (только точки, где эмоция есть в предсказаниях): алгоритм Уэлфорда
+        self._raw_count = {emotion: 0 for emotion in self.emotions}
+        self._raw_mean = {emotion: 0.0 for emotion in self.emotions}
+        self._raw_m2 = {emotion: 0.0 for emotion in self.emotions}
+
+        # Сглаживание: последние точки, еще влияющие на несглаженные значения
+        self._times = deque(maxlen=2 * self.half_window + 1)
+        self._values = {emotion: deque(maxlen=2 * self.half_window + 1) for emotion in self.emotions}
+        self._emitted = 0
+        self._smoothed_sum = {emotion: 0.0 for emotion in self.emotions}
+
+        # Длительность преобладания: интервал до следующей точки засчитывается эмоции с максимумом
+        self._dominant_seconds = {emotion: 0.0 for emotion in self.emotions}
+        self._last_time = None
+        self._last_dominant = None
+        self._last_interval = 0.0
+
+    def update(self, point):
+        """Добавление точки шкалы
+
+        Returns:
+            list: Сглаженные точки, которые стали окончательными: (время, {эмоция: значение})
+        """
+        if self.finished:
+            raise RuntimeError("Агрегатор уже завершен")
+        scores = {pred['label'].lower(): pred['score'] for pred in point['emotions']}
+        time_point = point['time']
+
+        for emotion, score in scores.items():
+            if emotion in self._raw_count:
+                self._raw_count[emotion] += 1
+                delta = score - self._raw_mean[emotion]
+                self._raw_mean[emotion] += delta / self._raw_count[emotion]
+                self._raw_m2[emotion] += delta * (score - self._raw_mean[emotion])
+
+        if self._last_time is not None:
+            self._last_interval = time_point - self._last_time
+            if self._last_dominant is not None:
+                self._dominant_seconds[self._last_dominant] += self._last_interval
+        self._last_time = time_point
+        self._last_dominant = self._dominant(scores)
+
+        self._times.append(time_point)
+        for emotion in self.emotions:
+            score = scores.get(emotion, 0.0)
+            self._values[emotion].append(score if score > self.noise_threshold else 0.0)
+        self.count += 1
+
+        # Точка center получила все точки справа от себя
+        center = self.count - 1 - self.half_window
+        if center < 0:
+            return []
+        return [self._emit(center)]
+
+    def update_many(self, points):
+        emitted = []
+        for point in points:
+            emitted.extend(self.update(point))
+        return emitted
+
+    def finish(self):
+        """Завершение шкалы: сглаженные значения последних точек"""
+        if self.finished:
+            return []
+        emitted = [self._emit(index) for index in range(self._emitted, self.count)]
+        self.finished = True
+        return emitted
+
+    def _dominant(self, scores):
+        best, best_score = None, None
+        for emotion in self.emotions:
+            score = scores.get(emotion)
+            if score is not None and (best_score is None or score > best_score):
+                best, best_score = emotion, score
+        return best
+
+    def _window(self, index):
+        """Сглаженные значения точки index по хранимым последним точкам"""
+        first_kept = self.count - len(self._times)
+        start = max(0, index - self.half_window)
+        end = min(self.count, index + self.half_window + 1)
+        values = {
+            emotion: sum(list(self._values[emotion])[start - first_kept:end - first_kept]) / (end - start)
+            for emotion in self.emotions
+        }
+        return self._times[index - first_kept], values
+
+    def _emit(self, index):
+        time_point, values = self._window(index)
+        for emotion, value in values.items():
+            self._smoothed_sum[emotion] += value
+        self._emitted = index + 1
+        return time_point, values
+
+    def averages(self):
+        """Средние сглаженных порогованных значений (как если бы шкала закончилась сейчас)"""
+        if self.count == 0:
+            return {emotion: 0.0 for emotion in self.emotions}
+        totals = dict(self._smoothed_sum)
+        for index in range(self._emitted, self.count):
+            _, values = self._window(index)
+            for emotion, value in values.items():
+                totals[emotion] += value
+        return {emotion: total / self.count for emotion, total in totals.items()}
+
+    def raw_means(self):
+        """Средние сырых оценок по точкам, где эмоция присутствует"""
+        return {emotion: self._raw_mean[emotion] if self._raw_count[emotion] else 0.0
+                for emotion in self.emotions}
+
+    def variances(self):
+        """Выборочные дисперсии сырых оценок"""
+        return {emotion: self._raw_m2[emotion] / (self._raw_count[emotion] - 1)
+                if self._raw_count[emotion] > 1 else 0.0
+                for emotion in self.emotions}
+
+    def std_devs(self):
+        return {emotion: math.sqrt(variance) for emotion, variance in self.variances().items()}
+
+    def dominant_durations(self):
+        """Секунды, в течение которых эмоция была преобладающей
+
+        Последней точке засчитывается интервал, равный предыдущему шагу шкалы.
+        """
+        durations = dict(self._dominant_seconds)
+        if self._last_dominant is not None:
+            durations[self._last_dominant] += self._last_interval
+        return durations
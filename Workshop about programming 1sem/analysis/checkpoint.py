@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import logging
+from audio.ingest import audio_digest
+
+logger = logging.getLogger(__name__)
+
+# Каталог контрольных точек анализа (относительно рабочего каталога)
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_EXTENSION = ".ckpt"
+CHECKPOINT_VERSION = 1
+# Интервал сохранения в секундах аудио
+DEFAULT_CHECKPOINT_SECONDS = 30.0
+# Более короткие записи быстрее пересчитать, чем хешировать и сохранять
+MIN_CHECKPOINT_AUDIO_SECONDS = 120.0
+
+
+class TimelineCheckpoint:
+    """Контрольная точка расчета временной шкалы в отдельном файле
+
+    Первая строка файла - заголовок с ключом (хеш аудио, параметры окон, модель),
+    дальше каждая строка - JSON с точками, добавленными с прошлого сохранения, и
+    числом обработанных окон. Строки только дописываются, поэтому сохранение стоит
+    одной записи в конец файла; оборванная при падении последняя строка
+    отбрасывается при загрузке.
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self._saved_processed = 0
+        self._header_written = False
+
+    @classmethod
+    def for_audio(cls, audio_data, sample_rate, window_size, step, model_id, checkpoint_dir=CHECKPOINT_DIR):
+        """Контрольная точка для аудио и параметров анализа"""
+        key = {
+            'audio': audio_digest(audio_data),
+            'samples': int(len(audio_data)),
+            'sample_rate': int(sample_rate),
+            'window_size': float(window_size),
+            'step': float(step),
+            'model': model_id,
+        }
+        name = hashlib.blake2b(json.dumps(key, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+        return cls(os.path.join(checkpoint_dir, name + CHECKPOINT_EXTENSION), key)
+
+    def load(self):
+        """Сохраненные точки шкалы
+
+        Returns:
+            tuple: (точки, обработано окон); ([], 0), если контрольной точки нет или ключ другой
+        """
+        points, processed = [], 0
+        try:
+            with open(self.path, 'rb') as f:
+                header = json.loads(f.readline())
+                if header.get('version') != CHECKPOINT_VERSION or header.get('key') != self.key:
+                    logger.warning(f"Контрольная точка {self.path} не подходит, анализ с начала")
+                    return [], 0
+                self._header_written = True
+                valid_end = f.tell()
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    points.extend(record['points'])
+                    processed = record['processed']
+                    valid_end = f.tell()
+            # Оборванная запись удаляется, чтобы следующие дописывались после целых строк
+            if valid_end < os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid_end)
+        except FileNotFoundError:
+            return [], 0
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Не удалось прочитать контрольную точку {self.path}: {e}")
+            return [], 0
+        self._saved_processed = processed
+        return points, processed
+
+    def save(self, new_points, processed):
+        """Дописывание точек, рассчитанных с прошлого сохранения"""
+        try:
+            if not self._header_written:
+                # Новый файл (или замена неподходящего) начинается с заголовка
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps({'version': CHECKPOINT_VERSION, 'key': self.key}) + '\n')
+                self._header_written = True
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'processed': processed, 'points': new_points}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._saved_processed = processed
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить контрольную точку {self.path}: {e}")
+
+    def remove(self):
+        """Удаление после успешного завершения анализа"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Не удалось удалить контрольную точку {self.path}: {e}")
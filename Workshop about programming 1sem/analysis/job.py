@@ -0,0 +1,150 @@
+import time
+import logging
+import threading
+from analysis.checkpoint import (TimelineCheckpoint, DEFAULT_CHECKPOINT_SECONDS,
+                                 MIN_CHECKPOINT_AUDIO_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Первые результаты публикуются после этого числа окон, дальше - не чаще раза в интервал
+FIRST_PUBLISH_WINDOWS = 16
+PUBLISH_INTERVAL = 1.0
+# Параметры окон анализа по умолчанию, секунды
+DEFAULT_WINDOW_SIZE = 2.0
+DEFAULT_STEP = 0.5
+
+
+def validate_window_params(window_size, step):
+    """Проверка размера окна и шага анализа (секунды)"""
+    if window_size <= 0 or step <= 0:
+        raise ValueError("Размер окна и шаг анализа должны быть положительными")
+    return float(window_size), float(step)
+
+
+class TimelineJob:
+    """Отменяемый инкрементальный расчет временной шкалы эмоций
+
+    Новые точки шкалы передаются в publish порциями: первая - после
+    first_windows окон, следующие - не чаще раза в publish_interval секунд.
+    Отмена проверяется между батчами модели (при размере батча 1 - между окнами).
+
+    С checkpoint_dir готовые окна длинных записей периодически сохраняются в
+    контрольную точку; повторный запуск на том же аудио с теми же параметрами
+    продолжает с последнего сохраненного окна. Сохранение происходит на границе
+    батча, поэтому после продолжения батчи те же, что и при непрерывном расчете.
+    """
+
+    def __init__(self, predictor, audio_data, sample_rate, window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP,
+                 first_windows=FIRST_PUBLISH_WINDOWS, publish_interval=PUBLISH_INTERVAL,
+                 cancel_check=None, checkpoint_dir=None, checkpoint_seconds=DEFAULT_CHECKPOINT_SECONDS):
+        """
+        Args:
+            predictor: EmotionPredictor
+            cancel_check: Дополнительное условие отмены (например, флаг из другого процесса)
+            checkpoint_dir (str): Каталог контрольных точек; None - без контрольных точек
+            checkpoint_seconds (float): Интервал сохранения в секундах аудио
+        """
+        self.predictor = predictor
+        self.audio_data = audio_data
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.step = step
+        self.first_windows = first_windows
+        self.publish_interval = publish_interval
+        self.cancel_check = cancel_check
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_seconds = checkpoint_seconds
+        self._cancel_event = threading.Event()
+        self.timeline = []
+        self.processed = 0
+        self.total = 0
+
+    def cancel(self):
+        """Запрос отмены; расчет остановится после текущего батча"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set() or bool(self.cancel_check and self.cancel_check())
+
+    def run(self, publish=None):
+        """Расчет шкалы с публикацией частичных результатов
+
+        Args:
+            publish: Функция publish(новые точки, обработано окон, всего окон)
+
+        Returns:
+            tuple: (временная шкала, была ли отмена)
+        """
+        start = time.perf_counter()
+        unpublished = []
+        published_once = False
+        last_publish = start
+        first_result_time = None
+
+        checkpoint = self._open_checkpoint()
+        resumed = 0
+        if checkpoint is not None:
+            restored, resumed = checkpoint.load()
+            if resumed:
+                logger.info(f"Анализ продолжается с окна {resumed} по контрольной точке {checkpoint.path}")
+                self.timeline.extend(restored)
+                self.processed = resumed
+                # Восстановленные точки публикуются вместе с первым новым батчем
+                unpublished.extend(restored)
+        checkpoint_windows = max(1, int(self.checkpoint_seconds / self.step))
+        unsaved = []
+        saved_processed = resumed
+
+        iterator = self.predictor.iter_emotion_timeline(
+            self.audio_data, self.sample_rate, self.window_size, self.step, start_window=resumed
+        )
+        try:
+            for points, self.processed, self.total in iterator:
+                self.timeline.extend(points)
+                unpublished.extend(points)
+                if checkpoint is not None:
+                    unsaved.extend(points)
+                    if self.processed - saved_processed >= checkpoint_windows:
+                        checkpoint.save(unsaved, self.processed)
+                        unsaved, saved_processed = [], self.processed
+                if self.cancelled:
+                    break
+
+                now = time.perf_counter()
+                due = (now - last_publish >= self.publish_interval if published_once
+                       else self.processed >= self.first_windows)
+                if publish is not None and unpublished and due:
+                    publish(unpublished, self.processed, self.total)
+                    unpublished = []
+                    last_publish = now
+                    if not published_once:
+                        published_once = True
+                        first_result_time = now - start
+        finally:
+            iterator.close()
+
+        cancelled = self.cancelled
+        if checkpoint is not None:
+            if cancelled:
+                # Отмененный анализ можно будет продолжить
+                if unsaved or self.processed > saved_processed:
+                    checkpoint.save(unsaved, self.processed)
+            else:
+                checkpoint.remove()
+        logger.info("Анализ %s: %d/%d окон за %.1f сек, первые результаты через %s",
+                    "отменен" if cancelled else "завершен", self.processed, self.total,
+                    time.perf_counter() - start,
+                    f"{first_result_time:.1f} сек" if first_result_time is not None else "-")
+        return self.timeline, cancelled
+
+    def _open_checkpoint(self):
+        """Контрольная точка для длинных записей (None, если не используется)"""
+        if self.checkpoint_dir is None or len(self.audio_data) < MIN_CHECKPOINT_AUDIO_SECONDS * self.sample_rate:
+            return None
+        try:
+            return TimelineCheckpoint.for_audio(self.audio_data, self.sample_rate, self.window_size,
+                                                self.step, self.predictor.model_id(), self.checkpoint_dir)
+        except Exception as e:
+            logger.warning(f"Контрольные точки недоступны: {e}")
+            return None
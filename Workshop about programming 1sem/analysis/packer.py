@@ -0,0 +1,203 @@
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from audio.audio_utils import AudioProcessor
+
+logger = logging.getLogger(__name__)
+
+# Размер батча, если профиль выполнения не задает больший
+DEFAULT_PACK_BATCH_SIZE = 8
+# Сколько файлов декодируется заранее, пока модель обрабатывает текущие окна
+DEFAULT_DECODE_AHEAD = 4
+
+
+class _PackedFile:
+    """Состояние файла в упаковщике: аудио и предсказания окон по порядку"""
+
+    def __init__(self, index, path, audio_data, sample_rate, starts, error=None):
+        self.index = index
+        self.path = path
+        self.audio_data = audio_data
+        self.sample_rate = sample_rate
+        self.starts = starts
+        self.predictions = [None] * len(starts)
+        self.remaining = len(starts)
+        self.error = error
+        # Кэш эмбеддингов: ключ записи, готовая шкала при попадании, эмбеддинги и логиты окон
+        self.cache_key = None
+        self.cached_timeline = None
+        self.pooled = None
+        self.logits = None
+        self.labels = None
+
+    def timeline(self):
+        if self.cached_timeline is not None:
+            return self.cached_timeline
+        return [
+            {'time': start / self.sample_rate, 'emotions': predictions}
+            for start, predictions in zip(self.starts, self.predictions)
+            if predictions
+        ]
+
+
+class WindowPacker:
+    """Анализ множества файлов с упаковкой окон разных файлов в общие батчи
+
+    Короткие файлы дают по несколько окон, поэтому при батчах внутри файла модель
+    получает почти пустые батчи. Здесь окна всех файлов идут в одну очередь с пометкой
+    (файл, смещение), батчи заполняются целиком, а шкалы собираются обратно по файлам.
+    Файлы декодируются заранее в фоновых потоках, декодированными в памяти держится
+    не больше decode_ahead файлов сверх тех, чьи окна уже в очереди.
+    """
+
+    def __init__(self, predictor, window_size=2.0, step=0.5, batch_size=None,
+                 decode_ahead=DEFAULT_DECODE_AHEAD, decode_workers=2, load_audio=None):
+        """
+        Args:
+            predictor: EmotionPredictor
+            batch_size (int): Размер батча (по умолчанию из профиля выполнения,
+                не меньше DEFAULT_PACK_BATCH_SIZE)
+            load_audio: Функция load_audio(путь) -> (аудио, частота); по умолчанию AudioProcessor.load_audio
+        """
+        self.predictor = predictor
+        self.window_size = window_size
+        self.step = step
+        if batch_size:
+            predictor.batch_size = batch_size
+        elif predictor.batch_size < DEFAULT_PACK_BATCH_SIZE:
+            predictor.batch_size = DEFAULT_PACK_BATCH_SIZE
+        self.decode_ahead = max(1, decode_ahead)
+        self.decode_workers = max(1, decode_workers)
+        self.load_audio = load_audio or AudioProcessor.load_audio
+        self.stats = {'files': 0, 'windows': 0, 'batches': 0, 'decode_wait': 0.0}
+
+    def _decode(self, path):
+        """Декодирование (и поиск в кэше эмбеддингов) в фоновом потоке"""
+        audio_data, sample_rate = self.load_audio(path)
+        cache = self.predictor.embedding_cache
+        if cache is None:
+            return audio_data, sample_rate, None, None
+        cache_key = cache.key(audio_data, sample_rate, self.window_size, self.step,
+                              self.predictor.embedding_model_id())
+        return audio_data, sample_rate, cache_key, cache.load(*cache_key)
+
+    def _window_starts(self, audio_data, sample_rate):
+        window_samples = int(self.window_size * sample_rate)
+        step_samples = int(self.step * sample_rate)
+        return range(0, len(audio_data) - window_samples, step_samples)
+
+    def run(self, paths):
+        """Анализ файлов; результаты выдаются в порядке paths по мере готовности
+
+        Yields:
+            tuple: (путь, временная шкала или None, ошибка или None)
+        """
+        if self.predictor.model is None:
+            self.predictor.initialize()
+        paths = list(paths)
+        start_time = time.perf_counter()
+        self.stats = {'files': 0, 'windows': 0, 'batches': 0, 'decode_wait': 0.0}
+
+        with ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix="decode") as executor:
+            decoding = deque()
+            next_path = 0
+            # Файлы, чьи окна в очереди или уже обработаны, но еще не выданы (по порядку)
+            in_flight = deque()
+            windows = deque()
+
+            def fill_decode_queue():
+                nonlocal next_path
+                while next_path < len(paths) and len(decoding) < self.decode_ahead:
+                    decoding.append((next_path, paths[next_path], executor.submit(self._decode, paths[next_path])))
+                    next_path += 1
+
+            fill_decode_queue()
+            while decoding or windows or in_flight:
+                # Окна добавляются, пока батч не заполнен или не кончились файлы
+                while decoding and len(windows) < self.predictor.batch_size:
+                    index, path, future = decoding.popleft()
+                    wait_start = time.perf_counter()
+                    try:
+                        audio_data, sample_rate, cache_key, cached = future.result()
+                        if cached is not None:
+                            packed = _PackedFile(index, path, None, sample_rate, range(0))
+                            packed.cached_timeline = self.predictor.rescore(cached)
+                        else:
+                            packed = _PackedFile(index, path, audio_data, sample_rate,
+                                                 self._window_starts(audio_data, sample_rate))
+                            if cache_key is not None:
+                                packed.cache_key = cache_key
+                                packed.pooled = [None] * len(packed.starts)
+                                packed.logits = [None] * len(packed.starts)
+                    except Exception as e:
+                        logger.error(f"Ошибка при чтении файла {path}: {e}")
+                        packed = _PackedFile(index, path, None, None, range(0), error=e)
+                    self.stats['decode_wait'] += time.perf_counter() - wait_start
+                    fill_decode_queue()
+                    in_flight.append(packed)
+                    windows.extend((packed, slot) for slot in range(len(packed.starts)))
+
+                if windows:
+                    self._run_batch(windows)
+
+                # Выдача готовых файлов по порядку; аудио освобождается сразу
+                while in_flight and in_flight[0].remaining == 0:
+                    packed = in_flight.popleft()
+                    self.stats['files'] += 1
+                    timeline_data = packed.timeline() if packed.error is None else None
+                    # Файл с окнами, для которых не удалось получить эмбеддинги, в кэш не попадает
+                    if (packed.cache_key is not None and packed.starts
+                            and all(pooled is not None for pooled in packed.pooled)):
+                        self.predictor.embedding_cache.save(
+                            *packed.cache_key, np.stack(packed.pooled), np.stack(packed.logits),
+                            packed.labels, packed.starts.step
+                        )
+                    packed.audio_data = packed.pooled = packed.logits = None
+                    yield packed.path, timeline_data, packed.error
+
+        elapsed = time.perf_counter() - start_time
+        logger.info("Упаковка окон: %d файлов, %d окон, %d батчей (в среднем %.1f окон) за %.1f сек, "
+                    "ожидание декодирования %.1f сек",
+                    self.stats['files'], self.stats['windows'], self.stats['batches'],
+                    self.stats['windows'] / max(1, self.stats['batches']), elapsed, self.stats['decode_wait'])
+
+    def _run_batch(self, windows):
+        """Один батч модели из начала очереди окон"""
+        first_file = windows[0][0]
+        window_samples = int(self.window_size * first_file.sample_rate)
+        batch_size = self.predictor._batch_size_for(window_samples)
+        batch = []
+        # В батч попадают окна с одной частотой дискретизации (одинаковой длины)
+        while windows and len(batch) < batch_size and windows[0][0].sample_rate == first_file.sample_rate:
+            batch.append(windows.popleft())
+
+        segments = [packed.audio_data[packed.starts[slot]:packed.starts[slot] + window_samples]
+                    for packed, slot in batch]
+        if self.predictor.embedding_cache is not None:
+            # Вместе с предсказаниями сохраняются эмбеддинги и логиты для кэша;
+            # окна с ошибкой получают None (при нехватке памяти батч делится пополам)
+            embedded, labels = self.predictor._embed_batch(segments)
+            batch_predictions = [None] * len(batch)
+            ready = [i for i, window in enumerate(embedded) if window is not None]
+            if ready:
+                logits = np.stack([embedded[i][1] for i in ready])
+                for i, predictions in zip(ready, self.predictor.predictions_from_logits(logits, labels)):
+                    batch_predictions[i] = predictions
+            for i, (packed, slot) in enumerate(batch):
+                if embedded[i] is not None:
+                    packed.pooled[slot], packed.logits[slot] = embedded[i]
+                    packed.labels = labels
+        elif len(segments) == 1:
+            batch_predictions = [self.predictor.predict_emotion(segments[0], first_file.sample_rate)]
+        else:
+            batch_predictions = self.predictor.predict_emotion_batch(
+                segments, first_file.sample_rate, batch_size=len(segments)
+            )
+        for (packed, slot), predictions in zip(batch, batch_predictions):
+            packed.predictions[slot] = predictions
+            packed.remaining -= 1
+        self.stats['windows'] += len(batch)
+        self.stats['batches'] += 1
@@ -0,0 +1,203 @@
+import math
+import time
+import logging
+import threading
+import numpy as np
+from analysis.job import DEFAULT_WINDOW_SIZE, DEFAULT_STEP, validate_window_params
+
+logger = logging.getLogger(__name__)
+
+# Доля нового замера в экспоненциальном сглаживании задержки инференса
+LATENCY_SMOOTHING = 0.3
+# Во сколько раз шаг может быть загрублен при медленном инференсе
+MAX_STEP_FACTOR = 8
+# Период опроса записи, пока следующее окно еще не накопилось, сек
+POLL_INTERVAL = 0.05
+# Причины пропуска окон: late - окна устарели, пока шел инференс; coarse - загрубленный шаг
+SKIP_LATE = "late"
+SKIP_COARSE = "coarse"
+
+
+class RealtimeAnalyzer:
+    """Анализ идущей записи AudioRecorder с учетом срока: модель получает самое свежее окно
+
+    Окна лежат на той же сетке, что и в iter_emotion_timeline (начало кратно шагу), поэтому
+    точки совпадают по времени с анализом готовой записи. Задержка инференса сглаживается
+    экспоненциально. Если она больше шага, шаг загрубляется до ближайшего кратного, а если
+    к концу инференса накопилось несколько окон, анализ переходит сразу к последнему полному
+    окну. Пропущенные окна не теряются молча: они сводятся в отрезки skipped
+    ({'start', 'end', 'windows', 'reason'}), а после остановки записи backfill досчитывает
+    их по полной записи.
+    """
+
+    def __init__(self, predictor, recorder, window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP,
+                 max_step_factor=MAX_STEP_FACTOR, on_point=None, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            predictor: EmotionPredictor
+            recorder: AudioRecorder (запись запускает и останавливает вызывающий код)
+            max_step_factor (int): Предел загрубления шага (1 - только пропуск устаревших окон)
+            on_point (callable): Вызывается из потока анализа с каждой новой точкой шкалы
+        """
+        window_size, step = validate_window_params(window_size, step)
+        self.predictor = predictor
+        self.recorder = recorder
+        self.window_size = window_size
+        self.step = step
+        self.max_step_factor = max(1, int(max_step_factor))
+        self.on_point = on_point
+        self.poll_interval = poll_interval
+        self.sample_rate = recorder.sample_rate
+        self.window_samples = int(window_size * self.sample_rate)
+        self.step_samples = int(step * self.sample_rate)
+        self.points = []
+        self.skipped = []
+        self._skipped_starts = []
+        self.latency = None
+        self.stats = {'analyzed': 0, 'skipped': 0, 'backfilled': 0, 'max_lag': 0.0}
+        self._peak = 0.001
+        self._last_start = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запуск потока анализа (запись уже должна идти)"""
+        if self._thread is not None:
+            return
+        if self.predictor.model is None:
+            self.predictor.initialize()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка потока анализа; окно, которое сейчас анализируется, дописывается в шкалу"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logger.info("Анализ на лету: окон %d, пропущено %d, задержка инференса %.2f сек, "
+                    "наибольшее отставание %.2f сек", self.stats['analyzed'], self.stats['skipped'],
+                    self.latency or 0.0, self.stats['max_lag'])
+
+    def step_factor(self):
+        """Текущий множитель шага: сколько шагов сетки успевает пройти за один инференс"""
+        if self.latency is None:
+            return 1
+        return min(self.max_step_factor, max(1, math.ceil(self.latency / self.step - 1e-9)))
+
+    def snapshot(self):
+        """Копии точек шкалы и пропущенных отрезков"""
+        with self._lock:
+            return list(self.points), list(self.skipped)
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                if not self._analyze_next():
+                    self._stop_event.wait(self.poll_interval)
+        except Exception as e:
+            logger.error(f"Ошибка при анализе записи на лету: {e}")
+
+    def _analyze_next(self):
+        """Анализ последнего полного окна сетки; False, если нового окна пока нет"""
+        # Последнее окно сетки начинается не раньше чем за шаг до конца записанных данных
+        position, data = self.recorder.latest_audio(self.window_samples + self.step_samples)
+        if position < self.window_samples:
+            return False
+        start = (position - self.window_samples) // self.step_samples * self.step_samples
+        reason = SKIP_LATE
+        if self._last_start is not None:
+            target = self._last_start + self.step_factor() * self.step_samples
+            if start < target:
+                return False
+            if start == target:
+                reason = SKIP_COARSE
+
+        offset = len(data) - (position - start)
+        if offset < 0:
+            # Буфер записи вернул меньше данных, чем нужно окну: короткое окно не оценивается,
+            # чтобы точка на его месте не помешала досчету пропущенных окон
+            logger.debug("Окно %.1f сек недоступно в буфере записи", start / self.sample_rate)
+            return False
+        window = _mono(data[offset:offset + self.window_samples])
+        # Запись нормализуется по пику только после остановки: окно приводится к пику, известному сейчас
+        self._peak = max(self._peak, float(np.abs(window).max()))
+        began = time.perf_counter()
+        predictions = self.predictor.predict_emotion(window / self._peak, self.sample_rate)
+        elapsed = time.perf_counter() - began
+        self.latency = elapsed if self.latency is None else (
+            LATENCY_SMOOTHING * elapsed + (1 - LATENCY_SMOOTHING) * self.latency)
+
+        lag = (self.recorder.latest_audio(0)[0] - start - self.window_samples) / self.sample_rate
+        self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+        self._record(start, predictions, reason)
+        return True
+
+    def _record(self, start, predictions, reason):
+        """Добавление точки и отрезка пропущенных перед ней окон (reason - причина пропуска)"""
+        first_missing = 0 if self._last_start is None else self._last_start + self.step_samples
+        missing = list(range(first_missing, start, self.step_samples))
+        point = None
+        with self._lock:
+            if missing:
+                self.skipped.append({
+                    'start': missing[0] / self.sample_rate,
+                    'end': start / self.sample_rate,
+                    'windows': len(missing),
+                    'reason': reason,
+                })
+                self._skipped_starts.extend(missing)
+                self.stats['skipped'] += len(missing)
+            if predictions:
+                point = {'time': start / self.sample_rate, 'emotions': predictions}
+                self.points.append(point)
+            self._last_start = start
+            self.stats['analyzed'] += 1
+        if point is not None and self.on_point is not None:
+            self.on_point(point)
+
+    def backfill(self, audio_data, sample_rate, batch_size=None):
+        """Досчет пропущенных окон по полной записи (после stop и stop_recording)
+
+        Окна после последнего проанализированного тоже досчитываются, так что шкала
+        покрывает запись целиком. Отрезки skipped остаются с пометкой backfilled.
+
+        Returns:
+            list: Полная шкала, отсортированная по времени
+        """
+        if audio_data is None:
+            return self.snapshot()[0]
+        tail_start = 0 if self._last_start is None else self._last_start + self.step_samples
+        tail = list(range(tail_start, len(audio_data) - self.window_samples, self.step_samples))
+        if tail:
+            self.skipped.append({'start': tail[0] / sample_rate, 'end': len(audio_data) / sample_rate,
+                                 'windows': len(tail), 'reason': SKIP_LATE})
+        starts = [start for start in self._skipped_starts + tail
+                  if start + self.window_samples <= len(audio_data)]
+        batch_size = batch_size or max(1, self.predictor.batch_size)
+
+        points = []
+        for index in range(0, len(starts), batch_size):
+            batch_starts = starts[index:index + batch_size]
+            batch_predictions = self.predictor.predict_emotion_batch(
+                [_mono(np.asarray(audio_data[start:start + self.window_samples])) for start in batch_starts],
+                sample_rate, batch_size=batch_size
+            )
+            points.extend({'time': start / sample_rate, 'emotions': predictions}
+                          for start, predictions in zip(batch_starts, batch_predictions) if predictions)
+
+        with self._lock:
+            self.points = sorted(self.points + points, key=lambda point: point['time'])
+            for span in self.skipped:
+                span['backfilled'] = True
+            self._skipped_starts = []
+            self.stats['backfilled'] += len(points)
+            logger.info(f"Досчитано пропущенных окон: {len(points)} из {len(starts)}")
+            return list(self.points)
+
+
+def _mono(window):
+    """Окно одного канала: каналы записи усредняются"""
+    return window.mean(axis=1) if window.ndim > 1 else window
@@ -0,0 +1,180 @@
+import io
+import os
+import json
+import html
+import time
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMATS = ("png", "svg", "html")
+REPORTS_DIR = "reports"
+BACKGROUND_COLOR = '#2b2b2b'
+
+# Отрисовщик процесса пула: фигура создается один раз и переиспользуется для всех файлов
+_renderer = None
+
+
+class ReportRenderer:
+    """Отрисовка отчетов по временным шкалам без GUI (холст Agg, без pyplot)
+
+    Цвета, подписи и сглаживание берутся из EmotionTimeline, как в окне приложения.
+    Одна фигура используется для всех отчетов: между файлами очищаются только оси.
+    """
+
+    def __init__(self, formats=("png",), dpi=100, figsize=(12, 6), timeline_options=None):
+        """
+        Args:
+            timeline_options (dict): Параметры EmotionTimeline (noise_threshold, smoothing_window)
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from analysis.timeline import EmotionTimeline
+
+        unknown = set(formats) - set(REPORT_FORMATS)
+        if unknown:
+            raise ValueError(f"Неизвестные форматы отчета: {', '.join(sorted(unknown))}")
+        self.formats = tuple(formats)
+        self.dpi = dpi
+        self.timeline = EmotionTimeline(**(timeline_options or {}))
+        self.figure = Figure(figsize=figsize, facecolor=BACKGROUND_COLOR)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        self.handles = self.timeline.legend_handles()
+
+    def render(self, timeline_data, output_base, title):
+        """Отчеты по шкале в файлы output_base.<формат>
+
+        Returns:
+            list: Пути созданных файлов
+        """
+        figure, _ = self.timeline.plot_timeline(timeline_data, self.ax)
+        if figure is None:
+            raise ValueError("Нет данных для графика")
+        self.ax.set_title(title, color='white')
+        self.ax.legend(handles=self.handles, loc='upper right', fontsize=9, ncol=2,
+                       facecolor=BACKGROUND_COLOR, labelcolor='white', framealpha=0.6)
+
+        written = []
+        svg = None
+        if "png" in self.formats:
+            self.figure.savefig(output_base + ".png", format='png', dpi=self.dpi,
+                                facecolor=BACKGROUND_COLOR)
+            written.append(output_base + ".png")
+        if "svg" in self.formats or "html" in self.formats:
+            buffer = io.BytesIO()
+            self.figure.savefig(buffer, format='svg', facecolor=BACKGROUND_COLOR)
+            svg = buffer.getvalue().decode('utf-8')
+        if "svg" in self.formats:
+            with open(output_base + ".svg", 'w', encoding='utf-8') as f:
+                f.write(svg)
+            written.append(output_base + ".svg")
+        if "html" in self.formats:
+            with open(output_base + ".html", 'w', encoding='utf-8') as f:
+                f.write(self._html(timeline_data, title, svg))
+            written.append(output_base + ".html")
+        return written
+
+    def _html(self, timeline_data, title, svg):
+        """Самодостаточная страница: график SVG, сводка и средние значения"""
+        aggregator = self.timeline.aggregate(timeline_data)
+        summary = self.timeline.get_summary(timeline_data, aggregator)
+        rows = "".join(
+            f"<tr><td style=\"color:{self.timeline.colors[emotion]}\">{html.escape(name)}</td>"
+            f"<td>{aggregator.averages()[emotion]:.1%}</td></tr>"
+            for emotion, name in self.timeline.all_emotions.items()
+        )
+        # Пролог XML и DOCTYPE из вывода matplotlib внутри HTML не нужны
+        svg = svg[svg.index('<svg'):]
+        return (
+            "<!DOCTYPE html>\n<html lang=\"ru\">\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{html.escape(title)}</title>\n"
+            f"<style>body {{ background: {BACKGROUND_COLOR}; color: white; font-family: sans-serif; }}"
+            " svg { max-width: 100%; height: auto; } td { padding: 2px 12px; }</style>\n"
+            f"</head>\n<body>\n<h1>{html.escape(title)}</h1>\n{svg}\n"
+            f"<pre>{html.escape(summary)}</pre>\n"
+            f"<h2>Средние значения</h2>\n<table>{rows}</table>\n</body>\n</html>\n"
+        )
+
+
+def load_report_input(source):
+    """Шкала и заголовок отчета
+
+    Args:
+        source: Путь к JSON-шкале (формат команды analyze) или
+            ('store', каталог хранилища, id файла)
+    """
+    if isinstance(source, tuple):
+        from analysis.results_store import ResultsStore, columns_to_timeline
+        _, store_dir, file_id = source
+        store = ResultsStore(store_dir)
+        times, scores = store.load_timeline(file_id)
+        return columns_to_timeline(times, scores), store.get_source(file_id)
+    with open(source, encoding='utf-8') as f:
+        data = json.load(f)
+    return data['timeline'], data.get('source', os.path.basename(source))
+
+
+def _init_worker(formats, dpi, timeline_options):
+    global _renderer
+    # Процесс пула ничего не показывает на экране: отрисовка только в Agg
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    _renderer = ReportRenderer(formats, dpi, timeline_options=timeline_options)
+
+
+def _render_task(task, renderer=None):
+    """Отчет одного файла: (исходник, файлы отчета или None, ошибка или None)"""
+    source, output_base = task
+    try:
+        timeline_data, title = load_report_input(source)
+        renderer = renderer or _renderer
+        return source, renderer.render(timeline_data, output_base, os.path.basename(str(title))), None
+    except Exception as e:
+        logger.error(f"Ошибка при построении отчета {source}: {e}")
+        return source, None, str(e)
+
+
+def render_reports(sources, output_dir=REPORTS_DIR, formats=("png",), workers=None, dpi=100,
+                   timeline_options=None):
+    """Отчеты для набора шкал в пуле процессов
+
+    Шкалы читаются в процессах пула, поэтому в пул передаются только пути.
+
+    Args:
+        timeline_options (dict): Параметры EmotionTimeline (порог шума, окно сглаживания)
+
+    Yields:
+        tuple: (исходник, созданные файлы или None, ошибка или None) в порядке sources
+    """
+    sources = list(sources)
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(source, os.path.join(output_dir, f"{index:05d}_{_report_name(source)}"))
+             for index, source in enumerate(sources)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks) or 1))
+    start = time.perf_counter()
+
+    if workers == 1:
+        # В текущем процессе бэкенд matplotlib не меняется: ReportRenderer не использует pyplot
+        renderer = ReportRenderer(formats, dpi, timeline_options=timeline_options)
+        for task in tasks:
+            yield _render_task(task, renderer)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(tuple(formats), dpi, timeline_options)) as executor:
+            # Крупные порции уменьшают накладные расходы на передачу задач
+            chunksize = max(1, len(tasks) // (workers * 4))
+            for result in executor.map(_render_task, tasks, chunksize=chunksize):
+                yield result
+
+    elapsed = time.perf_counter() - start
+    logger.info("Отчеты: %d файлов за %.1f сек (%.1f отчетов/сек, процессов: %d)",
+                len(tasks), elapsed, len(tasks) / max(elapsed, 1e-9), workers)
+
+
+def _report_name(source):
+    if isinstance(source, tuple):
+        return f"store_{source[2]}"
+    return os.path.splitext(os.path.basename(source))[0]
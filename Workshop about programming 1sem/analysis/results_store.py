@@ -0,0 +1,284 @@
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Порядок столбцов эмоций в файлах фрагментов
+STORE_EMOTIONS = ('anger', 'happy', 'sad', 'neutral', 'surprise', 'fear', 'disgust')
+# Пороги, для которых отрезки превышения считаются при записи и ищутся через индекс SQLite
+SEGMENT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9)
+INDEX_NAME = "index.sqlite"
+CHUNKS_DIR = "chunks"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    language TEXT,
+    analyzed_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    step REAL NOT NULL,
+    points INTEGER NOT NULL,
+    chunk TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_analyzed_at ON files (analyzed_at);
+CREATE TABLE IF NOT EXISTS segments (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    emotion TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    duration REAL NOT NULL,
+    peak REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_lookup ON segments (emotion, threshold, duration);
+"""
+
+
+def timeline_to_columns(timeline_data):
+    """Временная шкала в столбцы: (времена (N,), оценки (эмоции, N)) в float32"""
+    times = np.fromiter((point['time'] for point in timeline_data), dtype=np.float32, count=len(timeline_data))
+    scores = np.zeros((len(STORE_EMOTIONS), len(timeline_data)), dtype=np.float32)
+    column = {emotion: i for i, emotion in enumerate(STORE_EMOTIONS)}
+    for j, point in enumerate(timeline_data):
+        for prediction in point['emotions']:
+            i = column.get(prediction['label'])
+            if i is not None:
+                scores[i, j] = prediction['score']
+    return times, scores
+
+
+def columns_to_timeline(times, scores):
+    """Столбцы хранилища обратно во временную шкалу (эмоции с нулевой оценкой опускаются)"""
+    timeline_data = []
+    for j, time_point in enumerate(times):
+        emotions = [{'label': emotion, 'score': float(scores[i, j])}
+                    for i, emotion in enumerate(STORE_EMOTIONS) if scores[i, j] != 0]
+        emotions.sort(key=lambda prediction: prediction['score'], reverse=True)
+        timeline_data.append({'time': float(time_point), 'emotions': emotions})
+    return timeline_data
+
+
+def estimate_step(times):
+    """Шаг шкалы по медиане интервалов между точками"""
+    if len(times) < 2:
+        return 0.0
+    return float(np.median(np.diff(times)))
+
+
+def find_runs(times, scores, threshold, step):
+    """Отрезки, где оценка непрерывно выше порога
+
+    Точки считаются соседними, если между ними не больше полутора шагов,
+    отрезок продлевается на шаг после последней точки.
+
+    Returns:
+        list: (начало, конец, длительность, максимум)
+    """
+    above = scores > threshold
+    if not above.any():
+        return []
+    gap = np.diff(times) > 1.5 * step if len(times) > 1 else np.zeros(0, dtype=bool)
+    # Начало отрезка: точка выше порога, перед которой точки ниже порога или разрыв
+    starts_mask = above.copy()
+    starts_mask[1:] &= ~above[:-1] | gap
+    ends_mask = above.copy()
+    ends_mask[:-1] &= ~above[1:] | gap
+    starts = np.flatnonzero(starts_mask)
+    ends = np.flatnonzero(ends_mask)
+    peaks = np.maximum.reduceat(np.where(above, scores, 0), starts) if len(starts) else []
+    runs = []
+    for first, last, peak in zip(starts, ends, peaks):
+        start = float(times[first])
+        end = float(times[last]) + step
+        runs.append((start, end, end - start, float(peak)))
+    return runs
+
+
+class ResultsStore:
+    """Локальное хранилище результатов анализа
+
+    Каждая шкала дописывается отдельным файлом фрагмента chunks/<id>.npy: первая строка -
+    времена, остальные - оценки эмоций в порядке STORE_EMOTIONS (столбцы лежат
+    непрерывно). В index.sqlite хранятся сведения о файлах и отрезки превышения
+    порогов SEGMENT_THRESHOLDS, поэтому типовые запросы не читают фрагменты.
+    Запись выполняется фоновым потоком: append только ставит шкалу в очередь.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir if store_dir else os.path.join(os.getcwd(), 'results')
+        self.chunks_dir = os.path.join(self.store_dir, CHUNKS_DIR)
+        self.index_path = os.path.join(self.store_dir, INDEX_NAME)
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def append(self, timeline_data, source, language=None, analyzed_at=None):
+        """Постановка шкалы в очередь записи (не блокирует вызывающий поток)"""
+        if not timeline_data:
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="results-store")
+                self._writer.daemon = True
+                self._writer.start()
+        self._queue.put((list(timeline_data), source, language, analyzed_at or time.time()))
+
+    def flush(self):
+        """Ожидание записи всех поставленных шкал"""
+        self._queue.join()
+
+    def close(self):
+        """Запись оставшихся шкал и остановка фонового потока"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                try:
+                    if item is None:
+                        return
+                    self._write(conn, *item)
+                except Exception as e:
+                    logger.error(f"Ошибка при записи результатов {item[1] if item else ''}: {e}")
+                finally:
+                    self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _write(self, conn, timeline_data, source, language, analyzed_at):
+        start = time.perf_counter()
+        times, scores = timeline_to_columns(timeline_data)
+        step = estimate_step(times)
+        duration = float(times[-1]) + step if len(times) else 0.0
+
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO files (source, language, analyzed_at, duration, step, points, chunk) "
+                "VALUES (?, ?, ?, ?, ?, ?, '')",
+                (source, language, analyzed_at, duration, step, len(times))
+            )
+            file_id = cursor.lastrowid
+            chunk_name = f"{file_id}.npy"
+            chunk_path = os.path.join(self.chunks_dir, chunk_name)
+            tmp_path = chunk_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.vstack([times[None, :], scores]))
+            os.replace(tmp_path, chunk_path)
+            conn.execute("UPDATE files SET chunk = ? WHERE id = ?", (chunk_name, file_id))
+
+            rows = []
+            for i, emotion in enumerate(STORE_EMOTIONS):
+                for threshold in SEGMENT_THRESHOLDS:
+                    rows.extend((file_id, emotion, threshold, *run)
+                                for run in find_runs(times, scores[i], threshold, step))
+            conn.executemany(
+                "INSERT INTO segments (file_id, emotion, threshold, start, end, duration, peak) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        logger.debug("Результаты %s сохранены: %d точек, %d отрезков за %.3f сек",
+                     source, len(times), len(rows), time.perf_counter() - start)
+
+    def list_files(self, since=None, until=None):
+        """Проанализированные файлы за период (время - секунды Unix)"""
+        query, params = "SELECT id, source, language, analyzed_at, duration, points FROM files", []
+        conditions = []
+        if since is not None:
+            conditions.append("analyzed_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("analyzed_at < ?")
+            params.append(until)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY analyzed_at", params).fetchall()
+        keys = ('id', 'source', 'language', 'analyzed_at', 'duration', 'points')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def load_timeline(self, file_id):
+        """Столбцы шкалы файла без копирования в память: (времена, оценки)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT chunk FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Нет результатов с id {file_id}")
+        data = np.load(os.path.join(self.chunks_dir, row[0]), mmap_mode='r')
+        return data[0], data[1:]
+
+    def get_source(self, file_id):
+        """Исходный путь проанализированного файла"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT source FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Нет результатов с id {file_id}")
+        return row[0]
+
+    def find_segments(self, emotion, min_score, min_duration=0.0, since=None, until=None):
+        """Отрезки, где эмоция выше порога дольше min_duration секунд
+
+        Для порогов из SEGMENT_THRESHOLDS запрос выполняется по индексу SQLite,
+        для остальных - проходом по фрагментам файлов за период.
+
+        Returns:
+            list: Словари с полями source, file_id, start, end, duration, peak
+        """
+        if emotion not in STORE_EMOTIONS:
+            raise ValueError(f"Неизвестная эмоция: {emotion}")
+        for threshold in SEGMENT_THRESHOLDS:
+            if abs(min_score - threshold) < 1e-9:
+                return self._query_segments(emotion, threshold, min_duration, since, until)
+        return self._scan_segments(emotion, min_score, min_duration, since, until)
+
+    def _query_segments(self, emotion, threshold, min_duration, since, until):
+        query = ("SELECT f.source, s.file_id, s.start, s.end, s.duration, s.peak "
+                 "FROM segments s JOIN files f ON f.id = s.file_id "
+                 "WHERE s.emotion = ? AND s.threshold = ? AND s.duration >= ?")
+        params = [emotion, threshold, min_duration]
+        if since is not None:
+            query += " AND f.analyzed_at >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND f.analyzed_at < ?"
+            params.append(until)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY f.analyzed_at, s.start", params).fetchall()
+        keys = ('source', 'file_id', 'start', 'end', 'duration', 'peak')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _scan_segments(self, emotion, min_score, min_duration, since, until):
+        column = STORE_EMOTIONS.index(emotion)
+        with self._connect() as conn:
+            query, params = "SELECT id, source, step, chunk FROM files WHERE 1 = 1", []
+            if since is not None:
+                query += " AND analyzed_at >= ?"
+                params.append(since)
+            if until is not None:
+                query += " AND analyzed_at < ?"
+                params.append(until)
+            files = conn.execute(query + " ORDER BY analyzed_at", params).fetchall()
+
+        segments = []
+        for file_id, source, step, chunk in files:
+            data = np.load(os.path.join(self.chunks_dir, chunk), mmap_mode='r')
+            for start, end, duration, peak in find_runs(data[0], data[1 + column], min_score, step):
+                if duration >= min_duration:
+                    segments.append({'source': source, 'file_id': file_id, 'start': start,
+                                     'end': end, 'duration': duration, 'peak': peak})
+        return segments
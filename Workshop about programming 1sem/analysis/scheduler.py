@@ -0,0 +1,316 @@
+import os
+import heapq
+import logging
+import itertools
+import threading
+from audio.ingest import audio_digest
+from analysis.job import DEFAULT_WINDOW_SIZE, DEFAULT_STEP, validate_window_params
+
+logger = logging.getLogger(__name__)
+
+# Меньше - раньше: живые записи обгоняют файлы из очереди
+PRIORITY_LIVE = 0
+PRIORITY_FILE = 1
+
+ACTIVE_STATES = ("queued", "decoding", "running")
+FINAL_STATES = ("done", "cancelled", "failed")
+# Сколько завершенных задач (со шкалами) хранится для повторного показа и поиска дубликатов
+MAX_FINISHED_JOBS = 100
+# У скольких последних завершенных записей (не файлов) аудио хранится для повторного анализа
+MAX_KEPT_RECORDINGS = 3
+
+
+class AnalysisJob:
+    """Задача анализа в очереди планировщика"""
+
+    def __init__(self, job_id, label, priority, key, file_path=None, audio_data=None, sample_rate=None,
+                 window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP):
+        self.job_id = job_id
+        self.label = label
+        self.priority = priority
+        self.key = key
+        self.file_path = file_path
+        self.audio_data = audio_data
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.step = step
+        self.language = None
+        self.status = "queued"
+        self.processed = 0
+        self.total = 0
+        self.timeline = []
+        self.aggregator = None
+        self.error = None
+        self.cancel_requested = False
+        self._slot = None
+        self._backend_job = None
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATES
+
+    @property
+    def progress(self):
+        """Доля обработанных окон (0..1)"""
+        if self.status == "done":
+            return 1.0
+        return self.processed / self.total if self.total else 0.0
+
+
+class AnalysisScheduler:
+    """Единая очередь анализа: владеет бэкендами (и через них предиктором)
+
+    Задачи выполняются по приоритету и порядку поступления, одновременно не
+    более max_concurrent. Повторная отправка того же файла или той же записи
+    возвращает уже существующую задачу (если параметры окон те же). Смена языка
+    применяется, когда выполняющиеся задачи завершатся, и до запуска следующих;
+    новые параметры окон - к задачам, поставленным после их смены.
+
+    Все методы вызываются из главного потока; колбэки бэкендов и потоков
+    декодирования возвращаются в него через dispatch.
+    """
+
+    def __init__(self, backend_factory, dispatch, max_concurrent=1, language="English", load_audio=None,
+                 aggregator_factory=None, window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP,
+                 max_finished_jobs=MAX_FINISHED_JOBS, max_kept_recordings=MAX_KEPT_RECORDINGS):
+        """
+        Args:
+            backend_factory: backend_factory(язык) -> бэкенд анализа (см. gui.analysis_worker)
+            dispatch: Передача колбэка в главный поток
+            max_concurrent (int): Сколько задач выполняется одновременно
+            window_size, step: Размер окна и шаг анализа для новых задач, секунды
+            load_audio: Функция чтения файла load_audio(путь) -> (аудио, частота)
+            aggregator_factory: Создание EmotionAggregator для задачи; статистика
+                обновляется по мере поступления точек
+            max_finished_jobs (int): Сколько завершенных задач хранить; более старые
+                забываются, чтобы память долгой сессии не росла
+            max_kept_recordings (int): У скольких последних записей хранится аудио: файл
+                можно прочитать снова, а запись с микрофона - нет (см. resubmit)
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent должен быть не меньше 1")
+        if load_audio is None:
+            from audio.audio_utils import AudioProcessor
+            load_audio = AudioProcessor.load_audio
+        self.backend_factory = backend_factory
+        self.dispatch = dispatch
+        self.max_concurrent = max_concurrent
+        self.language = language
+        self.load_audio = load_audio
+        self.aggregator_factory = aggregator_factory
+        self.window_size, self.step = validate_window_params(window_size, step)
+        self.max_finished_jobs = max_finished_jobs
+        self.max_kept_recordings = max_kept_recordings
+        self.jobs = []
+        self._queue = []
+        self._sequence = itertools.count()
+        self._job_ids = itertools.count(1)
+        self._slots = [None] * max_concurrent
+        self._busy = [None] * max_concurrent
+        self._pending_language = None
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Подписка на события listener(событие, задача, данные)
+
+        События: 'added', 'update' (статус или прогресс), 'partial' (новые точки), 'finished'.
+        """
+        self._listeners.append(listener)
+
+    def _emit(self, event, job, payload=None):
+        for listener in self._listeners:
+            try:
+                listener(event, job, payload)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике события очереди {event}: {e}")
+
+    def _find_duplicate(self, key):
+        for job in self.jobs:
+            if job.key != key:
+                continue
+            if job.active or (job.status == "done" and job.language == (self._pending_language or self.language)):
+                return job
+        return None
+
+    def _add(self, label, priority, key, **sources):
+        key = key + (self.window_size, self.step)
+        duplicate = self._find_duplicate(key)
+        if duplicate is not None:
+            logger.info(f"Задача {label} совпадает с задачей #{duplicate.job_id}, повторный анализ не нужен")
+            return duplicate
+        job = AnalysisJob(next(self._job_ids), label, priority, key,
+                          window_size=self.window_size, step=self.step, **sources)
+        if self.aggregator_factory is not None:
+            job.aggregator = self.aggregator_factory()
+        self.jobs.append(job)
+        heapq.heappush(self._queue, (job.priority, next(self._sequence), job))
+        logger.info(f"Задача #{job.job_id} ({job.label}) поставлена в очередь")
+        self._emit("added", job)
+        self._pump()
+        return job
+
+    def submit_file(self, file_path, priority=PRIORITY_FILE):
+        """Постановка файла в очередь (файл читается перед запуском задачи)"""
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        key = ("file", file_path, stat.st_size, stat.st_mtime_ns)
+        return self._add(os.path.basename(file_path), priority, key, file_path=file_path)
+
+    def submit_audio(self, audio_data, sample_rate, label="Запись", priority=PRIORITY_LIVE):
+        """Постановка уже загруженного аудио (например, записи с микрофона)"""
+        key = ("audio", audio_digest(audio_data), sample_rate)
+        return self._add(label, priority, key, audio_data=audio_data, sample_rate=sample_rate)
+
+    def resubmit(self, job):
+        """Повторная постановка файла или записи задачи с текущими параметрами окон
+
+        Returns:
+            AnalysisJob: Новая (или совпадающая) задача; None, если аудио записи уже не хранится
+        """
+        if job.file_path is not None:
+            return self.submit_file(job.file_path, job.priority)
+        if job.audio_data is not None:
+            return self.submit_audio(job.audio_data, job.sample_rate, job.label, job.priority)
+        return None
+
+    def set_window_params(self, window_size, step):
+        """Размер окна и шаг анализа для следующих задач"""
+        self.window_size, self.step = validate_window_params(window_size, step)
+        logger.info(f"Параметры анализа: окно {self.window_size} сек, шаг {self.step} сек")
+
+    def cancel(self, job):
+        """Отмена задачи: из очереди удаляется сразу, выполняющаяся останавливается после окна"""
+        if not job.active:
+            return
+        job.cancel_requested = True
+        if job.status == "queued":
+            self._finish(job, "cancelled")
+        elif job.status == "running" and job._backend_job is not None:
+            self._slots[job._slot].cancel(job._backend_job)
+
+    def set_language(self, language):
+        """Смена языка без гонки с выполняющимися задачами"""
+        if language == (self._pending_language or self.language):
+            return
+        self._pending_language = language
+        self._pump()
+
+    def _pump(self):
+        """Запуск задач из очереди на свободных слотах"""
+        if self._pending_language is not None:
+            if any(self._busy):
+                return
+            self.language = self._pending_language
+            self._pending_language = None
+            for backend in self._slots:
+                if backend is not None:
+                    backend.set_language(self.language)
+            logger.info(f"Язык анализа изменен на {self.language}")
+
+        while self._queue and None in self._busy:
+            _, _, job = heapq.heappop(self._queue)
+            if job.status != "queued":
+                continue
+            slot = self._busy.index(None)
+            self._busy[slot] = job
+            job._slot = slot
+            job.language = self.language
+            if job.file_path is not None and job.audio_data is None:
+                self._decode(job)
+            else:
+                self._run(job)
+
+    def _decode(self, job):
+        job.status = "decoding"
+        self._emit("update", job)
+
+        def decode():
+            try:
+                audio_data, sample_rate = self.load_audio(job.file_path)
+                self.dispatch(lambda: self._decoded(job, audio_data, sample_rate))
+            except Exception as e:
+                logger.error(f"Ошибка при чтении файла {job.file_path}: {e}")
+                self.dispatch(lambda error=e: self._failed(job, error))
+
+        thread = threading.Thread(target=decode)
+        thread.daemon = True
+        thread.start()
+
+    def _decoded(self, job, audio_data, sample_rate):
+        if job.cancel_requested:
+            self._finish(job, "cancelled")
+            return
+        job.audio_data, job.sample_rate = audio_data, sample_rate
+        self._run(job)
+
+    def _run(self, job):
+        if self._slots[job._slot] is None:
+            self._slots[job._slot] = self.backend_factory(self.language)
+        job.status = "running"
+        self._emit("update", job)
+        job._backend_job = self._slots[job._slot].submit(
+            job.audio_data, job.sample_rate,
+            on_done=lambda timeline_data, cancelled: self._done(job, timeline_data, cancelled),
+            on_error=lambda error: self._failed(job, error),
+            on_partial=lambda points, processed, total: self._partial(job, points, processed, total),
+            window_size=job.window_size, step=job.step
+        )
+
+    def _partial(self, job, points, processed, total):
+        if not job.active:
+            return
+        job.timeline.extend(points)
+        if job.aggregator is not None:
+            job.aggregator.update_many(points)
+        job.processed, job.total = processed, total
+        self._emit("partial", job, points)
+        self._emit("update", job)
+
+    def _done(self, job, timeline_data, cancelled):
+        # Частичные результаты - начало итоговой шкалы, в агрегатор добавляется только остаток
+        if job.aggregator is not None:
+            job.aggregator.update_many(timeline_data[len(job.timeline):])
+        job.timeline = timeline_data
+        self._finish(job, "cancelled" if cancelled else "done")
+
+    def _failed(self, job, error):
+        job.error = error
+        self._finish(job, "failed")
+
+    def _finish(self, job, status):
+        if not job.active:
+            return
+        job.status = status
+        # Файл при повторном анализе читается снова; аудио записи хранится только
+        # у последних max_kept_recordings успешно проанализированных записей
+        if job.file_path is not None or status != "done":
+            job.audio_data = None
+        self._forget_recordings()
+        if job._slot is not None and self._busy[job._slot] is job:
+            self._busy[job._slot] = None
+        logger.info(f"Задача #{job.job_id} ({job.label}): {status}, {len(job.timeline)} точек")
+        self._emit("update", job)
+        self._emit("finished", job)
+        self._forget_finished()
+        self._pump()
+
+    def _forget_recordings(self):
+        """Освобождение аудио завершенных записей сверх max_kept_recordings (самые старые)"""
+        kept = [job for job in self.jobs if not job.active and job.audio_data is not None]
+        for job in kept[:max(0, len(kept) - self.max_kept_recordings)]:
+            job.audio_data = None
+
+    def _forget_finished(self):
+        """Удаление самых старых завершенных задач сверх max_finished_jobs"""
+        finished = [job for job in self.jobs if not job.active]
+        excess = len(finished) - self.max_finished_jobs
+        if excess > 0:
+            forgotten = {id(job) for job in finished[:excess]}
+            self.jobs = [job for job in self.jobs if id(job) not in forgotten]
+
+    def close(self):
+        """Остановка всех бэкендов"""
+        for backend in self._slots:
+            if backend is not None:
+                backend.close()
+        self._slots = [None] * self.max_concurrent
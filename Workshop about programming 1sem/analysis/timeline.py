@@ -1,11 +1,20 @@
 import matplotlib.pyplot as plt
-import numpy as np
 import logging
+from log_config import HotPathLog
+from analysis.aggregator import EmotionAggregator, NOISE_THRESHOLD, SMOOTHING_WINDOW
 
 logger = logging.getLogger(__name__)
+hot_log = HotPathLog(logger)
 
 class EmotionTimeline:
-    def __init__(self):
+    def __init__(self, noise_threshold=NOISE_THRESHOLD, smoothing_window=SMOOTHING_WINDOW):
+        """
+        Args:
+            noise_threshold (float): Оценки не выше порога обнуляются перед сглаживанием
+            smoothing_window (int): Размер окна скользящего среднего (в точках шкалы)
+        """
+        self.noise_threshold = noise_threshold
+        self.smoothing_window = smoothing_window
         self.all_emotions = {
             'anger': 'Злость',
             'happy': 'Радость',
@@ -25,54 +34,50 @@ class EmotionTimeline:
             'disgust': '#8B4513'    # Коричневый
         }
         logger.debug("EmotionTimeline инициализирован с эмоциями: %s", self.all_emotions)
+    
+    def create_aggregator(self):
+        """Потоковый агрегатор статистики для эмоций шкалы"""
+        return EmotionAggregator(self.all_emotions.keys(), self.noise_threshold, self.smoothing_window)
+    
+    def aggregate(self, timeline_data):
+        """Агрегатор, заполненный всеми точками шкалы"""
+        aggregator = self.create_aggregator()
+        aggregator.update_many(timeline_data)
+        return aggregator
         
-    def plot_timeline(self, timeline_data, ax=None):
-        """Создание графика изменения эмоций во времени (без легенды)"""
+    def plot_timeline(self, timeline_data, ax=None, skipped_spans=None):
+        """Создание графика изменения эмоций во времени (без легенды)
+
+        Args:
+            skipped_spans (list): Отрезки пропущенных окон анализа на лету
+                ({'start', 'end', ...}); закрашиваются, досчитанные - бледнее
+        """
         try:
             if not timeline_data:
                 logger.warning("Получены пустые данные для построения графика")
                 return None, {}
                 
             logger.debug("Начало построения графика для %d точек данных", len(timeline_data))
-            times = [point['time'] for point in timeline_data]
-            
-            # Создаем словари для хранения данных и средних значений
-            emotion_scores = {emotion: [] for emotion in self.all_emotions.keys()}
-            emotion_averages = {}
-            
-            # Собираем данные для каждой эмоции и применяем сглаживание
+            # Порогование и сглаживание выполняет агрегатор (та же арифметика, что и в потоке)
+            aggregator = self.create_aggregator()
+            smoothed_points = []
             for point in timeline_data:
-                emotions_dict = {pred['label'].lower(): pred['score'] for pred in point['emotions']}
-                logger.debug("Данные точки: %s", emotions_dict)
-                for emotion in self.all_emotions.keys():
-                    score = emotions_dict.get(emotion, 0.0)
-                    # Применяем порог для уменьшения шума
-                    score = score if score > 0.05 else 0.0
-                    emotion_scores[emotion].append(score)
-            
-            logger.debug("Собранные данные по эмоциям: %s", {k: len(v) for k, v in emotion_scores.items()})
-            
-            # Сглаживание данных с помощью скользящего среднего
-            window_size = 5  # Размер окна сглаживания
-            for emotion in emotion_scores:
-                scores = emotion_scores[emotion]
-                if any(score > 0 for score in scores):
-                    logger.debug("Эмоция %s имеет ненулевые значения", emotion)
-                smoothed = []
-                for i in range(len(scores)):
-                    start = max(0, i - window_size // 2)
-                    end = min(len(scores), i + window_size // 2 + 1)
-                    smoothed.append(sum(scores[start:end]) / (end - start))
-                emotion_scores[emotion] = smoothed
-            
-            logger.debug("Данные после сглаживания: %s", {k: v[:5] for k, v in emotion_scores.items()})
+                if hot_log.enabled():
+                    logger.debug("Данные точки: %s", point['emotions'])
+                smoothed_points.extend(aggregator.update(point))
+            smoothed_points.extend(aggregator.finish())
+            
+            times = [time_point for time_point, _ in smoothed_points]
+            emotion_scores = {
+                emotion: [values[emotion] for _, values in smoothed_points]
+                for emotion in self.all_emotions.keys()
+            }
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Данные после сглаживания: %s", {k: v[:5] for k, v in emotion_scores.items()})
             
             # Вычисляем средние значения
-            for emotion in self.all_emotions.keys():
-                if emotion_scores[emotion]:
-                    emotion_averages[emotion] = sum(emotion_scores[emotion]) / len(emotion_scores[emotion])
-                else:
-                    emotion_averages[emotion] = 0.0
+            emotion_averages = aggregator.averages()
             
             logger.debug("Средние значения эмоций: %s", emotion_averages)
             
@@ -89,7 +94,7 @@ class EmotionTimeline:
             
             # Рисуем все эмоции, даже если их значения незначительны
             for emotion in self.all_emotions.keys():
-                has_significant_values = any(score > 0.05 for score in emotion_scores[emotion])
+                has_significant_values = any(score > self.noise_threshold for score in emotion_scores[emotion])
                 
                 line, = ax.plot(times, emotion_scores[emotion],
                               color=self.colors[emotion],
@@ -98,6 +103,10 @@ class EmotionTimeline:
                               linestyle='-' if has_significant_values else '--')
                 self.lines[emotion] = line
             
+            for span in skipped_spans or ():
+                ax.axvspan(span['start'], span['end'], color='white', linewidth=0,
+                           alpha=0.05 if span.get('backfilled') else 0.15)
+            
             # Настройка внешнего вида
             ax.set_xlabel('Время (секунды)', color='white')
             ax.set_ylabel('Уверенность', color='white')
@@ -108,30 +117,33 @@ class EmotionTimeline:
             ax.tick_params(colors='white')
             ax.set_facecolor('#2b2b2b')
             
-            logger.debug(f"График создан успешно, {len(times)} точек данных")
+            logger.debug("График создан успешно, %d точек данных", len(times))
             return ax.figure, emotion_averages
             
         except Exception as e:
             logger.error(f"Ошибка при построении графика: {str(e)}")
             return None, {}
     
-    def get_summary(self, timeline_data):
-        """Создание текстового описания анализа эмоций"""
+    def get_summary(self, timeline_data, aggregator=None):
+        """Создание текстового описания анализа эмоций
+
+        Args:
+            aggregator: Готовый EmotionAggregator (например, накопленный во время анализа);
+                если не передан, строится по timeline_data
+        """
         try:
-            if not timeline_data:
-                logger.warning("Получены пустые данные для анализа")
+            if aggregator is None:
+                if not timeline_data:
+                    logger.warning("Получены пустые данные для анализа")
+                    return "Недостаточно данных для анализа"
+                aggregator = self.aggregate(timeline_data)
+            if aggregator.count == 0:
                 return "Недостаточно данных для анализа"
                 
-            # Подсчет средних значений для каждой эмоции
-            total_emotions = {emotion: [] for emotion in self.all_emotions.keys()}
-            for point in timeline_data:
-                for pred in point['emotions']:
-                    total_emotions[pred['label']].append(pred['score'])
-            
-            # Вычисляем средние значения
+            # Средние значения для каждой эмоции
             avg_emotions = {
-                self.all_emotions[emotion]: np.mean(scores) if scores else 0 
-                for emotion, scores in total_emotions.items()
+                self.all_emotions[emotion]: score
+                for emotion, score in aggregator.raw_means().items()
             }
             
             # Находим доминирующие эмоции
@@ -153,32 +165,43 @@ class EmotionTimeline:
             if not has_dominant:
                 summary += "- Не удалось определить явные эмоции\n"
             
-            logger.debug(f"Анализ выполнен, обнаружено {len([e for e in dominant_emotions if e[1] > 0.1])} доминирующих эмоций")
+            summary += self.format_dominant_durations(aggregator)
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Анализ выполнен, обнаружено %d доминирующих эмоций",
+                             len([e for e in dominant_emotions if e[1] > 0.1]))
             return summary
             
         except Exception as e:
             logger.error(f"Ошибка при создании описания: {e}")
             return "Ошибка при анализе эмоций"
     
+    def format_dominant_durations(self, aggregator):
+        """Строки о том, сколько секунд преобладала каждая эмоция"""
+        durations = sorted(aggregator.dominant_durations().items(), key=lambda x: x[1], reverse=True)
+        lines = [f"- {self.all_emotions[emotion]}: {seconds:.1f} сек" for emotion, seconds in durations if seconds > 0]
+        if not lines:
+            return ""
+        return "\nВремя преобладания:\n" + "\n".join(lines) + "\n"
+    
+    def legend_handles(self):
+        """Линии легенды: цвет и русское название каждой эмоции"""
+        from matplotlib.lines import Line2D
+        return [
+            Line2D([0], [0], color=self.colors[emotion], lw=3, label=russian_name)
+            for emotion, russian_name in self.all_emotions.items()
+        ]
+    
     def get_legend_figure(self):
         """Создаёт отдельную фигуру только с легендой эмоций"""
         import matplotlib.pyplot as plt
-        from matplotlib.lines import Line2D
         import io
         
         fig = None
         buf = None
         try:
             fig, ax = plt.subplots(figsize=(3, 4))
-            handles = []
-            
-            # Создаем только один набор линий для всех эмоций
-            for emotion, russian_name in self.all_emotions.items():
-                line = Line2D([0], [0], 
-                            color=self.colors[emotion],
-                            lw=3,
-                            label=russian_name)
-                handles.append(line)
+            handles = self.legend_handles()
             
             legend = ax.legend(handles=handles, 
                              loc='center',
@@ -1,4 +1,6 @@
 import sys
+import time
+import argparse
 import logging
 from pathlib import Path
 import matplotlib
@@ -8,19 +10,359 @@ import os
 
 from gui.interface import launch_gui
 from model.model_loader import EmotionModelLoader
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,  # Изменили уровень на DEBUG
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('voice_analyze.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from gui.analysis_worker import ANALYSIS_BACKENDS
+from model.memory_budget import set_memory_budget
+from log_config import setup_logging, LOG_MODES
 
 logger = logging.getLogger(__name__)
 
+def parse_args(argv=None):
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Voice Emotion Analyzer")
+    parser.add_argument('--log-mode', choices=LOG_MODES, default='async',
+                        help="sync - запись логов в вызывающем потоке, async - через фоновую очередь")
+    parser.add_argument('--log-level', default='DEBUG',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="Уровень логирования")
+    parser.add_argument('--log-sample-every', type=int, default=1,
+                        help="Логировать каждую N-ю отладочную запись для каждого окна анализа")
+    parser.add_argument('--mmap-weights', action='store_true',
+                        help="Загружать веса модели из safetensors через отображение в память")
+    parser.add_argument('--shared-weights', action='store_true',
+                        help="Процессы анализа GUI используют одну копию весов модели в разделяемой памяти")
+    parser.add_argument('--cascade-threshold', type=float, default=None,
+                        help="Каскадный режим: окна с уверенностью ученика ниже порога анализирует полная модель")
+    parser.add_argument('--analysis-backend', choices=ANALYSIS_BACKENDS, default='process',
+                        help="thread - анализ в потоке окна, process - в отдельном процессе")
+    parser.add_argument('--max-jobs', type=int, default=1,
+                        help="Сколько задач очереди анализа выполняется одновременно")
+    parser.add_argument('--window-size', type=float, default=2.0,
+                        help="Размер окна анализа, сек")
+    parser.add_argument('--step', type=float, default=0.5,
+                        help="Шаг окон анализа, сек")
+    parser.add_argument('--memory-budget', default=None,
+                        help="Лимит памяти (например 2G или auto - по лимиту cgroup): "
+                             "размеры батчей и буферов чтения подбираются под него")
+
+    subparsers = parser.add_subparsers(dest='command')
+
+    autotune_parser = subparsers.add_parser(
+        'autotune', help="Подобрать потоки, размер батча и бэкенд инференса для этой машины"
+    )
+    autotune_parser.add_argument('--language', default='English', help="Модель для замеров")
+    autotune_parser.add_argument('--models-dir', default=None, help="Каталог с моделями")
+    autotune_parser.add_argument('--threads', type=int, nargs='+', default=None,
+                                 help="Варианты intra-op потоков")
+    autotune_parser.add_argument('--interop-threads', type=int, nargs='+', default=None,
+                                 help="Варианты inter-op потоков")
+    autotune_parser.add_argument('--batch-sizes', type=int, nargs='+', default=None,
+                                 help="Варианты размера батча")
+    autotune_parser.add_argument('--windows', type=int, default=32,
+                                 help="Количество синтетических окон в одном замере")
+    autotune_parser.add_argument('--repeats', type=int, default=3, help="Повторов каждого замера")
+    autotune_parser.add_argument('--exhaustive', action='store_true',
+                                 help="Перебрать все сочетания вместо покоординатного поиска")
+
+    distill_parser = subparsers.add_parser(
+        'distill', help="Обучить облегченную модель-ученика на локальном каталоге с аудио"
+    )
+    distill_parser.add_argument('audio_dir', help="Каталог с аудиофайлами для обучения")
+    distill_parser.add_argument('--language', default='English', help="Модель-учитель")
+    distill_parser.add_argument('--models-dir', default=None, help="Каталог с моделями")
+    distill_parser.add_argument('--layers', type=int, default=4, help="Количество слоев трансформера ученика")
+    distill_parser.add_argument('--epochs', type=int, default=30, help="Эпох обучения головы")
+    distill_parser.add_argument('--max-windows', type=int, default=None, help="Ограничение количества окон")
+
+    bundle_parser = subparsers.add_parser('bundle', help="Офлайн-пакеты моделей")
+    bundle_subparsers = bundle_parser.add_subparsers(dest='bundle_command', required=True)
+    pack_parser = bundle_subparsers.add_parser('pack', help="Упаковать models/<язык> в архив")
+    pack_parser.add_argument('--language', default='English', help="Язык модели")
+    pack_parser.add_argument('--models-dir', default=None, help="Каталог с моделями")
+    pack_parser.add_argument('-o', '--output', default=None, help="Путь к пакету (по умолчанию <язык>.vabundle)")
+    pack_parser.add_argument('--workers', type=int, default=4, help="Потоков для подсчета контрольных сумм")
+    unpack_parser = bundle_subparsers.add_parser('unpack', help="Распаковать пакет в каталог моделей")
+    unpack_parser.add_argument('bundle', help="Путь к пакету")
+    unpack_parser.add_argument('--language', default=None, help="Язык (по умолчанию из манифеста)")
+    unpack_parser.add_argument('--models-dir', default=None, help="Каталог с моделями")
+    unpack_parser.add_argument('--workers', type=int, default=4, help="Потоков распаковки")
+
+    results_parser = subparsers.add_parser('results', help="Поиск в сохраненных результатах анализа")
+    results_parser.add_argument('--emotion', default='anger', help="Эмоция (anger, happy, sad, neutral, ...)")
+    results_parser.add_argument('--min-score', type=float, default=0.7, help="Порог уверенности")
+    results_parser.add_argument('--min-duration', type=float, default=5.0, help="Минимальная длительность, сек")
+    results_parser.add_argument('--days', type=float, default=None, help="Только файлы за последние N дней")
+    results_parser.add_argument('--results-dir', default=None, help="Каталог хранилища результатов")
+
+    analyze_parser = subparsers.add_parser(
+        'analyze', help="Пакетный анализ файлов без GUI с упаковкой окон разных файлов в общие батчи"
+    )
+    analyze_parser.add_argument('paths', nargs='+', help="Аудиофайлы или каталоги с ними")
+    analyze_parser.add_argument('--language', default='English', help="Язык модели")
+    analyze_parser.add_argument('--output-dir', default=None,
+                                help="Каталог для шкал в JSON (по умолчанию шкалы не сохраняются в файлы)")
+    analyze_parser.add_argument('--store', action='store_true', help="Добавить результаты в хранилище результатов")
+    analyze_parser.add_argument('--results-dir', default=None, help="Каталог хранилища результатов")
+    analyze_parser.add_argument('--batch-size', type=int, default=None,
+                                help="Размер батча (по умолчанию из профиля autotune)")
+    analyze_parser.add_argument('--decode-ahead', type=int, default=4,
+                                help="Сколько файлов декодировать заранее")
+    analyze_parser.add_argument('--embedding-cache', nargs='?', const='embeddings', default=None,
+                                help="Кэш эмбеддингов окон (каталог, по умолчанию embeddings): "
+                                     "повторный анализ тех же файлов не запускает модель")
+    analyze_parser.add_argument('--temperature', type=float, default=1.0,
+                                help="Температура softmax при оценке окон")
+    analyze_parser.add_argument('--fingerprint-cache', type=int, nargs='?', const=10000, default=None,
+                                help="Кэш предсказаний по спектральному отпечатку окна (размер, по умолчанию "
+                                     "10000 окон): повторы музыки ожидания, подсказок и сигналов не идут в модель")
+
+    report_parser = subparsers.add_parser(
+        'report', help="Отчеты PNG/SVG/HTML по сохраненным шкалам без GUI (в пуле процессов)"
+    )
+    report_parser.add_argument('paths', nargs='*', help="JSON-шкалы команды analyze или каталоги с ними")
+    report_parser.add_argument('--from-store', action='store_true', help="Отчеты по хранилищу результатов")
+    report_parser.add_argument('--days', type=float, default=None, help="Только файлы за последние N дней")
+    report_parser.add_argument('--results-dir', default=None, help="Каталог хранилища результатов")
+    report_parser.add_argument('-o', '--output-dir', default='reports', help="Каталог отчетов")
+    report_parser.add_argument('--formats', nargs='+', default=['png', 'html'],
+                               choices=['png', 'svg', 'html'], help="Форматы отчетов")
+    report_parser.add_argument('--workers', type=int, default=None,
+                               help="Процессов отрисовки (по умолчанию по числу ядер)")
+    report_parser.add_argument('--dpi', type=int, default=100, help="Разрешение PNG")
+    report_parser.add_argument('--noise-threshold', type=float, default=0.05,
+                               help="Оценки не выше порога считаются шумом")
+    report_parser.add_argument('--smoothing-window', type=int, default=5,
+                               help="Окно сглаживания в точках шкалы")
+
+    live_parser = subparsers.add_parser(
+        'live', help="Анализ записи с микрофона на лету: при медленном инференсе устаревшие окна пропускаются"
+    )
+    live_parser.add_argument('--language', default='English', help="Язык модели")
+    live_parser.add_argument('--duration', type=float, default=None,
+                             help="Длительность записи, сек (по умолчанию до Ctrl+C)")
+    live_parser.add_argument('--recorder-mode', choices=['callback', 'spill'], default='callback',
+                             help="Режим записи AudioRecorder")
+    live_parser.add_argument('--device', default=None, help="Индекс или имя устройства ввода")
+    live_parser.add_argument('--max-step-factor', type=int, default=8,
+                             help="Во сколько раз можно загрубить шаг при медленном инференсе (1 - не загрублять)")
+    live_parser.add_argument('--backfill', action='store_true',
+                             help="После остановки досчитать пропущенные окна по полной записи")
+    live_parser.add_argument('-o', '--output', default=None,
+                             help="JSON со шкалой и пропущенными отрезками (формат команды analyze)")
+
+    args = parser.parse_args(argv)
+    if args.window_size <= 0 or args.step <= 0:
+        parser.error("--window-size и --step должны быть положительными")
+    if args.shared_weights and not sys.platform.startswith("linux"):
+        parser.error("--shared-weights поддерживается только в Linux")
+    return args
+
+def run_autotune(args):
+    """Команда autotune: подбор и сохранение профиля выполнения"""
+    from model.autotune import autotune, DEFAULT_BATCH_SIZES
+
+    profile, _ = autotune(
+        models_dir=args.models_dir,
+        language=args.language,
+        thread_options=args.threads,
+        interop_options=args.interop_threads,
+        batch_sizes=args.batch_sizes or DEFAULT_BATCH_SIZES,
+        n_windows=args.windows,
+        repeats=args.repeats,
+        exhaustive=args.exhaustive
+    )
+    print(f"Лучшая конфигурация: потоки {profile['intra_op_threads']}/{profile['inter_op_threads']}, "
+          f"батч {profile['batch_size']}, бэкенд {profile['backend']}, "
+          f"{profile['windows_per_sec']:.2f} окон/сек")
+
+def run_distill(args):
+    """Команда distill: обучение ученика и отчет об ускорении"""
+    from model.distill import distill
+
+    report = distill(
+        EmotionModelLoader(args.models_dir),
+        args.audio_dir,
+        language=args.language,
+        num_layers=args.layers,
+        epochs=args.epochs,
+        max_windows=args.max_windows
+    )
+    print(f"Ученик ({report['num_layers']} слоев): ускорение {report['speedup']:.2f}x, "
+          f"совпадение меток с учителем {report['label_agreement']:.1%}")
+    for row in report['cascade']:
+        print(f"  каскад с порогом {row['threshold']:.2f}: эскалаций {row['escalated_share']:.1%}, "
+              f"совпадение {row['label_agreement']:.1%}, ускорение {row['speedup']:.2f}x")
+
+def run_bundle(args):
+    """Команда bundle: упаковка и распаковка моделей без доступа к сети"""
+    from model.bundle import pack_model, unpack_model, BUNDLE_EXTENSION
+
+    model_loader = EmotionModelLoader(args.models_dir)
+    if args.bundle_command == 'pack':
+        output = args.output or args.language + BUNDLE_EXTENSION
+        manifest = pack_model(model_loader.get_model_path(args.language), output, args.language, args.workers)
+        print(f"Пакет {output}: {len(manifest['files'])} файлов")
+    else:
+        model_path = unpack_model(args.bundle, model_loader.models_dir, args.language, args.workers)
+        print(f"Модель распакована в {model_path}")
+
+def run_results(args):
+    """Команда results: отрезки с эмоцией выше порога в сохраненных результатах"""
+    from analysis.results_store import ResultsStore
+
+    since = time.time() - args.days * 24 * 3600 if args.days is not None else None
+    start = time.perf_counter()
+    segments = ResultsStore(args.results_dir).find_segments(
+        args.emotion, args.min_score, args.min_duration, since=since
+    )
+    elapsed = time.perf_counter() - start
+    for segment in segments:
+        print(f"{segment['source']}: {segment['start']:.1f}-{segment['end']:.1f} сек "
+              f"({segment['duration']:.1f} сек, максимум {segment['peak']:.2f})")
+    print(f"Найдено отрезков: {len(segments)} за {elapsed * 1000:.1f} мс")
+
+def expand_audio_paths(paths):
+    """Файлы из аргументов; каталоги раскрываются в аудиофайлы (рекурсивно, по порядку)"""
+    from model.distill import AUDIO_EXTENSIONS
+
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(str(p) for p in path.rglob('*') if p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(str(path))
+    return files
+
+def run_analyze(args):
+    """Команда analyze: анализ множества файлов с упаковкой окон в полные батчи"""
+    import json
+    from model.predict import EmotionPredictor
+    from model.embedding_cache import EmbeddingCache
+    from model.fingerprint_cache import FingerprintCache
+    from analysis.packer import WindowPacker
+    from analysis.results_store import ResultsStore
+
+    files = expand_audio_paths(args.paths)
+    # --mmap-weights уже применен к общему загрузчику в main()
+    predictor = EmotionPredictor(
+        cascade_threshold=args.cascade_threshold,
+        embedding_cache=EmbeddingCache(args.embedding_cache) if args.embedding_cache else None,
+        fingerprint_cache=FingerprintCache(args.fingerprint_cache) if args.fingerprint_cache else None
+    )
+    predictor.temperature = args.temperature
+    predictor.update_model_for_language(args.language)
+    packer = WindowPacker(predictor, window_size=args.window_size, step=args.step,
+                          batch_size=args.batch_size, decode_ahead=args.decode_ahead)
+    store = ResultsStore(args.results_dir) if args.store else None
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    failed = 0
+    for index, (path, timeline_data, error) in enumerate(packer.run(files)):
+        if error is not None:
+            failed += 1
+            print(f"{path}: ошибка: {error}")
+            continue
+        print(f"{path}: {len(timeline_data)} точек")
+        if args.output_dir:
+            # Номер в имени различает одноименные файлы из разных каталогов
+            output = os.path.join(args.output_dir, f"{index:05d}_{Path(path).stem}.json")
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump({'source': path, 'language': args.language, 'window_size': args.window_size,
+                           'step': args.step, 'timeline': timeline_data}, f, ensure_ascii=False)
+        if store is not None:
+            store.append(timeline_data, path, args.language)
+    if store is not None:
+        store.close()
+    elapsed = time.perf_counter() - start
+    stats = packer.stats
+    print(f"Файлов: {stats['files']} (ошибок {failed}), окон: {stats['windows']} за {elapsed:.1f} сек "
+          f"({stats['windows'] / max(elapsed, 1e-9):.1f} окон/сек), "
+          f"средний батч {stats['windows'] / max(1, stats['batches']):.1f}")
+    if predictor.fingerprint_cache is not None:
+        cache_stats = predictor.fingerprint_cache.stats()
+        print(f"Кэш отпечатков: попаданий {cache_stats['hits']} (неточных {cache_stats['near_hits']}), "
+              f"промахов {cache_stats['misses']}, доля попаданий {cache_stats['hit_rate']:.1%}, "
+              f"вытеснено {cache_stats['evictions']}")
+
+def run_report(args):
+    """Команда report: пакетная отрисовка отчетов на бэкенде Agg"""
+    from analysis.report import render_reports
+    from analysis.results_store import ResultsStore
+
+    sources = []
+    for path in map(Path, args.paths):
+        if path.is_dir():
+            sources.extend(sorted(str(p) for p in path.rglob('*.json')))
+        else:
+            sources.append(str(path))
+    if args.from_store:
+        store = ResultsStore(args.results_dir)
+        since = time.time() - args.days * 24 * 3600 if args.days is not None else None
+        sources.extend(('store', store.store_dir, row['id']) for row in store.list_files(since=since))
+    if not sources:
+        print("Нет шкал для отчетов: укажите JSON-файлы или --from-store")
+        return
+
+    start = time.perf_counter()
+    failed = 0
+    timeline_options = {'noise_threshold': args.noise_threshold, 'smoothing_window': args.smoothing_window}
+    results = render_reports(sources, args.output_dir, args.formats, args.workers, args.dpi, timeline_options)
+    for source, written, error in results:
+        if error is not None:
+            failed += 1
+            print(f"{source}: ошибка: {error}")
+    elapsed = time.perf_counter() - start
+    print(f"Отчетов: {len(sources) - failed} (ошибок {failed}) в {args.output_dir} за {elapsed:.1f} сек "
+          f"({len(sources) / max(elapsed, 1e-9):.1f} отчетов/сек)")
+
+def run_live(args):
+    """Команда live: анализ идущей записи с учетом срока и досчетом пропусков"""
+    import json
+    from audio.recorder import AudioRecorder
+    from model.predict import EmotionPredictor
+    from analysis.realtime import RealtimeAnalyzer
+
+    device = int(args.device) if args.device is not None and args.device.isdigit() else args.device
+    recorder = AudioRecorder(mode=args.recorder_mode, device=device)
+    predictor = EmotionPredictor(cascade_threshold=args.cascade_threshold)
+    predictor.update_model_for_language(args.language)
+
+    def print_point(point):
+        top = point['emotions'][0]
+        print(f"{point['time']:7.1f} сек: {top['label']} ({top['score']:.2f}), "
+              f"шаг x{analyzer.step_factor()}, инференс {analyzer.latency:.2f} сек")
+
+    analyzer = RealtimeAnalyzer(predictor, recorder, window_size=args.window_size, step=args.step,
+                                max_step_factor=args.max_step_factor, on_point=print_point)
+    recorder.start_recording()
+    analyzer.start()
+    print("Идет запись, остановка - Ctrl+C")
+    try:
+        if args.duration is not None:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    analyzer.stop()
+    audio_data, sample_rate = recorder.stop_recording()
+
+    if args.backfill:
+        timeline_data = analyzer.backfill(audio_data, sample_rate)
+    else:
+        timeline_data = analyzer.snapshot()[0]
+    stats = analyzer.stats
+    print(f"Точек: {len(timeline_data)}, проанализировано на лету {stats['analyzed']}, "
+          f"пропущено {stats['skipped']}, досчитано {stats['backfilled']}, "
+          f"наибольшее отставание {stats['max_lag']:.2f} сек")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'source': recorder.spill_file_path or 'live', 'language': args.language,
+                       'window_size': args.window_size, 'step': args.step,
+                       'timeline': timeline_data, 'skipped': analyzer.skipped}, f, ensure_ascii=False)
+
 def check_dependencies():
     """Проверка наличия необходимых зависимостей"""
     try:
@@ -41,7 +383,7 @@ def check_dependencies():
 def init_model(models_dir):
     """Инициализация модели при запуске"""
     try:
-        model_loader = EmotionModelLoader(models_dir)
+        model_loader = EmotionModelLoader.shared(models_dir)
         if model_loader.load_model():
             logger.info("Модель успешно загружена")
             cache_info = model_loader.get_cache_info()
@@ -56,13 +398,50 @@ def init_model(models_dir):
         return False
 
 def main():
+    args = parse_args()
+    setup_logging(
+        mode=args.log_mode,
+        level=getattr(logging, args.log_level),
+        sample_every=args.log_sample_every
+    )
+
     try:
         # Проверка зависимостей
         if not check_dependencies():
             sys.exit(1)
 
+        if args.mmap_weights:
+            EmotionModelLoader.shared().mmap_weights = True
+        if args.memory_budget:
+            # Через переменную окружения бюджет наследует и процесс анализа GUI
+            set_memory_budget(args.memory_budget)
+
+        if args.command == 'autotune':
+            run_autotune(args)
+            return
+        if args.command == 'distill':
+            run_distill(args)
+            return
+        if args.command == 'bundle':
+            run_bundle(args)
+            return
+        if args.command == 'results':
+            run_results(args)
+            return
+        if args.command == 'analyze':
+            run_analyze(args)
+            return
+        if args.command == 'report':
+            run_report(args)
+            return
+        if args.command == 'live':
+            run_live(args)
+            return
+
         # Запуск GUI
-        launch_gui()
+        launch_gui(cascade_threshold=args.cascade_threshold, analysis_backend=args.analysis_backend,
+                   mmap_weights=args.mmap_weights, max_concurrent_jobs=args.max_jobs,
+                   window_size=args.window_size, step=args.step, shared_weights=args.shared_weights)
 
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
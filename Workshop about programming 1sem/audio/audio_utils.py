@@ -1,17 +1,37 @@
+import tempfile
 import numpy as np
 import soundfile as sf
-import librosa
 import logging
+from .ingest import read_audio, read_audio_blocks, DEFAULT_RESAMPLE_QUALITY, TARGET_SAMPLE_RATE
+from model.memory_budget import get_memory_budget
 
 logger = logging.getLogger(__name__)
 
 class AudioProcessor:
     @staticmethod
-    def load_audio(file_path):
-        """Загрузка аудиофайла и преобразование в нужный формат"""
+    def load_audio(file_path, mono=True, quality=DEFAULT_RESAMPLE_QUALITY):
+        """Загрузка аудиофайла и преобразование в нужный формат
+
+        Файлы читаются напрямую через soundfile, ресэмплинг выполняется только если
+        частота отличается от 16 кГц. librosa используется для форматов,
+        которые soundfile не поддерживает.
+
+        Args:
+            file_path (str): Путь к аудиофайлу
+            mono (bool): Сводить ли каналы в моно. При mono=False данные имеют
+                форму (сэмплы, каналы) даже для одноканальных файлов
+            quality (str): Качество ресэмплинга ('fast', 'medium', 'high')
+        """
         try:
-            # Загружаем как моно
-            audio, sr = librosa.load(file_path, sr=16000, mono=True)
+            try:
+                budget = get_memory_budget()
+                if budget is not None:
+                    audio, sr = AudioProcessor.load_audio_budgeted(file_path, budget, mono, quality)
+                else:
+                    audio, sr = read_audio(file_path, sr=TARGET_SAMPLE_RATE, mono=mono, quality=quality)
+            except (sf.LibsndfileError, RuntimeError, TypeError) as e:
+                logger.debug("soundfile не прочитал %s (%s), используется librosa", file_path, e)
+                audio, sr = AudioProcessor.load_audio_librosa(file_path, mono)
             logger.debug(f"Аудиофайл загружен: {file_path}, длительность: {len(audio)/sr:.1f} сек")
             return audio, sr
         except Exception as e:
@@ -19,16 +39,57 @@ class AudioProcessor:
             raise
 
     @staticmethod
-    def process_audio(audio_data, sr):
-        """Предобработка аудио для модели"""
+    def load_audio_budgeted(file_path, budget, mono=True, quality=DEFAULT_RESAMPLE_QUALITY):
+        """Загрузка в пределах бюджета памяти
+
+        Если полное декодирование не помещается в свободную память, файл читается
+        блоками; если не помещается и результат, он пишется во временный файл,
+        отображенный в память (np.memmap), и страницы вытесняются ядром, а не OOM.
+        """
+        info = sf.info(file_path)
+        out_frames = -(-info.frames * TARGET_SAMPLE_RATE // info.samplerate)
+        out_bytes = out_frames * (1 if mono else info.channels) * 4
+        # Полное чтение держит декодированный файл, сведенную в моно копию и результат
+        if budget.fits(info.frames * info.channels * 4 * 2 + out_bytes):
+            return read_audio(file_path, sr=TARGET_SAMPLE_RATE, mono=mono, quality=quality)
+
+        out = None
+        if not budget.fits(out_bytes):
+            out = lambda shape: np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode='w+', shape=shape)
+        block_frames = budget.block_frames(info.channels * 4 * 3)
+        logger.info("Файл %s читается блоками по %d кадров (результат %s)", file_path, block_frames,
+                    "во временном файле" if out is not None else "в памяти")
+        return read_audio_blocks(file_path, TARGET_SAMPLE_RATE, mono, quality, block_frames, out)
+
+    @staticmethod
+    def load_audio_librosa(file_path, mono=True):
+        """Загрузка аудиофайла через librosa (прежний путь, медленнее для WAV/FLAC)"""
+        import librosa
+
+        audio, sr = librosa.load(file_path, sr=TARGET_SAMPLE_RATE, mono=mono)
+        if not mono:
+            # librosa возвращает (каналы, сэмплы), приводим к (сэмплы, каналы)
+            audio = np.atleast_2d(audio).T
+        return audio, sr
+
+    @staticmethod
+    def process_audio(audio_data, sr, mono=True):
+        """Предобработка аудио для модели
+
+        При mono=False каналы (сэмплы, каналы) сохраняются и нормализуются независимо
+        """
         try:
             # Убеждаемся, что аудио одноканальное
-            if len(audio_data.shape) > 1:
+            if mono and len(audio_data.shape) > 1:
                 audio_data = np.mean(audio_data, axis=1)
                 logger.debug("Преобразование в моно")
             
             # Нормализация
-            audio_data = audio_data / np.max(np.abs(audio_data))
+            if audio_data.ndim > 1:
+                peak = np.max(np.abs(audio_data), axis=0)
+                audio_data = audio_data / np.where(peak > 0, peak, 1.0)
+            else:
+                audio_data = audio_data / np.max(np.abs(audio_data))
             logger.debug("Аудио нормализовано")
             
             return audio_data
@@ -37,11 +98,11 @@ class AudioProcessor:
             raise
 
     @staticmethod
-    def save_audio(audio_data, sr, file_path):
+    def save_audio(audio_data, sr, file_path, mono=True):
         """Сохранение аудио в файл"""
         try:
             # Убеждаемся, что аудио одноканальное
-            if len(audio_data.shape) > 1:
+            if mono and len(audio_data.shape) > 1:
                 audio_data = np.mean(audio_data, axis=1)
                 logger.debug("Преобразование в моно перед сохранением")
                 
@@ -0,0 +1,105 @@
+import struct
+import threading
+import numpy as np
+import soundfile as sf
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DiskAudio:
+    """Аудиофайл на диске с интерфейсом массива (len и срезы)
+
+    Несжатые WAV с float32 отображаются в память через np.memmap, остальные форматы
+    читаются кусками через soundfile. В памяти держится только запрошенный срез,
+    поэтому длина записи не ограничена объемом RAM.
+    """
+
+    def __init__(self, file_path, scale=1.0):
+        self.file_path = file_path
+        self.scale = scale
+        info = sf.info(file_path)
+        self.sample_rate = info.samplerate
+        self.channels = info.channels
+        self.frames = info.frames
+        self.dtype = np.dtype(np.float32)
+        self._lock = threading.Lock()
+        self._file = None
+        self._memmap = self._open_memmap()
+        logger.debug("Аудио с диска: %s, %d сэмплов, memmap=%s",
+                     file_path, self.frames, self._memmap is not None)
+
+    def _open_memmap(self):
+        """Отображение блока данных WAV (float32) в память, если это возможно"""
+        try:
+            with open(self.file_path, 'rb') as f:
+                riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+                if riff != b'RIFF' or wave != b'WAVE':
+                    return None
+                format_tag = None
+                bits = None
+                while True:
+                    header = f.read(8)
+                    if len(header) < 8:
+                        return None
+                    chunk_id, chunk_size = struct.unpack('<4sI', header)
+                    if chunk_id == b'fmt ':
+                        fmt = f.read(chunk_size)
+                        format_tag, _, _, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+                        if format_tag == 0xFFFE and len(fmt) >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                            format_tag = struct.unpack('<H', fmt[24:26])[0]
+                        f.seek(chunk_size % 2, 1)
+                    elif chunk_id == b'data':
+                        if format_tag != 3 or bits != 32:  # Только IEEE float32
+                            return None
+                        shape = (self.frames,) if self.channels == 1 else (self.frames, self.channels)
+                        return np.memmap(self.file_path, dtype='<f4', mode='r',
+                                         offset=f.tell(), shape=shape)
+                    else:
+                        f.seek(chunk_size + chunk_size % 2, 1)
+        except Exception as e:
+            logger.debug("Memmap недоступен для %s: %s", self.file_path, e)
+            return None
+
+    @property
+    def shape(self):
+        return (self.frames,) if self.channels == 1 else (self.frames, self.channels)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("DiskAudio поддерживает только непрерывные срезы")
+        start, stop, _ = key.indices(self.frames)
+        return self.read(start, max(0, stop - start))
+
+    def read(self, start, frames):
+        """Чтение frames сэмплов начиная с позиции start"""
+        if self._memmap is not None:
+            data = np.array(self._memmap[start:start + frames], dtype=np.float32)
+        else:
+            with self._lock:
+                if self._file is None:
+                    self._file = sf.SoundFile(self.file_path)
+                self._file.seek(start)
+                data = self._file.read(frames, dtype='float32', always_2d=self.channels > 1)
+        if self.scale != 1.0:
+            data *= self.scale
+        return data
+
+    def iter_blocks(self, block_size):
+        """Последовательное чтение файла блоками"""
+        for start in range(0, self.frames, block_size):
+            yield self.read(start, min(block_size, self.frames - start))
+
+    def close(self):
+        """Освобождение файловых ресурсов"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self._memmap = None
@@ -0,0 +1,130 @@
+import hashlib
+import logging
+from functools import lru_cache
+from math import gcd
+import numpy as np
+import soundfile as sf
+from scipy.signal import firwin, resample_poly
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+
+# Качество полифазного ресэмплинга: (половина длины фильтра на фазу, параметр beta окна Кайзера).
+# medium совпадает с настройками scipy.signal.resample_poly по умолчанию
+RESAMPLE_QUALITIES = {
+    'fast': (4, 5.0),
+    'medium': (10, 5.0),
+    'high': (32, 8.6),
+}
+DEFAULT_RESAMPLE_QUALITY = 'medium'
+
+HASH_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def audio_digest(audio_data):
+    """Хеш сэмплов аудио (blake2b); массив читается блоками, поэтому подходит и для np.memmap"""
+    digest = hashlib.blake2b(digest_size=16)
+    flat = np.ascontiguousarray(audio_data).reshape(-1)
+    block = max(1, HASH_BLOCK_BYTES // max(1, flat.itemsize))
+    for start in range(0, len(flat), block):
+        digest.update(memoryview(np.ascontiguousarray(flat[start:start + block])).cast('B'))
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=32)
+def _design_filter(up, down, quality):
+    """Антиалиасинговый FIR-фильтр для полифазного ресэмплинга up/down"""
+    taps_per_phase, beta = RESAMPLE_QUALITIES[quality]
+    max_rate = max(up, down)
+    half_len = taps_per_phase * max_rate
+    return firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', beta))
+
+
+def resample(audio, orig_sr, target_sr=TARGET_SAMPLE_RATE, quality=DEFAULT_RESAMPLE_QUALITY):
+    """Полифазный ресэмплинг по оси сэмплов (ось 0)
+
+    Если частоты совпадают, данные возвращаются без копирования.
+    """
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"Неизвестное качество ресэмплинга: {quality}")
+    if orig_sr == target_sr:
+        return audio
+    divisor = gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // divisor, int(orig_sr) // divisor
+    resampled = resample_poly(audio, up, down, axis=0, window=_design_filter(up, down, quality))
+    return resampled.astype(np.float32, copy=False)
+
+
+def read_audio(file_path, sr=TARGET_SAMPLE_RATE, mono=True, quality=DEFAULT_RESAMPLE_QUALITY):
+    """Чтение аудиофайла через soundfile с ресэмплингом только при необходимости
+
+    Returns:
+        tuple: (аудио float32, частота дискретизации). При mono=False форма (сэмплы, каналы)
+
+    Raises:
+        sf.LibsndfileError: если формат не поддерживается soundfile
+    """
+    audio, orig_sr = sf.read(file_path, dtype='float32', always_2d=True)
+    if mono:
+        audio = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1, dtype=np.float32)
+    if sr is not None and orig_sr != sr:
+        logger.debug("Ресэмплинг %s: %d -> %d Гц (%s)", file_path, orig_sr, sr, quality)
+        audio = resample(audio, orig_sr, sr, quality)
+        orig_sr = sr
+    return np.ascontiguousarray(audio), orig_sr
+
+def read_audio_blocks(file_path, sr=TARGET_SAMPLE_RATE, mono=True, quality=DEFAULT_RESAMPLE_QUALITY,
+                      block_frames=1 << 20, out=None):
+    """Чтение и ресэмплинг аудиофайла блоками с ограниченным промежуточным буфером
+
+    Каждый блок читается с запасом по краям, равным длине фильтра, поэтому результат
+    совпадает с ресэмплингом всего файла сразу, а в памяти одновременно находится
+    только один блок исходных данных.
+
+    Args:
+        block_frames (int): Размер блока в кадрах исходного файла
+        out: Функция out(форма) -> массив float32 для результата (например, np.memmap);
+            по умолчанию np.empty
+
+    Returns:
+        tuple: (аудио float32, частота дискретизации). При mono=False форма (сэмплы, каналы)
+    """
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"Неизвестное качество ресэмплинга: {quality}")
+    with sf.SoundFile(file_path) as f:
+        orig_sr, channels, n_in = f.samplerate, f.channels, f.frames
+        target_sr = sr if sr is not None else orig_sr
+        divisor = gcd(int(orig_sr), int(target_sr))
+        up, down = int(target_sr) // divisor, int(orig_sr) // divisor
+        n_out = -(-n_in * up // down)
+        shape = (n_out,) if mono else (n_out, channels)
+        result = out(shape) if out is not None else np.empty(shape, dtype=np.float32)
+
+        def read(start, stop):
+            f.seek(start)
+            block = f.read(stop - start, dtype='float32', always_2d=True)
+            if mono:
+                block = block[:, 0] if channels == 1 else block.mean(axis=1, dtype=np.float32)
+            return block
+
+        if up == down:
+            for start in range(0, n_in, block_frames):
+                stop = min(start + block_frames, n_in)
+                result[start:stop] = read(start, stop)
+            return result, orig_sr
+
+        taps = _design_filter(up, down, quality)
+        # Запас по краям блока (во входных кадрах), кратный down, чтобы границы выхода были целыми
+        pad = -(-((len(taps) // 2) // up + 1) // down) * down
+        block = max(1, block_frames // down) * down
+        logger.debug("Блочный ресэмплинг %s: %d -> %d Гц, блок %d кадров", file_path, orig_sr, target_sr, block)
+        for start in range(0, n_in, block):
+            stop = min(start + block, n_in)
+            first, last = max(0, start - pad), min(n_in, stop + pad)
+            resampled = resample_poly(read(first, last), up, down, axis=0, window=taps)
+            out_start = start * up // down
+            out_stop = n_out if stop == n_in else stop * up // down
+            offset = out_start - first * up // down
+            result[out_start:out_stop] = resampled[offset:offset + out_stop - out_start]
+    return result, target_sr
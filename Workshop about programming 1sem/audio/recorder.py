@@ -1,43 +1,120 @@
 import sounddevice as sd
+import soundfile as sf
 import numpy as np
 import threading
 import time
+import os
 from datetime import datetime
 import logging
+from .ring_buffer import AudioRingBuffer
+from .disk_audio import DiskAudio
 
 logger = logging.getLogger(__name__)
 
+# blocking - поток с циклом stream.read, callback - колбэк sounddevice с кольцевым буфером,
+# spill - колбэк с постоянной записью блоков в файл и ограниченным хвостом в памяти
+RECORDER_MODES = ("blocking", "callback", "spill")
+
+# Емкость промежуточного буфера и период сброса на диск в режиме spill
+SPILL_BUFFER_SECONDS = 5
+SPILL_FLUSH_INTERVAL = 0.25
+# Команда libsndfile: записать текущие размеры данных в заголовок файла
+SFC_UPDATE_HEADER_NOW = 0x1060
+# Сбрасывается, если в установленной версии soundfile нет нужных внутренних атрибутов
+_header_update_available = True
+
+
+def update_file_header(sound_file):
+    """Перезапись заголовка открытого на запись файла (размеры RIFF и data в WAV)
+
+    soundfile не дает прямого доступа к этой команде, поэтому она вызывается
+    через его обертку libsndfile. Для форматов без размеров в заголовке (FLAC) ничего не делает.
+    Если обертка недоступна, файл только сбрасывается на диск (заголовок допишется при закрытии).
+    """
+    global _header_update_available
+    if _header_update_available:
+        try:
+            sf._snd.sf_command(sound_file._file, SFC_UPDATE_HEADER_NOW, sf._ffi.NULL, 0)
+            return
+        except AttributeError as e:
+            _header_update_available = False
+            logger.warning(f"Заголовок файла записи не обновляется на лету ({e}): "
+                           f"до остановки записи файл может читаться не всеми декодерами")
+    sound_file.flush()
+
 class AudioRecorder:
-    def __init__(self):
+    def __init__(self, mode="blocking", device=None, stream_factory=None, buffer_seconds=60,
+                 spill_path=None, tail_seconds=30, channels=1):
+        """
+        Args:
+            mode (str): Режим записи из RECORDER_MODES
+            device (int | str): Индекс или имя устройства ввода (по умолчанию - первое подходящее)
+            stream_factory (callable): Замена sd.InputStream (например, фейковый поток для тестов)
+            buffer_seconds (float): Начальная емкость кольцевого буфера в режиме callback
+            spill_path (str): Файл для режима spill (WAV или FLAC, по умолчанию recording_<время>.wav)
+            tail_seconds (float): Сколько последних секунд хранить в памяти в режиме spill
+            channels (int): Количество записываемых каналов. При channels > 1 каналы
+                не сводятся в моно, данные имеют форму (сэмплы, каналы)
+        """
+        if mode not in RECORDER_MODES:
+            raise ValueError(f"Неизвестный режим записи: {mode}")
         self.recording = False
         self.audio_data = []
         self.sample_rate = 16000
-        self.check_audio_device()
+        self.block_size = 2048
+        self.channels = channels
+        self.mode = mode
+        self.buffer_seconds = buffer_seconds
+        self.stream_factory = stream_factory or sd.InputStream
+        self.stream = None
+        self.ring_buffer = None
+        self.status_errors = 0
+        self.spill_path = spill_path
+        self.spill_file_path = None
+        self.tail_seconds = tail_seconds
+        self._tail = None
+        self._tail_lock = threading.Lock()
+        if device is None:
+            self.check_audio_device()
+        else:
+            self.device = device
         
     def check_audio_device(self):
         """Проверка наличия устройства записи"""
         try:
             devices = sd.query_devices()
-            input_devices = [d for d in devices if d['max_input_channels'] > 0]
+            input_devices = [d for d in devices if d['max_input_channels'] >= self.channels]
             if not input_devices:
-                raise RuntimeError("Устройство записи не найдено")
+                raise RuntimeError(f"Устройство записи с {self.channels} каналами не найдено")
             # Выбираем первое доступное устройство ввода
             self.device = input_devices[0]['index']
         except Exception as e:
             raise RuntimeError(f"Ошибка при инициализации устройства записи: {e}")
         
+    @property
+    def overruns(self):
+        """Количество блоков, отброшенных из-за переполнения буфера"""
+        return self.ring_buffer.overruns if self.ring_buffer is not None else 0
+
     def start_recording(self):
         """Начать запись аудио"""
         if self.recording:
             return
             
+        if self.mode == "callback":
+            self._start_callback_recording()
+            return
+        if self.mode == "spill":
+            self._start_spill_recording()
+            return
+
         self.recording = True
         self.audio_data = []
         
         def record():
             try:
                 with sd.InputStream(samplerate=self.sample_rate, 
-                                 channels=1, 
+                                 channels=self.channels, 
                                  dtype=np.float32,
                                  device=self.device,
                                  blocksize=2048) as stream:  # Увеличиваем размер блока
@@ -46,11 +123,11 @@ class AudioRecorder:
                             audio_chunk, _ = stream.read(2048)  # Читаем больший блок
                             if len(audio_chunk) > 0:
                                 # Нормализуем данные
-                                normalized_chunk = audio_chunk.flatten()
+                                normalized_chunk = audio_chunk.flatten() if self.channels == 1 else audio_chunk.copy()
                                 if np.max(np.abs(normalized_chunk)) > 0.001:  # Проверяем, есть ли звук
                                     self.audio_data.append(normalized_chunk)
                                     if len(self.audio_data) % 50 == 0:  # Логируем чаще
-                                        logger.debug(f"Записано {len(self.audio_data)} блоков аудио")
+                                        logger.debug("Записано %d блоков аудио", len(self.audio_data))
                             else:
                                 logger.warning("Получен пустой блок аудио данных")
                         except Exception as e:
@@ -63,38 +140,229 @@ class AudioRecorder:
                 
         self.record_thread = threading.Thread(target=record)
         self.record_thread.start()
+
+    def _start_callback_recording(self, growable=True, buffer_seconds=None):
+        """Запуск записи через колбэк sounddevice в предвыделенный кольцевой буфер"""
+        buffer_seconds = buffer_seconds or self.buffer_seconds
+        self.ring_buffer = AudioRingBuffer(int(buffer_seconds * self.sample_rate),
+                                           channels=self.channels, growable=growable)
+        self.status_errors = 0
+        ring_buffer = self.ring_buffer
+
+        def callback(indata, frames, time_info, status):
+            # Выполняется в аудио-потоке: без логирования и лишних аллокаций
+            if status:
+                self.status_errors += 1
+            if max(indata.max(), -indata.min()) > 0.001:  # Проверяем, есть ли звук
+                ring_buffer.write(indata)
+
+        try:
+            self.stream = self.stream_factory(samplerate=self.sample_rate,
+                                              channels=self.channels,
+                                              dtype=np.float32,
+                                              device=self.device,
+                                              blocksize=self.block_size,
+                                              callback=callback)
+            self.stream.start()
+            self.recording = True
+        except Exception as e:
+            logger.error(f"Ошибка при инициализации потока записи: {e}")
+            self.stream = None
+            self.recording = False
+            raise
+
+    def _stop_callback_recording(self):
+        """Остановка потока и получение записанных данных без копирования"""
+        try:
+            self.stream.stop()
+            self.stream.close()
+        finally:
+            self.stream = None
+        if self.overruns or self.status_errors:
+            logger.warning("Потеряно блоков при записи: %d, ошибок потока: %d",
+                           self.overruns, self.status_errors)
+        return self.ring_buffer.view()
+
+    def _start_spill_recording(self):
+        """Запуск записи с постоянным сбросом блоков в файл"""
+        path = self.spill_path or f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+        # WAV пишем во float32, чтобы потом отобразить его в память без преобразований
+        subtype = 'FLOAT' if path.lower().endswith('.wav') else None
+        self._spill_file = sf.SoundFile(path, mode='w', samplerate=self.sample_rate,
+                                        channels=self.channels, subtype=subtype)
+        self.spill_file_path = path
+        self._spill_peak = np.zeros(self.channels, dtype=np.float32)
+        self._spill_frames = 0
+        with self._tail_lock:
+            self._tail = AudioRingBuffer(int(self.tail_seconds * self.sample_rate),
+                                         channels=self.channels, growable=False)
+
+        try:
+            # Колбэк пишет в ограниченный буфер, поток-писатель переносит его в файл
+            self._start_callback_recording(growable=False, buffer_seconds=SPILL_BUFFER_SECONDS)
+        except Exception:
+            self._spill_file.close()
+            raise
+        self.spill_thread = threading.Thread(target=self._spill_loop, daemon=True)
+        self.spill_thread.start()
+        logger.info(f"Запись сбрасывается в файл {path}")
+
+    def _spill_loop(self):
+        """Поток-писатель: переносит накопленные блоки из буфера в файл"""
+        while self.recording:
+            time.sleep(SPILL_FLUSH_INTERVAL)
+            self._drain_spill()
+        self._drain_spill()
+
+    def _drain_spill(self):
+        """Запись накопленных блоков в файл и обновление хвоста в памяти"""
+        try:
+            data = self.ring_buffer.read(len(self.ring_buffer))
+            if not len(data):
+                return
+            self._spill_file.write(data)
+            # Сам flush заголовок не трогает: размеры в нем переписываются явно, и после
+            # падения процесса файл читается любым декодером, а не только libsndfile
+            update_file_header(self._spill_file)
+            self._spill_file.flush()
+            np.maximum(self._spill_peak, self._channel_peak(data), out=self._spill_peak)
+            with self._tail_lock:
+                # Счетчик меняется вместе с хвостом, чтобы latest_audio видел согласованную позицию
+                self._spill_frames += len(data)
+                tail = self._tail
+                if len(data) >= tail.capacity:
+                    data = data[-tail.capacity:]
+                overflow = len(tail) + len(data) - tail.capacity
+                if overflow > 0:
+                    tail.read(overflow)
+                tail.write(data)
+        except Exception as e:
+            logger.error(f"Ошибка при записи аудио на диск: {e}")
+
+    def _stop_spill_recording(self):
+        """Остановка записи в файл и открытие файла для чтения с диска"""
+        try:
+            self.stream.stop()
+            self.stream.close()
+        finally:
+            self.stream = None
+        self.spill_thread.join()
+        self._drain_spill()  # Блоки, пришедшие до остановки потока
+        self._spill_file.close()
+        if self.overruns or self.status_errors:
+            logger.warning("Потеряно блоков при записи: %d, ошибок потока: %d",
+                           self.overruns, self.status_errors)
+
+        if self._spill_frames < self.sample_rate:  # Меньше секунды
+            logger.warning("Запись слишком короткая")
+            self._discard_spill_file()
+            return None, self.sample_rate
+        if self._spill_peak.max() < 0.001:  # Слишком тихо
+            logger.warning("Запись слишком тихая")
+            self._discard_spill_file()
+            return None, self.sample_rate
+
+        # Нормализация применяется при чтении каждого среза
+        scale = 1.0 / np.maximum(self._spill_peak, 0.001)
+        audio_data = DiskAudio(self.spill_file_path, scale=scale[0] if self.channels == 1 else scale)
+        logger.info(f"Запись остановлена, в файле {self.spill_file_path} {len(audio_data)} сэмплов "
+                    f"({len(audio_data)/self.sample_rate:.1f} сек)")
+        return audio_data, self.sample_rate
+
+    def _discard_spill_file(self):
+        """Удаление отброшенной записи (файл, заданный пользователем через spill_path, остается)"""
+        if self.spill_path is not None:
+            return
+        try:
+            os.remove(self.spill_file_path)
+        except OSError as e:
+            logger.warning(f"Не удалось удалить файл записи {self.spill_file_path}: {e}")
+
+    @staticmethod
+    def _channel_peak(data):
+        """Пиковая амплитуда каждого канала"""
+        return np.maximum(data.max(axis=0), -data.min(axis=0))
+
+    def get_tail(self, seconds=None):
+        """Копия последних секунд записи, хранящихся в памяти (режим spill)"""
+        with self._tail_lock:
+            if self._tail is None:
+                return np.zeros(0, dtype=np.float32)
+            data = self._tail.view(consume=False)
+            if seconds is not None:
+                data = data[-int(seconds * self.sample_rate):]
+            return np.array(data)
         
+    def latest_audio(self, frames):
+        """Не более frames последних сэмплов идущей записи (без нормализации) для анализа на лету
+
+        Позиция - номер сэмпла с начала записи; после stop_recording данные до этой позиции
+        совпадают со срезом возвращенной записи (с точностью до нормализации).
+
+        Returns:
+            tuple: (позиция конца данных, копия данных)
+        """
+        if self.mode == "spill":
+            with self._tail_lock:
+                if self._tail is None:
+                    return 0, np.zeros(0, dtype=np.float32)
+                tail = self._tail.view(consume=False)
+                return self._spill_frames, np.array(tail[len(tail) - min(frames, len(tail)):])
+        if self.mode == "callback":
+            if self.ring_buffer is None:
+                return 0, np.zeros(0, dtype=np.float32)
+            return self.ring_buffer.latest(frames)
+
+        # Блоки добавляются потоком записи: работаем со снимком длины списка
+        chunks = self.audio_data[:len(self.audio_data)]
+        position = sum(len(chunk) for chunk in chunks)
+        latest, collected = [], 0
+        for chunk in reversed(chunks):
+            if collected >= frames:
+                break
+            latest.append(chunk)
+            collected += len(chunk)
+        if not latest:
+            return position, np.zeros(0, dtype=np.float32)
+        data = np.concatenate(latest[::-1])
+        return position, data[max(0, len(data) - frames):]
+
     def stop_recording(self):
         """Остановить запись и вернуть записанные данные"""
         if not self.recording:
             return None, self.sample_rate
             
         self.recording = False
+        if self.mode == "callback":
+            return self._finalize_recording(self._stop_callback_recording())
+        if self.mode == "spill":
+            return self._stop_spill_recording()
+
         if hasattr(self, 'record_thread'):
             self.record_thread.join()
         
         if not self.audio_data:
+            logger.warning("Нет записанных данных")
             return None, self.sample_rate
             
+        # Объединяем все чанки в один массив
+        return self._finalize_recording(np.concatenate(self.audio_data))
+
+    def _finalize_recording(self, audio_data):
+        """Проверка качества и нормализация записи на месте"""
         try:
-            if not self.audio_data:
-                logger.warning("Нет записанных данных")
-                return None, self.sample_rate
-                
-            # Объединяем все чанки в один массив
-            audio_data = np.concatenate(self.audio_data)
-            
             # Проверяем качество записи
             if len(audio_data) < self.sample_rate:  # Меньше секунды
                 logger.warning("Запись слишком короткая")
                 return None, self.sample_rate
                 
-            if np.max(np.abs(audio_data)) < 0.001:  # Слишком тихо
+            peak = self._channel_peak(audio_data)
+            if peak.max() < 0.001:  # Слишком тихо
                 logger.warning("Запись слишком тихая")
                 return None, self.sample_rate
                 
-            # Нормализуем финальные данные
-            audio_data = audio_data / np.max(np.abs(audio_data))
+            # Нормализуем финальные данные на месте, без второй копии (каждый канал отдельно)
+            audio_data /= np.maximum(peak, 0.001) if self.channels > 1 else peak
             
             logger.info(f"Запись остановлена, получено {len(audio_data)} сэмплов ({len(audio_data)/self.sample_rate:.1f} сек)")
             return audio_data, self.sample_rate
@@ -104,12 +372,20 @@ class AudioRecorder:
 
     def save_recording(self, file_path=None):
         """Сохранить запись в файл"""
+        if not file_path and self.mode == "spill":
+            file_path = self.spill_file_path
         if not file_path:
             file_path = f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
         try:
             audio_data, sr = self.stop_recording()
+            if isinstance(audio_data, DiskAudio):
+                # Запись уже на диске, достаточно переименовать файл
+                audio_data.close()
+                if os.path.abspath(file_path) != os.path.abspath(self.spill_file_path):
+                    os.replace(self.spill_file_path, file_path)
+                    self.spill_file_path = file_path
+                return file_path
             if audio_data is not None:
-                import soundfile as sf
                 sf.write(file_path, audio_data, sr)
                 return file_path
         except Exception as e:
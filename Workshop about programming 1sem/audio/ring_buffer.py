@@ -0,0 +1,143 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AudioRingBuffer:
+    """Предвыделенный кольцевой буфер float32 для одного писателя и одного читателя
+
+    Писатель (аудио-колбэк) владеет позицией записи, читатель - позицией чтения.
+    Позиции монотонно растут и публикуются после копирования данных, поэтому
+    блокировки не нужны. Если блок не помещается, буфер увеличивается вдвое
+    (до max_capacity), иначе блок отбрасывается и увеличивается счетчик overruns.
+    """
+
+    def __init__(self, capacity, channels=1, growable=True, max_capacity=None):
+        if capacity <= 0:
+            raise ValueError("Емкость буфера должна быть положительной")
+        self.channels = channels
+        self.growable = growable
+        self.max_capacity = max_capacity
+        self._buffer = self._allocate(capacity)
+        self._write_pos = 0  # Всего записано сэмплов (меняет только писатель)
+        self._read_pos = 0   # Всего прочитано сэмплов (меняет только читатель)
+        self.overruns = 0
+        self.dropped_samples = 0
+
+    def _allocate(self, capacity):
+        shape = (capacity,) if self.channels == 1 else (capacity, self.channels)
+        return np.zeros(shape, dtype=np.float32)
+
+    @property
+    def capacity(self):
+        return len(self._buffer)
+
+    def __len__(self):
+        """Количество непрочитанных сэмплов"""
+        return self._write_pos - self._read_pos
+
+    def _grow(self, required):
+        """Увеличение буфера с сохранением позиций непрочитанных данных"""
+        capacity = self.capacity
+        new_capacity = capacity
+        while new_capacity < required:
+            new_capacity *= 2
+        if self.max_capacity is not None:
+            new_capacity = min(new_capacity, self.max_capacity)
+        if new_capacity < required:
+            return False
+
+        old = self._buffer
+        new = self._allocate(new_capacity)
+        # Копируем непрочитанную часть так, чтобы позиция pos оказалась в new[pos % new_capacity]
+        pos = self._read_pos
+        while pos < self._write_pos:
+            src = pos % capacity
+            dst = pos % new_capacity
+            count = min(self._write_pos - pos, capacity - src, new_capacity - dst)
+            new[dst:dst + count] = old[src:src + count]
+            pos += count
+        self._buffer = new
+        return True
+
+    def write(self, block):
+        """Запись блока (вызывается только писателем)
+
+        Returns:
+            bool: False, если блок был отброшен из-за переполнения
+        """
+        if self.channels == 1:
+            block = block.reshape(-1)
+        frames = len(block)
+        required = self._write_pos - self._read_pos + frames
+        if required > self.capacity:
+            if not self.growable or not self._grow(required):
+                self.overruns += 1
+                self.dropped_samples += frames
+                return False
+
+        buffer = self._buffer
+        capacity = len(buffer)
+        start = self._write_pos % capacity
+        first = min(frames, capacity - start)
+        buffer[start:start + first] = block[:first]
+        if first < frames:
+            buffer[:frames - first] = block[first:]
+        # Публикуем новую позицию только после копирования данных
+        self._write_pos += frames
+        return True
+
+    def view(self, consume=True):
+        """Непрочитанные данные (вызывается только читателем)
+
+        Если данные лежат в буфере непрерывно, возвращается представление без копирования,
+        иначе - склеенная копия двух частей. Представление остается корректным,
+        пока писатель не перезапишет эти позиции (например, после остановки записи).
+        """
+        write_pos = self._write_pos
+        buffer = self._buffer
+        capacity = len(buffer)
+        start = self._read_pos % capacity
+        count = write_pos - self._read_pos
+        if start + count <= capacity:
+            data = buffer[start:start + count]
+        else:
+            data = np.concatenate((buffer[start:], buffer[:start + count - capacity]))
+        if consume:
+            self._read_pos = write_pos
+        return data
+
+    def latest(self, frames):
+        """Копия не более frames последних записанных сэмплов без сдвига позиции чтения
+
+        Может вызываться из любого потока, пока читатель не сдвигает позицию чтения:
+        непрочитанные данные писатель не перезаписывает.
+
+        Returns:
+            tuple: (позиция конца копии в сэмплах с начала записи, данные)
+        """
+        # Позиция читается до буфера: при увеличении новый буфер уже содержит данные до этой позиции
+        write_pos = self._write_pos
+        buffer = self._buffer
+        frames = min(frames, write_pos - self._read_pos)
+        capacity = len(buffer)
+        start = (write_pos - frames) % capacity
+        first = min(frames, capacity - start)
+        data = np.empty((frames,) + buffer.shape[1:], dtype=np.float32)
+        data[:first] = buffer[start:start + first]
+        data[first:] = buffer[:frames - first]
+        return write_pos, data
+
+    def read(self, max_frames):
+        """Чтение до max_frames сэмплов в новый массив (вызывается только читателем)"""
+        write_pos = self._write_pos
+        buffer = self._buffer
+        capacity = len(buffer)
+        count = min(max_frames, write_pos - self._read_pos)
+        start = self._read_pos % capacity
+        first = min(count, capacity - start)
+        data = np.empty((count,) + buffer.shape[1:], dtype=np.float32)
+        data[:first] = buffer[start:start + first]
+        data[first:] = buffer[:count - first]
+        self._read_pos += count
+        return data
@@ -0,0 +1,176 @@
+"""Асинхронный API предсказаний: цикл событий не блокируется, инференс ограничен, отмена доходит до потока
+
+Проверки (завершение с ошибкой, если не выполнены):
+  - во время анализа задержка "пульса" цикла событий остается малой
+    (для сравнения замеряется блокирующий вызов прямо в цикле);
+  - одновременно выполняется не больше max_concurrent_inference вызовов модели;
+  - отмена задачи asyncio останавливает расчет шкалы после текущего батча;
+  - точки асинхронного итератора совпадают с синхронной шкалой.
+По умолчанию инференс - фейковый предиктор с задержкой на батч; с --model - EmotionPredictor.
+
+Запуск из каталога проекта (с --model - из каталога с моделями):
+    python benchmarks/bench_async_api.py --requests 8
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.async_api import AsyncEmotionPredictor
+
+SR = 16000
+LABELS = ('anger', 'happy', 'sad', 'neutral')
+# Интервал "пульса" цикла событий и допустимая задержка его тика, сек
+HEARTBEAT = 0.01
+MAX_HEARTBEAT_LAG = 0.1
+
+
+class SlowPredictor:
+    """Предиктор с задержкой на батч; считает одновременные вызовы и батчи"""
+
+    def __init__(self, batch_delay, batch_size=8):
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self.active = 0
+        self.max_active = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def initialize(self):
+        pass
+
+    def model_id(self):
+        return {'model': 'slow'}
+
+    def _infer(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.batch_delay)
+        with self._lock:
+            self.active -= 1
+            self.batches += 1
+
+    @staticmethod
+    def _scores(window):
+        score = float(np.clip(np.abs(window).mean(), 0, 1))
+        return [{'label': label, 'score': score if i == 0 else (1 - score) / 3} for i, label in enumerate(LABELS)]
+
+    def predict_emotion(self, audio_data, sample_rate):
+        self._infer()
+        return self._scores(audio_data)
+
+    def iter_emotion_timeline(self, audio_data, sample_rate, window_size=2.0, step=0.5, start_window=0):
+        window_samples, step_samples = int(window_size * sample_rate), int(step * sample_rate)
+        starts = range(0, len(audio_data) - window_samples, step_samples)
+        for index in range(start_window, len(starts), self.batch_size):
+            self._infer()
+            batch = starts[index:index + self.batch_size]
+            points = [{'time': start / sample_rate, 'emotions': self._scores(audio_data[start:start + window_samples])}
+                      for start in batch]
+            yield points, index + len(batch), len(starts)
+
+    def get_emotion_timeline(self, audio_data, sample_rate, window_size=2.0, step=0.5):
+        return [point for points, _, _ in self.iter_emotion_timeline(audio_data, sample_rate, window_size, step)
+                for point in points]
+
+
+async def heartbeat_lag(work):
+    """Наибольшая задержка тика цикла событий, пока выполняется корутина work"""
+    lags = []
+
+    async def beat():
+        while True:
+            expected = time.perf_counter() + HEARTBEAT
+            await asyncio.sleep(HEARTBEAT)
+            lags.append(time.perf_counter() - expected)
+
+    beater = asyncio.create_task(beat())
+    await asyncio.sleep(HEARTBEAT)
+    result = await work
+    # Тик, просроченный во время work, учитывается перед остановкой пульса
+    await asyncio.sleep(HEARTBEAT * 2)
+    beater.cancel()
+    return max(lags, default=0.0), result
+
+
+async def run_checks(predictor, recordings, max_concurrent, fake):
+    checks = []
+    async with AsyncEmotionPredictor(predictor, max_concurrent_inference=max_concurrent) as api:
+        await api.initialize()
+
+        async def blocking():
+            return predictor.get_emotion_timeline(recordings[0], SR)
+
+        lag, expected = await heartbeat_lag(blocking())
+        print(f"Блокирующий вызов в цикле: задержка пульса {lag * 1000:.0f} мс")
+
+        async def concurrent():
+            return await asyncio.gather(*(api.get_emotion_timeline(audio, SR) for audio in recordings))
+
+        start = time.perf_counter()
+        lag, timelines = await heartbeat_lag(concurrent())
+        elapsed = time.perf_counter() - start
+        print(f"Асинхронный API:           задержка пульса {lag * 1000:.0f} мс, "
+              f"{len(recordings)} записей за {elapsed:.1f} сек")
+        checks.append(("цикл событий не блокируется", lag < MAX_HEARTBEAT_LAG))
+        checks.append(("шкала совпадает с синхронной", timelines[0] == expected))
+
+        if fake:
+            print(f"Одновременных вызовов модели: {predictor.max_active} (предел {max_concurrent})")
+            checks.append(("ограничение инференса", predictor.max_active <= max_concurrent))
+
+            async def consume(audio):
+                async for _ in api.iter_emotion_timeline(audio, SR):
+                    pass
+
+            task = asyncio.create_task(consume(recordings[0]))
+            await asyncio.sleep(predictor.batch_delay * 2.5)
+            task.cancel()
+            cancelled_at = predictor.batches
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # Батч, начатый до отмены, доходит до конца; следующие не запускаются
+            await asyncio.sleep(predictor.batch_delay * 3)
+            extra = predictor.batches - cancelled_at
+            total = -(-len(expected) // predictor.batch_size)
+            print(f"Отмена: после отмены выполнено батчей {extra} (всего в записи {total})")
+            checks.append(("отмена останавливает расчет", extra <= 1))
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=8, help="Одновременных запросов шкалы")
+    parser.add_argument('--seconds', type=float, default=30.0, help="Длительность каждой записи")
+    parser.add_argument('--batch-delay', type=float, default=0.05, help="Задержка фейкового батча, сек")
+    parser.add_argument('--max-concurrent', type=int, default=1, help="Одновременных вызовов модели")
+    parser.add_argument('--model', action='store_true', help="Использовать EmotionPredictor")
+    args = parser.parse_args()
+
+    if args.model:
+        from model.predict import EmotionPredictor
+        predictor = EmotionPredictor()
+    else:
+        predictor = SlowPredictor(args.batch_delay)
+    rng = np.random.default_rng(0)
+    recordings = [(rng.standard_normal(int(args.seconds * SR)) * 0.1).astype(np.float32)
+                  for _ in range(args.requests)]
+
+    checks = asyncio.run(run_checks(predictor, recordings, args.max_concurrent, fake=not args.model))
+    failed = [name for name, ok in checks if not ok]
+    if failed:
+        print(f"Не выполнено: {', '.join(failed)}")
+        sys.exit(1)
+    print("Все проверки выполнены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Холодный старт и память: обычная загрузка модели против safetensors через mmap
+
+Для каждого режима одновременно запускается несколько процессов. Каждый загружает
+модель, выполняет одно предсказание и сообщает время загрузки, RSS и PSS
+(PSS учитывает разделяемые страницы page cache пропорционально числу процессов).
+
+Запуск из каталога проекта:
+    python benchmarks/bench_cold_start.py --processes 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+MODES = ("pipeline", "mmap")
+
+
+def memory_stats():
+    """RSS, пиковый RSS и PSS текущего процесса в МБ (Linux)"""
+    stats = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM', 'RssAnon', 'RssFile'):
+                stats[key] = int(value.split()[0]) / 1024
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    stats['Pss'] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return stats
+
+
+def run_child(mode, models_dir, language, hold):
+    """Загрузка модели в отдельном процессе и вывод замеров в JSON"""
+    import numpy as np
+    from model.model_loader import EmotionModelLoader
+
+    baseline = memory_stats()
+    start = time.perf_counter()
+    loader = EmotionModelLoader(models_dir, mmap_weights=(mode == "mmap"))
+    if not loader.load_model(language):
+        raise SystemExit(f"Не удалось загрузить модель {language}")
+    load_time = time.perf_counter() - start
+
+    window = (np.random.default_rng(0).standard_normal(32000) * 0.1).astype(np.float32)
+    start = time.perf_counter()
+    loader.model(window)
+    first_prediction = time.perf_counter() - start
+
+    # Ждем, пока загрузятся остальные процессы, чтобы PSS учитывал общие страницы
+    time.sleep(hold)
+    stats = memory_stats()
+    print(json.dumps({
+        'mode': mode,
+        'load_sec': load_time,
+        'first_prediction_sec': first_prediction,
+        'rss_mb': stats.get('VmRSS', 0) - baseline.get('VmRSS', 0),
+        'peak_rss_mb': stats.get('VmHWM', 0) - baseline.get('VmRSS', 0),
+        'rss_file_mb': stats.get('RssFile', 0) - baseline.get('RssFile', 0),
+        'pss_mb': stats.get('Pss', 0) - baseline.get('Pss', 0),
+    }))
+
+
+def drop_page_cache():
+    """Сброс page cache (нужны права root), чтобы старт был действительно холодным"""
+    try:
+        subprocess.run(['sync'], check=True)
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models-dir', default=os.path.join(PROJECT_DIR, 'models'))
+    parser.add_argument('--language', default='English')
+    parser.add_argument('--processes', type=int, default=2, help="Одновременных процессов на режим")
+    parser.add_argument('--hold', type=float, default=20.0, help="Пауза перед замером PSS, сек")
+    parser.add_argument('--drop-caches', action='store_true', help="Сбрасывать page cache перед режимом")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.models_dir, args.language, args.hold)
+        return
+
+    print(f"{'режим':<10}{'загрузка, с':>13}{'1-е окно, с':>13}{'RSS, МБ':>10}{'пик, МБ':>10}"
+          f"{'файл, МБ':>10}{'PSS, МБ':>10}")
+    for mode in MODES:
+        if args.drop_caches and not drop_page_cache():
+            print("Не удалось сбросить page cache (нужны права root)")
+        children = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), '--child', mode,
+                              '--models-dir', args.models_dir, '--language', args.language,
+                              '--hold', str(args.hold)],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, cwd=PROJECT_DIR)
+            for _ in range(args.processes)
+        ]
+        for child in children:
+            output, _ = child.communicate()
+            lines = [line for line in output.splitlines() if line.startswith('{')]
+            if child.returncode != 0 or not lines:
+                print(f"{mode:<10}процесс завершился с кодом {child.returncode}")
+                continue
+            r = json.loads(lines[-1])
+            print(f"{mode:<10}{r['load_sec']:>13.2f}{r['first_prediction_sec']:>13.2f}{r['rss_mb']:>10.0f}"
+                  f"{r['peak_rss_mb']:>10.0f}{r['rss_file_mb']:>10.0f}{r['pss_mb']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Повторный анализ по кэшу эмбеддингов окон против полного прогона модели
+
+Для синтетической записи замеряются: обычный анализ, первый анализ с кэшем
+(прогон модели и сохранение), повторный анализ из кэша, пересчет с другой
+температурой, головой модели и порогами EmotionTimeline.
+
+Запуск из каталога с моделями (models/<язык>):
+    python benchmarks/bench_embedding_cache.py --seconds 120
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.predict import EmotionPredictor
+from model.embedding_cache import EmbeddingCache
+from analysis.aggregator import EmotionAggregator
+
+
+def max_difference(first, second):
+    diff = 0.0
+    for a, b in zip(first, second):
+        scores_a = {p['label']: p['score'] for p in a['emotions']}
+        scores_b = {p['label']: p['score'] for p in b['emotions']}
+        diff = max(diff, max(abs(scores_a[label] - scores_b[label]) for label in scores_a))
+    return diff
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=120.0, help="Длительность записи")
+    parser.add_argument('--batch-size', type=int, default=8, help="Размер батча")
+    args = parser.parse_args()
+
+    sr = 16000
+    rng = np.random.default_rng(0)
+    t = np.arange(int(args.seconds * sr)) / sr
+    audio = (0.3 * np.sin(2 * np.pi * 180 * t) * (1 + np.sin(0.5 * t))
+             + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        plain = EmotionPredictor()
+        plain.initialize()
+        plain.batch_size = args.batch_size
+        cached = EmotionPredictor(embedding_cache=EmbeddingCache(cache_dir))
+        cached.batch_size = args.batch_size
+        cached.initialize()
+
+        reference, plain_time = timed(lambda: plain.get_emotion_timeline(audio, sr))
+        first, miss_time = timed(lambda: cached.get_emotion_timeline(audio, sr))
+        second, hit_time = timed(lambda: cached.get_emotion_timeline(audio, sr))
+        print(f"Окон: {len(reference)}")
+        print(f"Без кэша:              {plain_time:8.2f} сек")
+        print(f"Кэш, первый проход:    {miss_time:8.2f} сек (расхождение с обычным {max_difference(first, reference):.1e})")
+        print(f"Кэш, повторный проход: {hit_time:8.3f} сек ({plain_time / hit_time:.0f}x, "
+              f"совпадает с первым: {first == second})")
+
+        name, key = cached.embedding_cache.key(audio, sr, 2.0, 0.5, cached.embedding_model_id())
+        entry = cached.embedding_cache.load(name, key)
+        _, temperature_time = timed(lambda: cached.rescore(entry, temperature=2.0))
+        classifier = cached._embedding_classifier()
+        head_timeline, head_time = timed(lambda: cached.rescore(entry, head=classifier.head_logits))
+        print(f"Другая температура:    {temperature_time:8.3f} сек")
+        print(f"Голова по эмбеддингам: {head_time:8.3f} сек (расхождение с логитами модели "
+              f"{max_difference(head_timeline, first):.1e})")
+
+        def thresholds():
+            aggregator = EmotionAggregator(('anger', 'happy', 'sad', 'neutral'), noise_threshold=0.2,
+                                           smoothing_window=9)
+            aggregator.update_many(cached.rescore(entry))
+            return aggregator.averages()
+        _, threshold_time = timed(thresholds)
+        print(f"Другие порог и окно:   {threshold_time:8.3f} сек")
+
+
+if __name__ == "__main__":
+    main()
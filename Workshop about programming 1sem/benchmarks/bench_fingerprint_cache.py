@@ -0,0 +1,153 @@
+"""Кэш предсказаний по спектральному отпечатку окна: попадания повторов и промахи разной речи
+
+Проверки (завершение с ошибкой, если не выполнены):
+  - точные копии окон, копии с другой громкостью и с шумом попадают в кэш;
+  - окна другой синтетической речи в кэш не попадают;
+  - размер кэша ограничен, вытесняются давно не использованные окна.
+С --model замеряется анализ синтетических "звонков" (речь вперемешку с одной и той же
+музыкой ожидания) с кэшем и без него.
+
+Запуск из каталога проекта (с --model - из каталога с моделями):
+    python benchmarks/bench_fingerprint_cache.py --utterances 200
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.fingerprint_cache import FingerprintCache
+
+SR = 16000
+WINDOW = 2 * SR
+
+
+def synth_speech(seed, seconds=2.0):
+    """Речеподобный сигнал: импульсы с плавающим тоном через движущиеся форманты, слоги по огибающей"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SR)) / SR
+    f0 = rng.uniform(100, 160) + 40 * np.sin(2 * np.pi * rng.uniform(0.5, 3) * t + rng.uniform(0, 6))
+    phase = np.cumsum(2 * np.pi * f0 / SR)
+    signal = np.zeros(len(t))
+    for harmonic in range(1, 4):
+        formant = rng.uniform(300, 3000) * (1 + 0.3 * np.sin(2 * np.pi * rng.uniform(1, 4) * t))
+        signal += (np.sin(np.cumsum(2 * np.pi * formant / SR)) * np.abs(np.sin(phase * harmonic))
+                   * rng.uniform(0.2, 1))
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(2, 5) * t), 0, 1)
+    return (signal * envelope + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def hold_music(seconds):
+    """Повторяющаяся музыка ожидания: аккорды по 0.5 сек"""
+    t = np.arange(int(seconds * SR)) / SR
+    chords = [(262, 330, 392), (220, 277, 330), (196, 247, 294), (175, 220, 262)]
+    music = np.zeros(len(t))
+    for index, chord in enumerate(chords):
+        mask = (t % 2.0 >= index * 0.5) & (t % 2.0 < (index + 1) * 0.5)
+        music[mask] = sum(np.sin(2 * np.pi * f * t[mask]) for f in chord) / 3
+    return (0.3 * music).astype(np.float32)
+
+
+def add_noise(window, snr_db, rng):
+    noise = rng.standard_normal(len(window)) * np.std(window) / 10 ** (snr_db / 20)
+    return (window + noise).astype(np.float32)
+
+
+def check_cache(utterances):
+    rng = np.random.default_rng(0)
+    cache = FingerprintCache(max_entries=utterances)
+    namespace = FingerprintCache.namespace({'model': 'bench'}, WINDOW, SR)
+    stored = [synth_speech(seed) for seed in range(utterances)]
+    start = time.perf_counter()
+    for index, window in enumerate(stored):
+        cache.put(namespace, cache.fingerprint(window, SR), index)
+    per_window = (time.perf_counter() - start) / utterances * 1000
+    print(f"Отпечаток и запись: {per_window:.2f} мс на окно ({cache.bits} битов, порог {cache.max_distance})")
+
+    def hits(windows, expected):
+        found = [cache.get(namespace, cache.fingerprint(window, SR)) for window in windows]
+        return sum(1 for value, index in zip(found, expected) if value == index)
+
+    checks = []
+    sample = range(0, utterances, max(1, utterances // 50))
+    # Шум 20 дБ - уже заметное искажение, его доля попаданий только выводится
+    for name, make, required in (
+        ("точные копии", lambda w: w.copy(), True),
+        ("громкость x0.3", lambda w: 0.3 * w, True),
+        ("шум 30 дБ", lambda w: add_noise(w, 30, rng), True),
+        ("шум 20 дБ", lambda w: add_noise(w, 20, rng), False),
+    ):
+        found = hits([make(stored[i]) for i in sample], list(sample))
+        if required:
+            checks.append((name, found == len(sample)))
+        print(f"  {name:<16} попаданий {found}/{len(sample)}")
+
+    distinct = [synth_speech(seed) for seed in range(utterances, utterances + 200)]
+    fingerprints = [cache.fingerprint(window, SR) for window in distinct]
+    before = cache.hits
+    start = time.perf_counter()
+    for fingerprint in fingerprints:
+        cache.get(namespace, fingerprint)
+    per_lookup = (time.perf_counter() - start) / len(fingerprints) * 1000
+    false_hits = cache.hits - before
+    checks.append(("другая речь", false_hits == 0))
+    print(f"  {'другая речь':<16} ложных попаданий {false_hits}/{len(distinct)}, "
+          f"поиск с промахом {per_lookup:.2f} мс")
+
+    cache.put(namespace, cache.fingerprint(distinct[0], SR), 'new')
+    evicted = cache.get(namespace, cache.fingerprint(stored[1], SR)) is None
+    checks.append(("вытеснение LRU", evicted and cache.stats()['entries'] == utterances))
+    print(f"  вытеснение LRU    размер {cache.stats()['entries']}, вытеснено {cache.evictions}")
+    print(f"Метрики: {cache.stats()}")
+    return checks
+
+
+def bench_model(calls, call_seconds):
+    """Анализ звонков с музыкой ожидания с кэшем отпечатков и без него"""
+    from model.predict import EmotionPredictor
+
+    recordings = []
+    for index in range(calls):
+        parts = [synth_speech(1000 + index, call_seconds / 2), hold_music(call_seconds / 2)]
+        recordings.append(np.concatenate(parts))
+
+    results = {}
+    for name, cache in (("без кэша", None), ("с кэшем", FingerprintCache())):
+        predictor = EmotionPredictor(fingerprint_cache=cache)
+        predictor.initialize()
+        start = time.perf_counter()
+        results[name] = [predictor.get_emotion_timeline(audio, SR) for audio in recordings]
+        elapsed = time.perf_counter() - start
+        extra = f", доля попаданий {cache.hit_rate():.1%}" if cache is not None else ""
+        print(f"{name:<9} {elapsed:7.1f} сек{extra}")
+
+    diff = 0.0
+    for plain, cached in zip(results["без кэша"], results["с кэшем"]):
+        for a, b in zip(plain, cached):
+            top_a, top_b = a['emotions'][0], b['emotions'][0]
+            diff = max(diff, abs(top_a['score'] - top_b['score']) if top_a['label'] == top_b['label'] else 1.0)
+    print(f"Наибольшее расхождение уверенности ведущей эмоции: {diff:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--utterances', type=int, default=200, help="Окон речи в кэше")
+    parser.add_argument('--model', action='store_true', help="Замерить анализ звонков моделью")
+    parser.add_argument('--calls', type=int, default=4, help="Количество звонков для --model")
+    parser.add_argument('--call-seconds', type=float, default=40.0, help="Длительность звонка для --model")
+    args = parser.parse_args()
+
+    checks = check_cache(args.utterances)
+    failed = [name for name, ok in checks if not ok]
+    if args.model:
+        bench_model(args.calls, args.call_seconds)
+    if failed:
+        print(f"Не выполнено: {', '.join(failed)}")
+        sys.exit(1)
+    print("Все проверки выполнены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Плавность главного цикла во время анализа: анализ в потоке против отдельного процесса
+
+Без окна Tk: главный поток крутит цикл кадров с интервалом 50 мс, как анимация
+show_wave_animation, и выполняет колбэки бэкенда анализа. Для каждого бэкенда
+выводится статистика интервалов между кадрами (FrameTimeStats).
+
+Запуск из каталога с моделями (models/<язык>):
+    python benchmarks/bench_gui_responsiveness.py --seconds 60
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from gui.analysis_worker import ANALYSIS_BACKENDS, ThreadAnalysisBackend, ProcessAnalysisBackend, FrameTimeStats
+
+FRAME_INTERVAL_MS = 50
+
+
+def make_backend(name, dispatch, language):
+    if name == "process":
+        return ProcessAnalysisBackend(dispatch, language=language)
+    from model.predict import EmotionPredictor
+    predictor = EmotionPredictor()
+    predictor.update_model_for_language(language)
+    return ThreadAnalysisBackend(predictor, dispatch)
+
+
+def run_frames(backend, audio, sr, timeout):
+    """Цикл кадров до получения результата; возвращает статистику и время анализа"""
+    callbacks = queue.SimpleQueue()
+    backend.dispatch = callbacks.put
+    result = {}
+    stats = FrameTimeStats(FRAME_INTERVAL_MS)
+    start = time.perf_counter()
+    backend.submit(audio, sr, on_done=lambda data, cancelled: result.update(data=data),
+                   on_error=lambda error: result.update(error=error))
+    while not result and time.perf_counter() - start < timeout:
+        stats.tick(time.perf_counter())
+        # Немного работы на Python, как при смене кадра в Tk
+        sum(i * i for i in range(2000))
+        time.sleep(FRAME_INTERVAL_MS / 1000)
+        while not callbacks.empty():
+            callbacks.get()()
+    return stats.summary(), time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=60.0, help="Длительность синтетической записи")
+    parser.add_argument('--language', default='English')
+    parser.add_argument('--backends', nargs='+', choices=ANALYSIS_BACKENDS, default=list(ANALYSIS_BACKENDS))
+    parser.add_argument('--timeout', type=float, default=600.0)
+    args = parser.parse_args()
+
+    sr = 16000
+    audio = (np.random.default_rng(0).standard_normal(int(args.seconds * sr)) * 0.1).astype(np.float32)
+
+    print(f"{'бэкенд':<10}{'анализ, с':>11}{'кадров':>8}{'средний, мс':>13}{'p95, мс':>10}"
+          f"{'макс, мс':>10}{'задержано':>11}")
+    for name in args.backends:
+        backend = make_backend(name, None, args.language)
+        try:
+            # Прогрев: загрузка модели не должна попадать в замер
+            run_frames(backend, audio[:sr * 3], sr, args.timeout)
+            stats, elapsed, result = run_frames(backend, audio, sr, args.timeout)
+        finally:
+            backend.close()
+        if 'data' not in result or stats is None:
+            print(f"{name:<10}ошибка: {result.get('error', 'таймаут')}")
+            continue
+        print(f"{name:<10}{elapsed:>11.1f}{stats['frames']:>8}{stats['mean_ms']:>13.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['max_ms']:>10.1f}{stats['late_share']:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
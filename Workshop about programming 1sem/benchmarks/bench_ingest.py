@@ -0,0 +1,112 @@
+"""Сравнение быстрого чтения аудио с прежним путем через librosa
+
+Для матрицы форматов, частот и числа каналов генерируется файл с синтетическим
+сигналом, затем замеряется время загрузки и точность (SNR относительно сигнала,
+аналитически вычисленного сразу на 16 кГц).
+
+Запуск из каталога проекта:
+    python benchmarks/bench_ingest.py --seconds 30
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio.audio_utils import AudioProcessor
+from audio.ingest import RESAMPLE_QUALITIES, TARGET_SAMPLE_RATE
+
+FORMATS = [
+    ('wav', 'PCM_16'),
+    ('wav', 'FLOAT'),
+    ('flac', 'PCM_16'),
+    ('ogg', 'VORBIS'),
+]
+SAMPLE_RATES = [8000, 16000, 22050, 44100, 48000]
+CHANNELS = [1, 2]
+
+
+def synth_signal(seconds, sr, source_sr):
+    """Сумма тонов ниже частоты Найквиста исходной и целевой частот дискретизации"""
+    t = np.arange(int(seconds * sr)) / sr
+    nyquist = min(source_sr, TARGET_SAMPLE_RATE) / 2
+    freqs = [f for f in (220.0, 1250.0, 2900.0, 5300.0, 7100.0) if f < 0.9 * nyquist]
+    signal = sum(np.sin(2 * np.pi * f * t + i) for i, f in enumerate(freqs))
+    return (0.5 * signal / len(freqs)).astype(np.float32)
+
+
+def snr_db(reference, estimate):
+    """Отношение сигнал/ошибка в дБ (без краевых эффектов фильтра)"""
+    n = min(len(reference), len(estimate))
+    margin = int(0.05 * n)
+    ref = reference[margin:n - margin]
+    err = estimate[margin:n - margin] - ref
+    return 10 * np.log10(np.sum(ref ** 2) / max(np.sum(err ** 2), 1e-20))
+
+
+def timed(func, repeats):
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=30.0, help="Длительность тестового файла")
+    parser.add_argument('--repeats', type=int, default=3, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    try:
+        import librosa  # noqa: F401
+        has_librosa = True
+    except ImportError:
+        has_librosa = False
+        print("librosa не установлена, сравнение с прежним путем пропущено")
+
+    header = f"{'формат':<12}{'Гц':>7}{'кан':>5}{'librosa, с':>12}{'SNR':>7}"
+    for quality in RESAMPLE_QUALITIES:
+        header += f"{quality + ', с':>12}{'SNR':>7}{'x':>7}"
+    print(header)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for extension, subtype in FORMATS:
+            for sr in SAMPLE_RATES:
+                for channels in CHANNELS:
+                    signal = synth_signal(args.seconds, sr, sr)
+                    reference = synth_signal(args.seconds, TARGET_SAMPLE_RATE, sr)
+                    data = np.repeat(signal[:, None], channels, axis=1)
+                    path = os.path.join(tmp_dir, f"test_{sr}_{channels}.{extension}")
+                    try:
+                        sf.write(path, data, sr, subtype=subtype)
+                    except Exception as e:
+                        print(f"{extension}/{subtype} {sr} Гц пропущен: {e}")
+                        continue
+
+                    row = f"{extension + '/' + subtype[:5]:<12}{sr:>7}{channels:>5}"
+                    legacy_time = None
+                    if has_librosa:
+                        (audio, _), legacy_time = timed(
+                            lambda: AudioProcessor.load_audio_librosa(path), args.repeats)
+                        row += f"{legacy_time:>12.3f}{snr_db(reference, audio):>7.1f}"
+                    else:
+                        row += f"{'-':>12}{'-':>7}"
+
+                    for quality in RESAMPLE_QUALITIES:
+                        (audio, _), fast_time = timed(
+                            lambda: AudioProcessor.load_audio(path, quality=quality), args.repeats)
+                        speedup = f"{legacy_time / fast_time:.1f}" if legacy_time else "-"
+                        row += f"{fast_time:>12.3f}{snr_db(reference, audio):>7.1f}{speedup:>7}"
+                    print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Анализ длинного файла под искусственным лимитом памяти с режимом бюджета и без него
+
+Генерируется длинная стерео-запись 48 кГц. Для каждого режима отдельный процесс
+получает жесткий лимит RLIMIT_DATA (аналог лимита cgroup: превышение дает ошибку
+выделения памяти), читает файл и анализирует его с большим запрошенным батчем:
+режим budget - весь файл, режим none (для сравнения) - только первые
+--baseline-seconds, чтобы показать, что без бюджета такой батч не помещается в лимит.
+Выводятся пиковый RSS, использованные размеры батчей и результат.
+
+Проверка (завершение с ошибкой, если не выполнена): в режиме budget весь файл
+проанализирован (точка на каждое окно), а пиковый RSS не превысил лимит.
+
+Запуск из каталога с моделями (models/<язык>):
+    python benchmarks/bench_memory_budget.py --minutes 30 --limit 1500M
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+MODES = ("none", "budget")
+
+
+def proc_status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def write_long_file(path, minutes, sr=48000, block_seconds=60):
+    """Стерео PCM_16 файл, записываемый блоками (генератор сам не держит файл в памяти)"""
+    import soundfile as sf
+    rng = np.random.default_rng(0)
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=2, subtype='PCM_16') as f:
+        for _ in range(int(minutes * 60 / block_seconds)):
+            t = np.arange(block_seconds * sr) / sr
+            tone = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 400) * t)
+            block = tone[:, None] + 0.05 * rng.standard_normal((len(t), 2))
+            f.write(block.astype(np.float32))
+
+
+def run_child(mode, path, limit, hard_limit, batch_size, analyze_seconds=None):
+    from model.memory_budget import set_memory_budget, parse_size
+    from model.predict import EmotionPredictor
+    from audio.audio_utils import AudioProcessor
+
+    if mode == "budget":
+        set_memory_budget(limit)
+    predictor = EmotionPredictor()
+    predictor.batch_size = batch_size
+    predictor.initialize()
+    # Лимит ставится после загрузки модели. RLIMIT_DATA учитывает виртуальную память
+    # (у torch она заметно больше RSS), поэтому запас сверх текущего RSS переносится на VmData
+    spare = int(parse_size(hard_limit)) - proc_status_kb('VmRSS') * 1024
+    limit_bytes = proc_status_kb('VmData') * 1024 + max(0, spare)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit_bytes, limit_bytes))
+
+    batch_sizes = []
+    original = predictor._batch_size_for
+    predictor._batch_size_for = lambda samples: batch_sizes.append(original(samples)) or batch_sizes[-1]
+
+    result = {'mode': mode, 'ok': False}
+    start = time.perf_counter()
+    try:
+        audio, sr = AudioProcessor.load_audio(path)
+        result['load_sec'] = time.perf_counter() - start
+        result['memmap'] = isinstance(audio, np.memmap)
+        if analyze_seconds is not None:
+            audio = audio[:int(analyze_seconds * sr)]
+        result['analyzed_sec'] = len(audio) / sr
+        points = windows = 0
+        for new_points, _, windows in predictor.iter_emotion_timeline(audio, sr):
+            points += len(new_points)
+        result.update(ok=True, points=points, windows=windows)
+    except MemoryError as e:
+        result['error'] = f"MemoryError: {e}"
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result.update(
+        total_sec=time.perf_counter() - start,
+        peak_rss_mb=proc_status_kb('VmHWM') / 1024,
+        batch_sizes=sorted(set(batch_sizes)),
+        max_batch=predictor.memory_budget.max_batch if predictor.memory_budget else None
+    )
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=30.0, help="Длительность тестового файла")
+    parser.add_argument('--limit', default='1500M', help="Бюджет памяти и жесткий лимит процесса")
+    parser.add_argument('--batch-size', type=int, default=64, help="Запрошенный размер батча")
+    parser.add_argument('--baseline-seconds', type=float, default=120.0,
+                        help="Сколько секунд анализировать в режиме none (budget анализирует весь файл)")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.path, args.limit, args.limit, args.batch_size,
+                  args.baseline_seconds if args.child == "none" else None)
+        return
+
+    from model.memory_budget import parse_size
+    limit_mb = parse_size(args.limit) / 2 ** 20
+    failed = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "long.wav")
+        write_long_file(path, args.minutes)
+        print(f"Файл {args.minutes:.0f} мин, 48 кГц стерео: {os.path.getsize(path) / 1024 ** 2:.0f} МБ, "
+              f"лимит {args.limit}, запрошенный батч {args.batch_size}")
+        for mode in MODES:
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, '--path', path,
+                 '--limit', args.limit, '--batch-size', str(args.batch_size),
+                 '--baseline-seconds', str(args.baseline_seconds)],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+            lines = [line for line in child.stdout.splitlines() if line.startswith('{')]
+            if not lines:
+                print(f"{mode:<8}процесс завершился с кодом {child.returncode} (OOM)")
+                if mode == "budget":
+                    failed.append(f"процесс завершился с кодом {child.returncode}")
+                continue
+            r = json.loads(lines[-1])
+            status = (f"ок, {r['points']} точек из {r['windows']} окон за {r['analyzed_sec'] / 60:.1f} мин"
+                      if r['ok'] else f"ошибка: {r['error'][:60]}")
+            print(f"{mode:<8}{status}; пик RSS {r['peak_rss_mb']:.0f} МБ, {r['total_sec']:.1f} с, "
+                  f"батчи {r['batch_sizes']}, memmap={r.get('memmap')}")
+            if mode != "budget":
+                continue
+            if not r['ok']:
+                failed.append(f"анализ не завершен ({r['error'][:60]})")
+            elif r['points'] != r['windows']:
+                failed.append(f"проанализировано {r['points']} окон из {r['windows']}")
+            if r['peak_rss_mb'] > limit_mb:
+                failed.append(f"пик RSS {r['peak_rss_mb']:.0f} МБ больше лимита {limit_mb:.0f} МБ")
+
+    if failed:
+        print(f"Режим budget: {', '.join(failed)}")
+        sys.exit(1)
+    print("Режим budget: весь файл проанализирован в пределах лимита")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Анализ на лету при инференсе медленнее шага: отставание с учетом срока и без него
+
+Запись имитируется фейковым потоком AudioRecorder (режим callback), который отдает
+блоки синтетического аудио в реальном времени. Инференс по умолчанию - фейковый
+предиктор с заданной задержкой (как wav2vec2 на слабом CPU); с --real-model
+используется EmotionPredictor. Сравниваются:
+  - наивный анализ всех окон по порядку: отставание растет на протяжении записи;
+  - RealtimeAnalyzer: отставание ограничено, пропущенные окна отмечены отрезками;
+  - досчет пропущенных окон после остановки: шкала совпадает с сеткой анализа готовой записи.
+
+Запуск из каталога проекта (с --real-model - из каталога с моделями):
+    python benchmarks/bench_realtime.py --seconds 30 --latency 1.2
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio.recorder import AudioRecorder
+from analysis.realtime import RealtimeAnalyzer
+
+LABELS = ('anger', 'happy', 'sad', 'neutral')
+
+
+class FakeStream:
+    """Поток ввода: блоки синтетического аудио в колбэк с реальной скоростью"""
+
+    def __init__(self, samplerate, channels, dtype, device, blocksize, callback):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.position = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        rng = np.random.default_rng(0)
+        began = time.perf_counter()
+        while self._running:
+            t = (self.position + np.arange(self.blocksize)) / self.samplerate
+            block = 0.3 * np.sin(2 * np.pi * 180 * t) + 0.05 * rng.standard_normal(self.blocksize)
+            self.callback(block.astype(np.float32).reshape(-1, 1), self.blocksize, None, None)
+            self.position += self.blocksize
+            delay = began + self.position / self.samplerate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+    def close(self):
+        pass
+
+
+class SlowPredictor:
+    """Предиктор с фиксированной задержкой на окно (батч стоит столько же на окно)"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.model = object()
+        self.batch_size = 8
+        self.calls = 0
+
+    def initialize(self):
+        pass
+
+    def predict_emotion(self, audio_data, sample_rate):
+        self.calls += 1
+        time.sleep(self.latency)
+        score = float(np.clip(np.abs(audio_data).mean(), 0, 1))
+        return [{'label': label, 'score': score if i == 0 else (1 - score) / 3} for i, label in enumerate(LABELS)]
+
+    def predict_emotion_batch(self, segments, sample_rate, batch_size=8):
+        return [self.predict_emotion(segment, sample_rate) for segment in segments]
+
+
+def make_recorder():
+    return AudioRecorder(mode="callback", device=0, stream_factory=FakeStream)
+
+
+def run_naive(predictor, seconds, window_samples, step_samples):
+    """Все окна по порядку, как при анализе готовой записи: отставание в конце записи"""
+    recorder = make_recorder()
+    recorder.start_recording()
+    next_start, lags, deadline = 0, [], time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        position = recorder.latest_audio(0)[0]
+        if position - next_start < window_samples:
+            time.sleep(0.05)
+            continue
+        position, data = recorder.latest_audio(position - next_start)
+        offset = next_start - (position - len(data))
+        predictor.predict_emotion(data[offset:offset + window_samples], recorder.sample_rate)
+        lags.append((recorder.latest_audio(0)[0] - next_start - window_samples) / recorder.sample_rate)
+        next_start += step_samples
+    recorder.stop_recording()
+    return lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=30.0, help="Длительность записи")
+    parser.add_argument('--latency', type=float, default=1.2, help="Задержка фейкового инференса, сек")
+    parser.add_argument('--window-size', type=float, default=2.0, help="Размер окна, сек")
+    parser.add_argument('--step', type=float, default=0.5, help="Шаг окон, сек")
+    parser.add_argument('--real-model', action='store_true', help="Использовать EmotionPredictor")
+    args = parser.parse_args()
+
+    if args.real_model:
+        from model.predict import EmotionPredictor
+        predictor = EmotionPredictor()
+        predictor.initialize()
+    else:
+        predictor = SlowPredictor(args.latency)
+
+    sr = 16000
+    window_samples, step_samples = int(args.window_size * sr), int(args.step * sr)
+    lags = run_naive(predictor, args.seconds, window_samples, step_samples)
+    print(f"Наивный анализ:    окон {len(lags)}, отставание в конце {lags[-1] if lags else 0:.2f} сек")
+
+    recorder = make_recorder()
+    analyzer = RealtimeAnalyzer(predictor, recorder, window_size=args.window_size, step=args.step)
+    recorder.start_recording()
+    analyzer.start()
+    time.sleep(args.seconds)
+    analyzer.stop()
+    audio_data, sample_rate = recorder.stop_recording()
+    points, skipped = analyzer.snapshot()
+    reasons = {reason: sum(span['windows'] for span in skipped if span['reason'] == reason)
+               for reason in ('coarse', 'late')}
+    print(f"С учетом срока:    окон {len(points)}, наибольшее отставание {analyzer.stats['max_lag']:.2f} сек, "
+          f"шаг x{analyzer.step_factor()}, пропущено {analyzer.stats['skipped']} "
+          f"(загрубление {reasons['coarse']}, устаревшие {reasons['late']})")
+
+    start = time.perf_counter()
+    timeline = analyzer.backfill(audio_data, sample_rate)
+    elapsed = time.perf_counter() - start
+    expected = [start / sample_rate for start in range(0, len(audio_data) - window_samples, step_samples)]
+    print(f"Досчет:            {analyzer.stats['backfilled']} окон за {elapsed:.1f} сек, "
+          f"шкала совпадает с сеткой готовой записи: {[p['time'] for p in timeline] == expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Пропускная способность пакетной отрисовки отчетов (отчетов/сек)
+
+Синтетические шкалы записываются в JSON в формате команды analyze. Замеряются:
+новая фигура на каждый отчет (как при построении через plt.figure), одна фигура
+на процесс и пул процессов разного размера.
+
+Запуск из каталога проекта:
+    python benchmarks/bench_reports.py --files 200 --minutes 5 --workers 1 2 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis.report import ReportRenderer, render_reports, load_report_input
+
+STEP = 0.5
+LABELS = ('anger', 'happy', 'sad', 'neutral')
+
+
+def synth_timeline(rng, points):
+    walk = np.cumsum(rng.normal(0, 0.08, size=(points, len(LABELS))), axis=0)
+    scores = np.exp(walk - walk.max(axis=1, keepdims=True))
+    scores /= scores.sum(axis=1, keepdims=True)
+    return [
+        {'time': i * STEP, 'emotions': [{'label': label, 'score': float(score)}
+                                        for label, score in zip(LABELS, row)]}
+        for i, row in enumerate(scores)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=200, help="Количество шкал")
+    parser.add_argument('--minutes', type=float, default=5.0, help="Длительность каждой шкалы")
+    parser.add_argument('--formats', nargs='+', default=['png', 'html'], help="Форматы отчетов")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Размеры пула")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    points = int(args.minutes * 60 / STEP)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sources = []
+        for i in range(args.files):
+            path = os.path.join(tmp_dir, f"timeline_{i:04d}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'source': f"clip_{i}.wav", 'timeline': synth_timeline(rng, points)}, f)
+            sources.append(path)
+        print(f"{args.files} шкал по {points} точек, форматы: {', '.join(args.formats)}")
+
+        # Новая фигура на каждый отчет; для скорости замера - на части файлов
+        sample = sources[:max(1, args.files // 4)]
+        out_dir = os.path.join(tmp_dir, "fresh")
+        os.makedirs(out_dir)
+        start = time.perf_counter()
+        for i, source in enumerate(sample):
+            timeline_data, title = load_report_input(source)
+            ReportRenderer(args.formats).render(timeline_data, os.path.join(out_dir, str(i)), title)
+        elapsed = time.perf_counter() - start
+        print(f"Новая фигура на отчет:  {len(sample) / elapsed:6.1f} отчетов/сек")
+
+        for workers in args.workers:
+            out_dir = os.path.join(tmp_dir, f"pool_{workers}")
+            start = time.perf_counter()
+            results = list(render_reports(sources, out_dir, args.formats, workers))
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for _, _, error in results if error is not None)
+            label = "Одна фигура, 1 процесс:" if workers == 1 else f"Пул из {workers} процессов:"
+            print(f"{label:<24}{args.files / elapsed:6.1f} отчетов/сек (ошибок {failed})")
+
+
+if __name__ == "__main__":
+    main()
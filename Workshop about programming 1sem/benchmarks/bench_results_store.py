@@ -0,0 +1,86 @@
+"""Хранилище результатов: задержка append, скорость записи и время запросов
+
+Генерируются синтетические шкалы (случайное блуждание оценок эмоций с шагом 0.5 с),
+которые записываются в ResultsStore во временном каталоге, затем выполняется запрос
+"злость > 0.7 дольше 5 с за последние 30 дней" через индекс и проход по фрагментам.
+
+Запуск из каталога проекта:
+    python benchmarks/bench_results_store.py --files 300 --minutes 60
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis.results_store import ResultsStore, STORE_EMOTIONS
+
+STEP = 0.5
+DAY = 24 * 3600
+
+
+def synth_timeline(rng, points):
+    """Шкала в формате EmotionPredictor с плавно меняющимися оценками"""
+    walk = np.cumsum(rng.normal(0, 0.08, size=(points, 4)), axis=0)
+    scores = np.exp(walk - walk.max(axis=1, keepdims=True))
+    scores /= scores.sum(axis=1, keepdims=True)
+    labels = STORE_EMOTIONS[:4]
+    return [
+        {'time': i * STEP, 'emotions': [{'label': label, 'score': float(score)}
+                                        for label, score in zip(labels, row)]}
+        for i, row in enumerate(scores)
+    ]
+
+
+def timed(func, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=300, help="Количество шкал")
+    parser.add_argument('--minutes', type=float, default=60.0, help="Длительность каждого файла")
+    parser.add_argument('--distinct', type=int, default=20, help="Различных шкал (остальные - повторы)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    points = int(args.minutes * 60 / STEP)
+    timelines = [synth_timeline(rng, points) for _ in range(min(args.distinct, args.files))]
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = ResultsStore(store_dir)
+        enqueue = []
+        start = time.perf_counter()
+        for i in range(args.files):
+            # Файлы равномерно распределены по последним 60 дням
+            analyzed_at = now - (args.files - i) * 60 * DAY / args.files
+            t0 = time.perf_counter()
+            store.append(timelines[i % len(timelines)], f"file_{i}.wav", "English", analyzed_at)
+            enqueue.append(time.perf_counter() - t0)
+        store.flush()
+        write_time = time.perf_counter() - start
+        total_points = args.files * points
+        print(f"Записано {args.files} шкал, {total_points / 1e6:.1f} млн точек за {write_time:.1f} с "
+              f"({total_points / write_time / 1e6:.2f} млн точек/с)")
+        print(f"append: медиана {np.median(enqueue) * 1e3:.3f} мс, максимум {max(enqueue) * 1e3:.3f} мс")
+
+        since = now - 30 * DAY
+        segments, indexed = timed(lambda: store.find_segments('anger', 0.7, 5.0, since=since))
+        print(f"Индекс (порог 0.7): {len(segments)} отрезков за {indexed * 1e3:.2f} мс")
+        segments, scanned = timed(lambda: store.find_segments('anger', 0.75, 5.0, since=since), repeats=2)
+        print(f"Проход по фрагментам (порог 0.75): {len(segments)} отрезков за {scanned * 1e3:.1f} мс")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
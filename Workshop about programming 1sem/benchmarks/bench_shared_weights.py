@@ -0,0 +1,168 @@
+"""Память процессов анализа: своя копия весов в каждом процессе и общая копия в разделяемой памяти
+
+Запускаются N процессов анализа (ProcessAnalysisBackend, как при --max-jobs N), каждый
+анализирует короткую запись. Затем по /proc/<pid>/smaps_rollup замеряются PSS (доля
+процесса в разделяемых страницах) и USS (только его страницы) каждого процесса.
+
+Для сравнения замеряются процессы, загружающие модель сами, для обоих форматов весов
+(safetensors и pytorch_model.bin во временном каталоге моделей). Если transformers и torch
+читают файл весов в память, каждый такой процесс держит свою копию; версии, отображающие
+файл в память, уже делят его страницы через page cache, и экономия близка к нулю - она
+выводится как измеренная разница USS. Проверки (завершение с ошибкой, если не выполнены):
+  - PSS разделяемой памяти всех процессов в сумме - одна копия весов;
+  - суммарный PSS не больше, чем у процессов со своей загрузкой модели;
+  - шкалы совпадают с анализом процессов со своей загрузкой модели.
+Только Linux.
+
+Запуск из каталога с моделями:
+    python ".../benchmarks/bench_shared_weights.py" --workers 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.analysis_worker import ProcessAnalysisBackend
+from model.model_loader import EmotionModelLoader
+from model.shared_weights import SharedModelWeights
+
+SR = 16000
+# Допуск сравнений в долях размера весов (выравнивание, неточный учет страниц)
+TOLERANCE = 0.2
+
+
+def memory_mb(pid):
+    """PSS, USS и PSS разделяемой памяти (shmem) процесса по smaps_rollup, МБ"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'pss': fields['Pss'], 'uss': fields['Private_Clean'] + fields['Private_Dirty'],
+            'pss_shmem': fields.get('Pss_Shmem', 0.0)}
+
+
+def run_workers(workers, audio, shared_weights=None, timeout=600):
+    """N процессов анализа, по одной записи в каждом; замер памяти, пока процессы живы"""
+    backends = [ProcessAnalysisBackend(lambda callback: callback(), language="English",
+                                       shared_weights=shared_weights) for _ in range(workers)]
+    results = [None] * workers
+    done = threading.Semaphore(0)
+
+    def on_done(index):
+        def callback(timeline, cancelled):
+            results[index] = timeline
+            done.release()
+        return callback
+
+    def on_error(error):
+        print(f"Ошибка процесса анализа: {error}")
+        done.release()
+
+    start = time.perf_counter()
+    try:
+        for index, backend in enumerate(backends):
+            backend.submit(audio, SR, on_done(index), on_error)
+        for _ in backends:
+            if not done.acquire(timeout=timeout):
+                raise RuntimeError("Процессы анализа не ответили вовремя")
+        elapsed = time.perf_counter() - start
+        memory = [memory_mb(backend._process.pid) for backend in backends]
+    finally:
+        for backend in backends:
+            backend.close()
+    return results, memory, elapsed
+
+
+@contextlib.contextmanager
+def models_copy(source_dir, safe_serialization):
+    """Временный рабочий каталог с models/English в заданном формате весов"""
+    from transformers import AutoModelForAudioClassification, AutoFeatureExtractor
+
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_path = os.path.join(work_dir, 'models', 'English')
+        model = AutoModelForAudioClassification.from_pretrained(source_dir)
+        model.save_pretrained(model_path, safe_serialization=safe_serialization)
+        AutoFeatureExtractor.from_pretrained(source_dir).save_pretrained(model_path)
+        del model
+        os.chdir(work_dir)
+        try:
+            yield
+        finally:
+            os.chdir(previous)
+
+
+def summarize(name, memory, elapsed):
+    total = {key: sum(item[key] for item in memory) for key in memory[0]}
+    per_worker = ", ".join(f"{item['uss']:.0f}" for item in memory)
+    print(f"{name:<28} PSS {total['pss']:7.0f} МБ (shmem {total['pss_shmem']:5.0f}), "
+          f"USS по процессам {per_worker} МБ, запуск и анализ {elapsed:.1f} сек")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=3, help="Процессов анализа")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Длительность записи")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(int(args.seconds * SR)) * 0.1).astype(np.float32)
+
+    source_dir = os.path.abspath(os.path.join('models', 'English'))
+    if not os.path.isdir(source_dir):
+        print(f"Модель не найдена в {source_dir}: запустите из каталога с моделями")
+        sys.exit(1)
+
+    with models_copy(source_dir, safe_serialization=True):
+        mapped_results, mapped_memory, elapsed = run_workers(args.workers, audio)
+    mapped = summarize("Своя загрузка (safetensors):", mapped_memory, elapsed)
+
+    with models_copy(source_dir, safe_serialization=False):
+        private_results, private_memory, elapsed = run_workers(args.workers, audio)
+        private = summarize("Своя загрузка (.bin):", private_memory, elapsed)
+
+        shared_weights = SharedModelWeights(EmotionModelLoader.shared())
+        try:
+            start = time.perf_counter()
+            handle = shared_weights.handle("English")
+            print(f"Веса в разделяемой памяти: {handle['size'] / 2 ** 20:.0f} МБ "
+                  f"за {time.perf_counter() - start:.1f} сек")
+            shared_results, shared_memory, elapsed = run_workers(args.workers, audio, shared_weights)
+        finally:
+            shared_weights.close()
+    shared = summarize("Разделяемые веса:", shared_memory, elapsed)
+
+    weights_mb = handle['size'] / 2 ** 20
+    shared_uss = np.mean([item['uss'] for item in shared_memory])
+    for name, memory in (("safetensors", mapped_memory), (".bin", private_memory)):
+        uss = np.mean([item['uss'] for item in memory])
+        print(f"Своя загрузка ({name}): копия весов в USS процесса ~{max(uss - shared_uss, 0):.0f} МБ "
+              f"из {weights_mb:.0f}")
+    print(f"Суммарный PSS: {mapped['pss']:.0f} (safetensors), {private['pss']:.0f} (.bin) -> "
+          f"{shared['pss']:.0f} МБ (разделяемые веса {weights_mb:.0f} МБ, процессов {args.workers})")
+
+    checks = [
+        ("веса учтены один раз", abs(shared['pss_shmem'] - weights_mb) <= TOLERANCE * weights_mb),
+        ("не больше своей загрузки",
+         shared['pss'] <= min(mapped['pss'], private['pss']) + TOLERANCE * weights_mb),
+        ("шкалы совпадают",
+         shared_results == private_results == mapped_results and all(shared_results)),
+    ]
+    failed = [name for name, ok in checks if not ok]
+    if failed:
+        print(f"Не выполнено: {', '.join(failed)}")
+        sys.exit(1)
+    print("Все проверки выполнены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Пропускная способность на коротких файлах: батчи внутри файла против упаковки окон
+
+Генерируются короткие записи 3-10 с (как голосовые сообщения). Сначала каждый файл
+анализируется отдельно через get_emotion_timeline, затем все файлы - через WindowPacker.
+Выводятся окна/сек, средний заполненный размер батча и совпадение шкал.
+
+Запуск из каталога с моделями (models/<язык>):
+    python benchmarks/bench_window_packing.py --files 60 --batch-size 16
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio.audio_utils import AudioProcessor
+from analysis.packer import WindowPacker
+from model.predict import EmotionPredictor
+
+
+def write_clips(directory, count, sr=16000, seed=0):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        seconds = rng.uniform(3, 10)
+        t = np.arange(int(seconds * sr)) / sr
+        audio = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 300) * t) + 0.05 * rng.standard_normal(len(t))
+        path = os.path.join(directory, f"clip_{i:03d}.wav")
+        sf.write(path, audio.astype(np.float32), sr)
+        paths.append(path)
+    return paths
+
+
+def max_difference(first, second):
+    """Наибольшее расхождение оценок между двумя шкалами одинаковой формы"""
+    diff = 0.0
+    for a, b in zip(first, second):
+        scores_a = {p['label']: p['score'] for p in a['emotions']}
+        scores_b = {p['label']: p['score'] for p in b['emotions']}
+        diff = max(diff, max(abs(scores_a[label] - scores_b.get(label, 0.0)) for label in scores_a))
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=60, help="Количество коротких файлов")
+    parser.add_argument('--batch-size', type=int, default=16, help="Размер батча в обоих режимах")
+    args = parser.parse_args()
+
+    predictor = EmotionPredictor()
+    predictor.initialize()
+    predictor.batch_size = args.batch_size
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = write_clips(tmp_dir, args.files)
+        # Прогрев модели
+        predictor.get_emotion_timeline(*AudioProcessor.load_audio(paths[0]))
+
+        start = time.perf_counter()
+        per_file = [predictor.get_emotion_timeline(*AudioProcessor.load_audio(path)) for path in paths]
+        per_file_time = time.perf_counter() - start
+        windows = sum(len(timeline) for timeline in per_file)
+        batches = sum(-(-len(timeline) // args.batch_size) for timeline in per_file)
+        print(f"По файлам:  {windows / per_file_time:6.1f} окон/сек, {per_file_time:.1f} сек, "
+              f"средний батч {windows / max(1, batches):.1f}")
+
+        packer = WindowPacker(predictor, batch_size=args.batch_size)
+        start = time.perf_counter()
+        packed = {path: timeline for path, timeline, _ in packer.run(paths)}
+        packed_time = time.perf_counter() - start
+        stats = packer.stats
+        print(f"Упаковка:   {stats['windows'] / packed_time:6.1f} окон/сек, {packed_time:.1f} сек, "
+              f"средний батч {stats['windows'] / max(1, stats['batches']):.1f}, "
+              f"ожидание декодирования {stats['decode_wait']:.2f} сек")
+
+        same_shape = all(
+            [p['time'] for p in packed[path]] == [p['time'] for p in timeline]
+            for path, timeline in zip(paths, per_file)
+        )
+        diff = max(max_difference(packed[path], timeline) for path, timeline in zip(paths, per_file))
+        print(f"Ускорение {per_file_time / packed_time:.2f}x; шкалы совпадают по точкам: {same_shape}, "
+              f"максимальное расхождение оценок {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
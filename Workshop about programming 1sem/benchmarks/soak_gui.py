@@ -0,0 +1,217 @@
+"""Долгая сессия GUI: сотни циклов анализ/показ результатов без роста памяти
+
+Окно VoiceAnalyzeGUI работает с фейковым предиктором (анализ в потоке, без модели).
+Каждый цикл ставит в очередь новую запись, ждет частичных и итоговых результатов
+(экран результатов) и возвращается на приветственный экран. После прогрева
+замеряются RSS процесса и количество объектов: фигуры и холсты matplotlib, CTkImage,
+PhotoImage, виджеты Tk, команды Tcl, задачи очереди. Если к концу прогона что-то из
+этого выросло сверх допуска, скрипт завершается с ошибкой.
+
+Нужен дисплей (на сервере - через xvfb-run):
+    python benchmarks/soak_gui.py --cycles 300
+"""
+import os
+import gc
+import sys
+import time
+import argparse
+import tempfile
+from collections import Counter
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import customtkinter as ctk
+import matplotlib
+matplotlib.use('TkAgg')
+import matplotlib.pyplot as plt
+
+from audio.recorder import AudioRecorder
+from gui.interface import VoiceAnalyzeGUI
+
+SR = 16000
+LABELS = ('anger', 'happy', 'sad', 'neutral')
+# Объекты, количество которых не должно расти от цикла к циклу
+TRACKED_TYPES = ('Figure', 'FigureCanvasTkAgg', 'CTkImage', 'PhotoImage', 'CTkLabel', 'CTkFrame',
+                 'CTkTextbox', 'AnalysisJob', 'EmotionAggregator')
+# Допустимый рост счетчиков между концом прогрева и концом прогона
+COUNT_TOLERANCE = 2
+# Интервал опроса состояния задачи из mainloop, мс
+POLL_MS = 5
+
+
+class FakePredictor:
+    """Предиктор без модели: случайные оценки окон с задержкой на батч"""
+
+    def __init__(self, batch_delay=0.01, batch_size=8):
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+
+    def update_model_for_language(self, language):
+        pass
+
+    def model_id(self):
+        return {'model': 'fake'}
+
+    def iter_emotion_timeline(self, audio_data, sample_rate, window_size=2.0, step=0.5, start_window=0):
+        window_samples, step_samples = int(window_size * sample_rate), int(step * sample_rate)
+        starts = range(0, len(audio_data) - window_samples, step_samples)
+        rng = np.random.default_rng(len(audio_data))
+        for index in range(start_window, len(starts), self.batch_size):
+            time.sleep(self.batch_delay)
+            batch = starts[index:index + self.batch_size]
+            points = []
+            for start in batch:
+                scores = rng.dirichlet(np.ones(len(LABELS)))
+                emotions = sorted(({'label': label, 'score': float(score)} for label, score in zip(LABELS, scores)),
+                                  key=lambda prediction: prediction['score'], reverse=True)
+                points.append({'time': start / sample_rate, 'emotions': emotions})
+            yield points, index + len(batch), len(starts)
+
+
+def rss_mb():
+    """Текущий RSS процесса, МБ (Linux)"""
+    with open('/proc/self/statm') as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+def object_counts(app):
+    gc.collect()
+    by_type = Counter(type(obj).__name__ for obj in gc.get_objects())
+    counts = {name: by_type[name] for name in TRACKED_TYPES}
+    counts['tk_widgets'] = count_widgets(app.window)
+    counts['tcl_commands'] = len(app.window.tk.splitlist(app.window.tk.call('info', 'commands')))
+    counts['pyplot_figures'] = len(plt.get_fignums())
+    return counts
+
+
+def run_cycle(app, rng, seconds, timeout):
+    """Запись в очередь, ожидание результатов на экране, возврат на приветственный экран
+
+    Генератор шагов для drive: между шагами работает mainloop, как в приложении
+    (поток анализа передает результаты через after, что требует запущенного mainloop).
+    """
+    audio = (rng.standard_normal(int(seconds * SR)) * 0.1).astype(np.float32)
+    app.process_audio(audio, SR)
+    job = app.followed_job
+    deadline = time.perf_counter() + timeout
+    while job.active:
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"Задача #{job.job_id} не завершилась за {timeout} сек")
+        yield
+    # Итоговый результат показывается обратным вызовом, поставленным в очередь событий
+    yield
+    if app.results_canvas is None:
+        raise RuntimeError(f"Экран результатов не показан для задачи #{job.job_id} ({job.status})")
+    app.show_welcome_screen()
+    yield
+
+
+def drive(app, steps):
+    """Выполнение генератора шагов внутри mainloop окна; исключение шага пробрасывается"""
+    errors = []
+
+    def step():
+        try:
+            next(steps)
+        except StopIteration:
+            app.window.quit()
+            return
+        except Exception as e:
+            errors.append(e)
+            app.window.quit()
+            return
+        app.window.after(POLL_MS, step)
+
+    app.window.after(0, step)
+    app.window.mainloop()
+    if errors:
+        raise errors[0]
+
+
+def show_all_frames(app):
+    """Однократный показ всех кадров анимации
+
+    CTkImage создает PhotoImage кадра при первом показе, а анимация за цикл проходит
+    лишь несколько кадров: без этого заполнение кэша кадров выглядело бы как рост.
+    """
+    label = ctk.CTkLabel(app.window, text="")
+    for frame in app.gif_frames:
+        label.configure(image=frame)
+    label.configure(image=None)
+    label.destroy()
+
+
+def soak(app, rng, args, results):
+    """Прогрев и замеряемые циклы; итоговые замеры складываются в results"""
+    for _ in range(args.warmup):
+        yield from run_cycle(app, rng, args.seconds, args.timeout)
+    show_all_frames(app)
+    yield
+    results['baseline'], results['baseline_rss'] = object_counts(app), rss_mb()
+    samples = results['samples'] = []
+    start = time.perf_counter()
+    for cycle in range(1, args.cycles + 1):
+        yield from run_cycle(app, rng, args.seconds, args.timeout)
+        if cycle % max(1, args.cycles // 10) == 0:
+            samples.append((cycle, rss_mb()))
+            print(f"цикл {cycle:5d}: RSS {samples[-1][1]:8.1f} МБ")
+    results['elapsed'] = time.perf_counter() - start
+    results['final'], results['final_rss'] = object_counts(app), rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cycles', type=int, default=300, help="Циклов анализ/показ после прогрева")
+    parser.add_argument('--warmup', type=int, default=30, help="Циклов прогрева")
+    parser.add_argument('--seconds', type=float, default=20.0, help="Длительность каждой записи")
+    parser.add_argument('--max-finished-jobs', type=int, default=10,
+                        help="Сколько завершенных задач хранит очередь (меньше прогрева)")
+    parser.add_argument('--max-rss-growth', type=float, default=10.0, help="Допустимый рост RSS, МБ")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Ожидание одной задачи, сек")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Хранилище результатов и контрольные точки пишутся в рабочий каталог
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        app = VoiceAnalyzeGUI(analysis_backend="thread", predictor=FakePredictor(),
+                              recorder=AudioRecorder(device=0))
+        app.scheduler.max_finished_jobs = args.max_finished_jobs
+        results = {}
+        try:
+            drive(app, soak(app, rng, args, results))
+        finally:
+            app.on_close()
+            os.chdir(PROJECT_DIR)
+
+    baseline, final, samples = results['baseline'], results['final'], results['samples']
+    baseline_rss, final_rss, elapsed = results['baseline_rss'], results['final_rss'], results['elapsed']
+    print(f"{args.cycles} циклов за {elapsed:.1f} сек ({elapsed / args.cycles * 1000:.0f} мс на цикл)")
+    failed = []
+    print(f"{'объекты':<20}{'после прогрева':>16}{'в конце':>10}")
+    for name in baseline:
+        growth = final[name] - baseline[name]
+        print(f"{name:<20}{baseline[name]:>16}{final[name]:>10}")
+        if growth > COUNT_TOLERANCE:
+            failed.append(f"{name} +{growth}")
+    cycles, rss = zip(*samples)
+    slope = np.polyfit(cycles, rss, 1)[0] * 1024 if len(samples) > 1 else 0.0
+    print(f"RSS: {baseline_rss:.1f} -> {final_rss:.1f} МБ, наклон {slope:.1f} КБ на цикл")
+    if final_rss - baseline_rss > args.max_rss_growth:
+        failed.append(f"RSS +{final_rss - baseline_rss:.1f} МБ")
+
+    if failed:
+        print(f"Рост за долгую сессию: {', '.join(failed)}")
+        sys.exit(1)
+    print("Память и количество объектов стабильны")
+
+
+if __name__ == "__main__":
+    main()
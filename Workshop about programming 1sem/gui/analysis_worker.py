@@ -0,0 +1,417 @@
+import weakref
+import logging
+import itertools
+import threading
+import contextlib
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import numpy as np
+from analysis.job import TimelineJob, DEFAULT_WINDOW_SIZE, DEFAULT_STEP
+from analysis.checkpoint import CHECKPOINT_DIR
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_BACKENDS = ("thread", "process")
+WORKER_LOG_FILE = 'voice_analyze.worker.log'
+
+
+class WorkerCrashed(RuntimeError):
+    """Процесс анализа завершился, не вернув результат"""
+
+
+class _PredictorGate:
+    """Доступ задач к модели общего предиктора и смена ее языка
+
+    Все бэкенды, работающие с одним предиктором (слоты очереди при --max-jobs > 1),
+    получают один шлюз. Смена языка ждет, пока модель не используется ни одной задачей,
+    а новые задачи ждут окончания смены.
+    """
+
+    _gates = weakref.WeakKeyDictionary()
+    _gates_lock = threading.Lock()
+
+    @classmethod
+    def for_predictor(cls, predictor):
+        with cls._gates_lock:
+            if predictor not in cls._gates:
+                cls._gates[predictor] = cls(predictor)
+            return cls._gates[predictor]
+
+    def __init__(self, predictor):
+        self.predictor = weakref.proxy(predictor)
+        self.loaded_language = None
+        self._active = 0
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def use(self, language):
+        """Использование модели задачей; при необходимости модель сначала переключается на language"""
+        with self._condition:
+            if language is not None and language != self.loaded_language:
+                self._condition.wait_for(lambda: self._active == 0 or language == self.loaded_language)
+                if language != self.loaded_language:
+                    # Под условием: другие задачи не начнутся, пока модель не загружена
+                    self.predictor.update_model_for_language(language)
+                    self.loaded_language = language
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+
+class ThreadAnalysisBackend:
+    """Анализ в фоновом потоке процесса GUI (прежнее поведение)"""
+
+    def __init__(self, predictor, dispatch, language=None):
+        """
+        Args:
+            predictor: EmotionPredictor, выполняющий анализ
+            dispatch: Функция передачи колбэка в главный поток Tk (например, window.after(0, ...))
+            language (str): Язык модели; загружается в потоке анализа, а не в главном
+        """
+        self.predictor = predictor
+        self.dispatch = dispatch
+        self.language = language
+        # Общий для всех бэкендов этого предиктора: смена языка не идет во время чужого анализа
+        self._gate = _PredictorGate.for_predictor(predictor)
+        self._jobs = {}
+        self._job_ids = itertools.count(1)
+
+    def submit(self, audio_data, sample_rate, on_done, on_error, on_partial=None,
+               window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP):
+        """Запуск анализа; колбэки вызываются в главном потоке
+
+        Args:
+            on_done: on_done(временная шкала, была ли отмена)
+            on_error: on_error(исключение)
+            on_partial: on_partial(новые точки, обработано окон, всего окон)
+            window_size, step: Размер окна и шаг анализа, секунды
+
+        Returns:
+            int: Идентификатор задачи для cancel()
+        """
+        job_id = next(self._job_ids)
+        job = TimelineJob(self.predictor, audio_data, sample_rate, window_size, step,
+                          checkpoint_dir=CHECKPOINT_DIR)
+        self._jobs[job_id] = job
+
+        def publish(points, processed, total):
+            if on_partial is not None:
+                self.dispatch(lambda: on_partial(points, processed, total))
+
+        def run():
+            try:
+                with self._gate.use(self.language):
+                    timeline_data, cancelled = job.run(publish)
+                self.dispatch(lambda: on_done(timeline_data, cancelled))
+            except Exception as e:
+                logger.error(f"Ошибка при анализе: {e}")
+                self.dispatch(lambda error=e: on_error(error))
+            finally:
+                self._jobs.pop(job_id, None)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return job_id
+
+    def cancel(self, job_id):
+        """Отмена задачи (останавливается после текущего окна)"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def set_language(self, language):
+        """Смена языка; модель загружается перед следующим анализом"""
+        self.language = language
+
+    def close(self):
+        pass
+
+
+def _worker_main(conn, cancel_job_id, cascade_threshold, mmap_weights, language, log_level, weights_handle=None):
+    """Точка входа процесса анализа: модель загружается здесь, а не в процессе GUI
+
+    С weights_handle модель не загружается, а подключается к весам в разделяемой памяти;
+    если подключиться не удалось, процесс загружает модель сам.
+    """
+    from log_config import setup_logging
+    from model.model_loader import EmotionModelLoader
+    from model.predict import EmotionPredictor
+
+    setup_logging(mode="sync", level=log_level, log_file=WORKER_LOG_FILE)
+    if mmap_weights:
+        EmotionModelLoader.shared().mmap_weights = True
+
+    def attach(handle):
+        try:
+            EmotionModelLoader.shared().load_shared_weights(handle)
+        except Exception as e:
+            logger.error(f"Не удалось подключиться к разделяемым весам {handle['name']}, "
+                         f"модель загружается в процессе анализа: {e}")
+
+    if weights_handle is not None:
+        attach(weights_handle)
+    predictor = EmotionPredictor(cascade_threshold=cascade_threshold)
+    if language:
+        predictor.update_model_for_language(language)
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        command = message[0]
+        if command == 'stop':
+            break
+        if command == 'language':
+            try:
+                if message[2] is not None:
+                    attach(message[2])
+                # Без подключенных весов модель языка загружается здесь
+                predictor.update_model_for_language(message[1])
+            except Exception as e:
+                logger.error(f"Ошибка при смене языка в процессе анализа: {e}")
+            continue
+
+        _, job_id, shm_name, shape, dtype, sample_rate, window_size, step = message
+        shm = shared_memory.SharedMemory(name=shm_name)
+        audio_data = job = None
+        try:
+            audio_data = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            job = TimelineJob(predictor, audio_data, sample_rate, window_size, step,
+                              cancel_check=lambda: cancel_job_id.value == job_id,
+                              checkpoint_dir=CHECKPOINT_DIR)
+            timeline_data, cancelled = job.run(
+                lambda points, processed, total: conn.send(('partial', job_id, (points, processed, total)))
+            )
+            audio_data = job = None
+            conn.send(('result', job_id, (timeline_data, cancelled)))
+        except Exception as e:
+            logger.error(f"Ошибка при анализе в процессе анализа: {e}")
+            conn.send(('error', job_id, str(e)))
+        finally:
+            # Ссылки на буфер сегмента снимаются и при ошибке, иначе close не сможет его освободить
+            audio_data = job = None
+            try:
+                shm.close()
+            except BufferError as e:
+                logger.error(f"Сегмент аудио {shm_name} еще используется и не закрыт: {e}")
+    conn.close()
+
+
+class ProcessAnalysisBackend:
+    """Анализ в отдельном процессе, чтобы torch и цикл по окнам не делили GIL с Tk
+
+    Аудио передается через разделяемую память, команды и результаты - через канал.
+    Процесс запускается при первом запросе и перезапускается, если упал: ожидающий
+    запрос при этом завершается ошибкой WorkerCrashed, окно продолжает работать.
+    С shared_weights (SharedModelWeights) процессы анализа подключаются к одной копии
+    весов в разделяемой памяти вместо загрузки своей.
+    """
+
+    def __init__(self, dispatch, cascade_threshold=None, mmap_weights=False, language=None, shared_weights=None):
+        self.dispatch = dispatch
+        self.cascade_threshold = cascade_threshold
+        self.mmap_weights = mmap_weights
+        self.language = language
+        self.shared_weights = shared_weights
+        self._context = mp.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._reader = None
+        self._pending = {}
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Номер отменяемой задачи: процесс анализа проверяет его между окнами
+        self._cancel_job_id = self._context.Value('q', 0, lock=False)
+
+    def _ensure_worker(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self._cancel_job_id, self.cascade_threshold, self.mmap_weights, self.language,
+                  logging.getLogger().level, self._ready_weights_handle(self.language)),
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._reader = threading.Thread(target=self._read_loop, args=(self._process, parent_conn))
+        self._reader.daemon = True
+        self._reader.start()
+        logger.info(f"Процесс анализа запущен (pid {self._process.pid})")
+
+    def submit(self, audio_data, sample_rate, on_done, on_error, on_partial=None,
+               window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP):
+        """Запуск анализа; аргументы как у ThreadAnalysisBackend.submit
+
+        Returns:
+            int: Идентификатор задачи для cancel() (None, если задачу не удалось передать)
+        """
+        audio_data = np.ascontiguousarray(audio_data, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=max(audio_data.nbytes, 1))
+        np.ndarray(audio_data.shape, dtype=audio_data.dtype, buffer=shm.buf)[...] = audio_data
+
+        with self._lock:
+            try:
+                self._ensure_worker()
+                job_id = next(self._job_ids)
+                self._pending[job_id] = (self._process, shm, on_done, on_error, on_partial)
+                self._conn.send(('analyze', job_id, shm.name, audio_data.shape,
+                                 audio_data.dtype.str, sample_rate, window_size, step))
+                return job_id
+            except Exception as e:
+                logger.error(f"Не удалось передать задачу процессу анализа: {e}")
+                self._release(shm)
+                self.dispatch(lambda error=e: on_error(error))
+                return None
+
+    def cancel(self, job_id):
+        """Отмена задачи (процесс анализа останавливается после текущего окна)"""
+        if job_id is not None:
+            self._cancel_job_id.value = job_id
+
+    def set_language(self, language):
+        """Смена языка; применяется и к перезапущенному процессу
+
+        С разделяемыми весами сегмент нового языка создается загрузкой модели,
+        поэтому команда отправляется из фонового потока, а не из потока окна.
+        """
+        self.language = language
+        if self.shared_weights is None:
+            self._send_language(language, None)
+            return
+        threading.Thread(target=lambda: self._send_language(language, self._weights_handle(language)),
+                         daemon=True).start()
+
+    def _send_language(self, language, weights_handle):
+        with self._lock:
+            # Более поздняя смена языка уже отправлена или будет отправлена своим потоком
+            if language != self.language:
+                return
+            if self._process is not None and self._process.is_alive():
+                self._conn.send(('language', language, weights_handle))
+
+    def _weights_handle(self, language):
+        """Описание разделяемых весов модели языка (None - процесс загружает модель сам)"""
+        try:
+            return self.shared_weights.handle(language)
+        except Exception as e:
+            logger.error(f"Разделяемые веса недоступны, процесс анализа загрузит модель сам: {e}")
+            return None
+
+    def _ready_weights_handle(self, language):
+        """Описание уже размещенных весов без ожидания: запуск процесса идет в потоке окна"""
+        if self.shared_weights is None:
+            return None
+        weights_handle = self.shared_weights.ready_handle(language)
+        if weights_handle is None:
+            logger.info(f"Веса модели {language} еще не в разделяемой памяти, процесс анализа загрузит модель сам")
+        return weights_handle
+
+    def _read_loop(self, process, conn):
+        """Прием результатов; завершение процесса без ответа считается сбоем"""
+        while True:
+            ready = wait([conn, process.sentinel])
+            if conn in ready:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                self._complete(*message)
+            elif process.sentinel in ready:
+                break
+
+        process.join()
+        with self._lock:
+            # Задачи уже перезапущенного процесса не трогаем
+            pending = {job_id: job for job_id, job in self._pending.items() if job[0] is process}
+            for job_id in pending:
+                del self._pending[job_id]
+        if process.exitcode not in (0, None) or pending:
+            logger.error(f"Процесс анализа завершился с кодом {process.exitcode}")
+        for _, shm, _, on_error, _ in pending.values():
+            self._release(shm)
+            error = WorkerCrashed(f"Процесс анализа завершился с кодом {process.exitcode}")
+            self.dispatch(lambda on_error=on_error, error=error: on_error(error))
+
+    def _complete(self, status, job_id, payload):
+        with self._lock:
+            if status == 'partial':
+                job = self._pending.get(job_id)
+            else:
+                job = self._pending.pop(job_id, None)
+        if job is None:
+            return
+        _, shm, on_done, on_error, on_partial = job
+        if status == 'partial':
+            if on_partial is not None:
+                self.dispatch(lambda: on_partial(*payload))
+            return
+        self._release(shm)
+        if status == 'result':
+            self.dispatch(lambda: on_done(*payload))
+        else:
+            self.dispatch(lambda: on_error(RuntimeError(payload)))
+
+    @staticmethod
+    def _release(shm):
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Остановка процесса анализа"""
+        with self._lock:
+            process, conn = self._process, self._conn
+            self._process = None
+        if process is None:
+            return
+        try:
+            conn.send(('stop',))
+        except (OSError, ValueError):
+            pass
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+
+class FrameTimeStats:
+    """Статистика интервалов между кадрами анимации (задержки главного цикла Tk)"""
+
+    def __init__(self, interval_ms):
+        self.interval_ms = interval_ms
+        self.intervals = []
+        self._last = None
+
+    def reset(self):
+        self.intervals = []
+        self._last = None
+
+    def tick(self, now):
+        """Отметка очередного кадра (now - time.perf_counter())"""
+        if self._last is not None:
+            self.intervals.append((now - self._last) * 1000)
+        self._last = now
+
+    def summary(self):
+        """Средний, p95 и максимальный интервал в мс и доля кадров, задержанных более чем вдвое"""
+        if not self.intervals:
+            return None
+        intervals = np.array(self.intervals)
+        return {
+            'frames': len(intervals),
+            'mean_ms': float(intervals.mean()),
+            'p95_ms': float(np.percentile(intervals, 95)),
+            'max_ms': float(intervals.max()),
+            'late_share': float((intervals > 2 * self.interval_ms).mean())
+        }
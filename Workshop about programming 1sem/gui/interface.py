@@ -1,15 +1,23 @@
 import customtkinter as ctk
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from PIL import Image, ImageSequence
 import threading
 import logging
+import time
 import os
 from tkinter import filedialog
 from audio.recorder import AudioRecorder
 from audio.audio_utils import AudioProcessor
 from model.predict import EmotionPredictor
+from model.model_loader import EmotionModelLoader
+from model.shared_weights import SharedModelWeights, SHARED_WEIGHTS_SUPPORTED
 from analysis.timeline import EmotionTimeline
+from analysis.scheduler import AnalysisScheduler
+from analysis.job import DEFAULT_WINDOW_SIZE, DEFAULT_STEP
+from analysis.results_store import ResultsStore
+from gui.analysis_worker import ThreadAnalysisBackend, ProcessAnalysisBackend, FrameTimeStats
 
 logger = logging.getLogger(__name__)
 
@@ -25,12 +33,48 @@ class VoiceAnalyzeGUI:
         'disgust': 'Отвращение'
     }
     
-    def __init__(self):
+    # Подписи состояний задач в панели очереди
+    JOB_STATUS_TEXT = {
+        'queued': 'в очереди',
+        'decoding': 'чтение файла',
+        'running': 'анализ',
+        'done': 'готово',
+        'cancelled': 'отменено',
+        'failed': 'ошибка'
+    }
+    QUEUE_PANEL_ROWS = 5
+    # Варианты размера окна и шага анализа в меню, секунды
+    WINDOW_SIZE_OPTIONS = ["1.0", "2.0", "3.0", "4.0"]
+    STEP_OPTIONS = ["0.25", "0.5", "1.0", "2.0"]
+    
+    def __init__(self, cascade_threshold=None, analysis_backend="process", mmap_weights=False,
+                 max_concurrent_jobs=1, window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP,
+                 predictor=None, recorder=None, shared_weights=False):
+        """
+        Args:
+            cascade_threshold (float): Порог каскадного режима (см. EmotionPredictor)
+            analysis_backend (str): 'thread' - анализ в потоке процесса GUI,
+                'process' - в отдельном процессе, не мешающем главному циклу Tk
+            mmap_weights (bool): Загружать веса через отображение в память (для процесса анализа)
+            max_concurrent_jobs (int): Сколько задач очереди анализируется одновременно
+            window_size, step: Начальные размер окна и шаг анализа, секунды
+            predictor: Готовый предиктор для анализа в потоке (по умолчанию EmotionPredictor)
+            recorder: Готовый AudioRecorder (по умолчанию - первое устройство ввода)
+            shared_weights (bool): Процессы анализа используют одну копию весов в разделяемой памяти
+        """
         # Базовые компоненты
-        self.recorder = AudioRecorder()
+        self.recorder = recorder or AudioRecorder()
         self.processor = AudioProcessor()
-        self.predictor = EmotionPredictor()
         self.timeline = EmotionTimeline()
+        self.frame_stats = FrameTimeStats(50)
+        
+        # Состояние анализа: задача, результаты которой показаны на экране
+        self.followed_job = None
+        self.queue_rows = {}
+        self.results_canvas = None
+        self.results_text = None
+        self.progress_label = None
+        self.cancel_button = None
         
         # Состояние приложения
         self.is_recording = False
@@ -40,6 +84,7 @@ class VoiceAnalyzeGUI:
         self.selected_language = "English"
         self.animation_running = True  # Флаг для контроля анимации
         self.animation_widgets = {'wave_label': None, 'animation_label': None}  # Отслеживание виджетов
+        self.image_labels = []  # Метки с общими CTkImage текущего экрана
         
         # Настройка окна
         self.window = ctk.CTk()
@@ -48,20 +93,44 @@ class VoiceAnalyzeGUI:
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         
+        # Очередь анализа владеет бэкендами; колбэки возвращаются в главный поток через after
+        dispatch = lambda callback: self.window.after(0, callback)
+        self.shared_weights = None
+        if analysis_backend == "process":
+            self.predictor = None
+            if shared_weights and not SHARED_WEIGHTS_SUPPORTED:
+                logger.error("Разделяемые веса модели поддерживаются только в Linux, "
+                             "процессы анализа загрузят модель сами")
+            elif shared_weights:
+                self.shared_weights = SharedModelWeights(EmotionModelLoader.shared())
+                # Веса размещаются в фоне, чтобы первый запуск анализа не ждал загрузки модели в окне
+                threading.Thread(target=self.preload_shared_weights, args=(self.selected_language,),
+                                 daemon=True).start()
+            backend_factory = lambda language: ProcessAnalysisBackend(
+                dispatch, cascade_threshold=cascade_threshold,
+                mmap_weights=mmap_weights, language=language, shared_weights=self.shared_weights
+            )
+        else:
+            self.predictor = predictor or EmotionPredictor(cascade_threshold=cascade_threshold)
+            backend_factory = lambda language: ThreadAnalysisBackend(self.predictor, dispatch, language=language)
+        self.scheduler = AnalysisScheduler(
+            backend_factory, dispatch,
+            max_concurrent=max_concurrent_jobs,
+            language=self.selected_language,
+            aggregator_factory=self.timeline.create_aggregator,
+            window_size=window_size,
+            step=step
+        )
+        self.scheduler.add_listener(self.on_scheduler_event)
+        
+        # Результаты завершенных задач дописываются в хранилище фоновым потоком
+        self.results_store = ResultsStore()
+        self.scheduler.add_listener(self.store_job_results)
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Загрузка ресурсов
         self.load_resources()
         
-        # Инициализация matplotlib
-        plt.style.use('dark_background')
-        self.fig, self.ax = plt.subplots(figsize=(12, 8))
-        self.fig.patch.set_facecolor('#2b2b2b')
-        self.ax.set_facecolor('#2b2b2b')
-        self.ax.tick_params(colors='white')
-        self.ax.xaxis.label.set_color('white')
-        self.ax.yaxis.label.set_color('white')
-        self.ax.title.set_color('white')
-        self.ax.grid(True, color='gray', alpha=0.3)
-        
         # Создание интерфейса (включая начальный экран)
         self.setup_ui()
     
@@ -127,22 +196,56 @@ class VoiceAnalyzeGUI:
         self.language_menu.pack(side="right", padx=10)
         self.language_menu.set(self.selected_language)
         
+        # Параметры окон: смена пересчитывает показанный файл, готовые окна не анализируются повторно
+        self.step_menu = self.create_window_option_menu(self.STEP_OPTIONS, self.scheduler.step)
+        ctk.CTkLabel(self.top_panel, text="Шаг, с").pack(side="right", padx=(10, 5))
+        self.window_size_menu = self.create_window_option_menu(self.WINDOW_SIZE_OPTIONS, self.scheduler.window_size)
+        ctk.CTkLabel(self.top_panel, text="Окно, с").pack(side="right", padx=(10, 5))
+        
         # Контейнер для контента (меняется в зависимости от состояния)
         self.content_container = ctk.CTkFrame(self.main_container, fg_color="transparent")
         self.content_container.pack(fill="both", expand=True)
         
+        # Панель очереди анализа (показывается, когда есть задачи)
+        self.queue_panel = ctk.CTkFrame(self.main_container)
+        
         # Инициализация matplotlib
         self.setup_plot()
         
         # Показываем приветственный экран
         self.show_welcome_screen()
         
+    def create_window_option_menu(self, options, value):
+        """Меню параметра окон с текущим значением (добавляется, если его нет среди вариантов)"""
+        values = list(options)
+        current = f"{value:g}"
+        if all(float(option) != value for option in values):
+            values = sorted(values + [current], key=float)
+        else:
+            current = next(option for option in values if float(option) == value)
+        menu = ctk.CTkOptionMenu(
+            self.top_panel,
+            values=values,
+            command=self.change_window_settings,
+            width=80,
+            height=35
+        )
+        menu.pack(side="right")
+        menu.set(current)
+        return menu
+        
     def setup_plot(self):
-        """Инициализация графика"""
+        """Инициализация графика
+
+        Фигура, холст и изображение легенды создаются один раз на всю сессию: экраны
+        результатов только перерисовывают оси. Фигура создается без pyplot, поэтому
+        не попадает в его глобальный список фигур.
+        """
         plt.style.use('dark_background')
         
         # Создаем фигуру и оси
-        self.fig, self.ax = plt.subplots(figsize=(6, 3))
+        self.fig = Figure(figsize=(6, 3))
+        self.ax = self.fig.add_subplot(111)
         self.fig.patch.set_facecolor('#2b2b2b')
         self.ax.set_facecolor('#2b2b2b')
         
@@ -156,7 +259,35 @@ class VoiceAnalyzeGUI:
         # Добавляем отступы
         self.fig.tight_layout(pad=1.5)
         
-        # Canvas будет создаваться в show_results_screen
+        # Рамка с холстом создается при первом показе результатов
+        self.plot_frame = None
+        self.plot_canvas = None
+        self.legend_image = None
+    
+    def get_plot_frame(self):
+        """Рамка с холстом графика; между экранами она скрывается, а не уничтожается
+
+        Каждый новый FigureCanvasTkAgg добавляет обработчики к окну верхнего уровня,
+        поэтому холст на каждый результат привел бы к росту памяти в долгой сессии.
+        """
+        if self.plot_frame is None:
+            self.plot_frame = ctk.CTkFrame(self.content_container, fg_color="transparent")
+            self.plot_canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
+            self.plot_canvas.get_tk_widget().pack(fill="both", expand=True)
+        return self.plot_frame
+    
+    def get_legend_image(self):
+        """Изображение легенды (строится один раз)"""
+        if self.legend_image is None:
+            legend_buf = self.timeline.get_legend_figure()
+            try:
+                with Image.open(legend_buf) as legend_img:
+                    legend_img_resized = legend_img.resize((350, 400), Image.LANCZOS)
+            finally:
+                legend_buf.close()
+            self.legend_image = ctk.CTkImage(light_image=legend_img_resized, dark_image=legend_img_resized,
+                                             size=(350, 400))
+        return self.legend_image
     
     def show_wave_animation(self, label_name='wave_label', interval=50):
         """Показать анимацию звуковой волны
@@ -182,6 +313,7 @@ class VoiceAnalyzeGUI:
             
         try:
             # Обновляем кадр
+            self.frame_stats.tick(time.perf_counter())
             label.configure(image=self.gif_frames[self.current_frame])
             self.current_frame = (self.current_frame + 1) % len(self.gif_frames)
             
@@ -212,7 +344,8 @@ class VoiceAnalyzeGUI:
             self.file_button.configure(state="disabled")
             self.language_menu.configure(state="disabled")
             
-            # Показываем экран записи
+            # Файлы в очереди продолжают анализироваться, экран занимает запись
+            self.followed_job = None
             self.show_recording_screen()
             
             # Запускаем запись в отдельном потоке
@@ -223,28 +356,17 @@ class VoiceAnalyzeGUI:
             # Остановка записи
             self.is_recording = False
             self.record_button.configure(text="Начать запись")
-            
-            # Блокируем все кнопки на время анализа
-            self.set_buttons_state("disabled")
-            
-            # Показываем экран анализа
-            self.show_analysis_screen()
+            self.set_buttons_state("normal")
             
             # Останавливаем запись и получаем данные
             audio_data, sample_rate = self.recorder.stop_recording()
             
             if audio_data is not None:
-                # Запускаем обработку в отдельном потоке
-                thread = threading.Thread(
-                    target=self.process_audio,
-                    args=(audio_data, sample_rate)
-                )
-                thread.daemon = True
-                thread.start()
+                # Запись обгоняет файлы в очереди
+                self.process_audio(audio_data, sample_rate)
             else:
                 # Возвращаемся к начальному экрану
                 self.show_welcome_screen()
-                self.set_buttons_state("normal")
     
     def record_audio(self):
         """Запись аудио"""
@@ -259,83 +381,167 @@ class VoiceAnalyzeGUI:
             self.show_welcome_screen()
             
     def load_audio_file(self):
-        """Загрузка аудио файла"""
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Audio Files", "*.wav *.mp3")]
+        """Загрузка аудио файлов (можно выбрать несколько) в очередь анализа"""
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("Audio Files", "*.wav *.mp3 *.flac *.ogg")]
         )
-        if file_path:
-            # Блокируем все кнопки на время анализа
-            self.set_buttons_state("disabled")
-            
-            # Показываем экран анализа с анимацией
-            self.clear_content()
-            
-            # Контейнер для центрирования
-            center_frame = ctk.CTkFrame(self.content_container, fg_color="transparent")
-            center_frame.pack(expand=True)
-            
-            # Анимация
-            animation_label = ctk.CTkLabel(
-                center_frame,
-                text="",
-                image=self.gif_frames[0]
-            )
-            animation_label.pack(expand=True, pady=(0, 20))
-            
-            # Сохраняем ссылку на виджет
-            self.animation_widgets['animation_label'] = animation_label
-            
-            # Текст анализа
-            analysis_text = ctk.CTkLabel(
-                center_frame,
-                text="Пожалуйста, подождите\nАудио анализируется...",
-                font=("Arial", 30)
-            )
-            analysis_text.pack(pady=(0, 40))
-            
-            # Запускаем анимацию
-            self.animation_running = True
-            self.is_animating = True
-            self.show_wave_animation('animation_label', 50)
+        jobs = []
+        for file_path in file_paths:
+            try:
+                jobs.append(self.scheduler.submit_file(file_path))
+            except OSError as e:
+                logger.error(f"Не удалось добавить файл {file_path} в очередь: {e}")
+        
+        # Экран переключается на первый файл, если сейчас ничего не анализируется
+        if jobs and (self.followed_job is None or not self.followed_job.active):
+            self.follow_job(jobs[0])
             
-            # Запускаем обработку в отдельном потоке
-            thread = threading.Thread(
-                target=self.process_audio_file,
-                args=(file_path,)
+    def process_audio(self, audio_data, sample_rate):
+        """Постановка записи в очередь анализа и отображение ее результатов"""
+        self.follow_job(self.scheduler.submit_audio(audio_data, sample_rate))
+    
+    def follow_job(self, job):
+        """Показ задачи очереди: экран анализа, частичные или готовые результаты"""
+        if self.is_recording:
+            return
+        self.followed_job = job
+        self.frame_stats.reset()
+        if not job.active:
+            self.on_analysis_done(job)
+        elif job.timeline:
+            self.show_results_screen(job.timeline, in_progress=True, aggregator=job.aggregator)
+        else:
+            self.show_analysis_screen(f"Пожалуйста, подождите\n{job.label} анализируется...")
+    
+    def on_scheduler_event(self, event, job, payload):
+        """События очереди анализа (вызываются в главном потоке)"""
+        self.update_queue_panel(job)
+        if job is not self.followed_job or self.is_recording:
+            return
+        if event == 'partial':
+            self.on_analysis_partial(job)
+        elif event == 'finished':
+            self.on_analysis_done(job)
+        elif event == 'update':
+            self.update_progress_label()
+    
+    def update_queue_panel(self, job):
+        """Строка задачи в панели очереди: состояние, прогресс, открыть и отменить"""
+        if not self.queue_panel.winfo_ismapped():
+            self.queue_panel.pack(side="bottom", fill="x", pady=(20, 0), before=self.content_container)
+        
+        row = self.queue_rows.get(job.job_id)
+        if row is None:
+            frame = ctk.CTkFrame(self.queue_panel, fg_color="transparent")
+            frame.pack(fill="x", padx=10, pady=2)
+            name_label = ctk.CTkLabel(frame, text=f"#{job.job_id} {job.label}", width=300, anchor="w")
+            name_label.pack(side="left")
+            progress_bar = ctk.CTkProgressBar(frame, width=300)
+            progress_bar.pack(side="left", padx=10)
+            status_label = ctk.CTkLabel(frame, text="", width=120, anchor="w")
+            status_label.pack(side="left")
+            cancel_button = ctk.CTkButton(frame, text="Отменить", width=90,
+                                          command=lambda: self.scheduler.cancel(job))
+            cancel_button.pack(side="right", padx=5)
+            ctk.CTkButton(frame, text="Открыть", width=90,
+                          command=lambda: self.follow_job(job)).pack(side="right", padx=5)
+            row = {'frame': frame, 'progress': progress_bar, 'status': status_label, 'cancel': cancel_button,
+                   'job': job}
+            self.queue_rows[job.job_id] = row
+            
+            # Старые завершенные задачи убираем из панели (очередь их тоже со временем забывает)
+            finished = [job_id for job_id, queue_row in self.queue_rows.items()
+                        if not queue_row['job'].active]
+            while len(self.queue_rows) > self.QUEUE_PANEL_ROWS and finished:
+                self.queue_rows.pop(finished.pop(0))['frame'].destroy()
+        
+        row['progress'].set(job.progress)
+        status = self.JOB_STATUS_TEXT.get(job.status, job.status)
+        if job.status == 'running' and job.total:
+            status = f"{status} {job.processed}/{job.total}"
+        row['status'].configure(text=status)
+        row['cancel'].configure(state="normal" if job.active else "disabled")
+    
+    def store_job_results(self, event, job, payload):
+        """Сохранение шкалы завершенной задачи в хранилище результатов"""
+        if event == 'finished' and job.status == 'done':
+            self.results_store.append(job.timeline, job.file_path or job.label, job.language)
+    
+    def add_cancel_button(self, parent):
+        """Кнопка отмены текущего анализа"""
+        self.cancel_button = ctk.CTkButton(
+            parent,
+            text="Отменить анализ",
+            command=self.cancel_analysis,
+            width=200
+        )
+        self.cancel_button.pack(pady=(0, 20))
+    
+    def cancel_analysis(self):
+        """Отмена анализа: показываются уже полученные результаты"""
+        if self.cancel_button is not None and self.cancel_button.winfo_exists():
+            self.cancel_button.configure(text="Отмена...", state="disabled")
+        if self.followed_job is not None:
+            self.scheduler.cancel(self.followed_job)
+    
+    def on_analysis_partial(self, job):
+        """Новая порция точек шкалы отслеживаемой задачи"""
+        if self.results_canvas is None:
+            self.show_results_screen(job.timeline, in_progress=True, aggregator=job.aggregator)
+        else:
+            self.update_results(job.timeline, job.aggregator)
+    
+    def log_frame_stats(self):
+        """Запись статистики кадров анимации за время анализа"""
+        stats = self.frame_stats.summary()
+        if stats:
+            logger.info(
+                "Кадры анимации во время анализа: %d, средний интервал %.1f мс, p95 %.1f мс, "
+                "максимум %.1f мс, задержано вдвое %.1f%%",
+                stats['frames'], stats['mean_ms'], stats['p95_ms'], stats['max_ms'],
+                stats['late_share'] * 100
             )
-            thread.daemon = True
-            thread.start()
     
-    def process_audio_file(self, file_path):
-        """Обработка загруженного файла"""
-        try:
-            audio_data, sample_rate = self.processor.load_audio(file_path)
-            self.process_audio(audio_data, sample_rate)
-        except Exception as e:
-            print(f"Ошибка при обработке файла: {e}")
-            
-    def process_audio(self, audio_data, sample_rate):
-        """Обработка аудио и отображение результатов"""
-        try:
-            # Получаем временную шкалу эмоций
-            timeline_data = self.predictor.get_emotion_timeline(audio_data, sample_rate)
-            
-            # Показываем результаты в главном потоке
-            self.window.after(0, lambda: self.show_results_screen(timeline_data))
-                
-        except Exception as e:
-            logger.error(f"Ошибка при анализе: {e}")
-            self.window.after(0, lambda: self.show_welcome_screen())
+    def on_analysis_done(self, job):
+        """Завершение отслеживаемой задачи: результаты, отмена или ошибка"""
+        self.log_frame_stats()
+        self.frame_stats.reset()
+        if job.status == 'failed':
+            self.on_analysis_error(job.error)
+            return
+        cancelled = job.status == 'cancelled'
+        if cancelled and not job.timeline:
+            self.stop_animation()
+            self.set_buttons_state("normal")
+            self.show_welcome_screen()
+            return
+        self.show_results_screen(job.timeline, cancelled=cancelled, aggregator=job.aggregator)
     
-    def format_results(self, timeline_data):
-        """Форматирование результатов анализа временной шкалы"""
-        if not timeline_data:
+    def on_analysis_error(self, error):
+        """Ошибка анализа или сбой процесса анализа (вызывается в главном потоке)"""
+        logger.error(f"Ошибка при анализе: {error}")
+        self.stop_animation()
+        self.set_buttons_state("normal")
+        self.show_error(f"Ошибка при анализе:\n{error}")
+    
+    def format_results(self, timeline_data, aggregator=None):
+        """Форматирование результатов анализа временной шкалы
+
+        Args:
+            aggregator: EmotionAggregator, накопленный во время анализа; если не передан,
+                статистика считается по timeline_data
+        """
+        if aggregator is None:
+            if not timeline_data:
+                return "Нет данных для анализа"
+            aggregator = self.timeline.aggregate(timeline_data)
+        if aggregator.count == 0:
             return "Нет данных для анализа"
             
         translations = self.EMOTION_TRANSLATIONS
         
-        # Получаем результаты анализа от timeline
-        _, emotion_averages = self.timeline.plot_timeline(timeline_data, self.ax)
+        # Средние сглаженные значения эмоций
+        emotion_averages = aggregator.averages()
         
         # Сортируем эмоции по убыванию средних значений
         sorted_emotions = sorted(emotion_averages.items(), key=lambda x: x[1], reverse=True)
@@ -366,6 +572,8 @@ class VoiceAnalyzeGUI:
                 text += f"Также присутствуют: {', '.join(secondary_emotions)}"
         else:
             text += "В записи не обнаружено явно выраженных эмоций"
+        
+        text += "\n" + self.timeline.format_dominant_durations(aggregator)
             
         return text
     
@@ -427,7 +635,7 @@ class VoiceAnalyzeGUI:
         logo_frame = ctk.CTkFrame(welcome_frame, fg_color="transparent")
         logo_frame.pack(side="left", fill="both", expand=True)
         
-        logo_label = ctk.CTkLabel(logo_frame, text="", image=self.logo_image)
+        logo_label = self.create_image_label(logo_frame, self.logo_image)
         logo_label.pack(expand=True)
         
         # Правая часть с текстом (25%)
@@ -460,11 +668,7 @@ class VoiceAnalyzeGUI:
         center_frame.pack(expand=True)
         
         # Анимация волны (большая, в центре)
-        wave_label = ctk.CTkLabel(
-            center_frame,
-            text="",
-            image=self.gif_frames[0]
-        )
+        wave_label = self.create_image_label(center_frame, self.gif_frames[0])
         wave_label.pack(expand=True, pady=(0, 20))
         
         # Сохраняем ссылку на виджет
@@ -483,7 +687,7 @@ class VoiceAnalyzeGUI:
         self.is_animating = True
         self.show_wave_animation('wave_label', 50)
         
-    def show_analysis_screen(self):
+    def show_analysis_screen(self, text="Пожалуйста, подождите\nЗапись анализируется..."):
         """Отображение экрана анализа"""
         self.clear_content()
         
@@ -492,11 +696,7 @@ class VoiceAnalyzeGUI:
         center_frame.pack(expand=True)
         
         # Анимация волны (большая, в центре)
-        animation_label = ctk.CTkLabel(
-            center_frame,
-            text="",
-            image=self.gif_frames[0]
-        )
+        animation_label = self.create_image_label(center_frame, self.gif_frames[0])
         animation_label.pack(expand=True, pady=(0, 20))
         
         # Сохраняем ссылку на виджет
@@ -505,35 +705,40 @@ class VoiceAnalyzeGUI:
         # Текст анализа (внизу)
         self.analysis_text = ctk.CTkLabel(
             center_frame,
-            text="Пожалуйста, подождите\nЗапись анализируется...",
+            text=text,
             font=("Arial", 30)
         )
-        self.analysis_text.pack(pady=(0, 40))
+        self.analysis_text.pack(pady=(0, 20))
+        self.add_cancel_button(center_frame)
         
         # Запуск анимации
         self.animation_running = True
         self.is_animating = True
         self.show_wave_animation('animation_label', 50)
         
-    def show_results_screen(self, timeline_data):
-        """Отображение экрана результатов"""
+    def show_results_screen(self, timeline_data, in_progress=False, cancelled=False, aggregator=None):
+        """Отображение экрана результатов
+
+        Args:
+            in_progress (bool): Анализ еще идет - показываются прогресс и кнопка отмены,
+                а график дополняется через update_results
+            cancelled (bool): Анализ отменен - результаты неполные
+            aggregator: Потоковая статистика задачи для текстового анализа
+        """
         self.clear_content()
         
         try:
             # Левая часть с графиком (75%)
-            graph_frame = ctk.CTkFrame(self.content_container, fg_color="transparent")
+            graph_frame = self.get_plot_frame()
             graph_frame.pack(side="left", fill="both", expand=True, padx=(0, 20))
             
             # Очищаем график
             self.ax.clear()
             
-            # Отрисовка графика (без легенды)
+            # Отрисовка графика (без легенды) на общем холсте
             figure, _ = self.timeline.plot_timeline(timeline_data, self.ax)
-            
-            # Создаем новый canvas для графика
-            canvas = FigureCanvasTkAgg(self.fig, master=graph_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill="both", expand=True)
+            self.plot_canvas.draw_idle()
+            self.results_canvas = self.plot_canvas
             
             # Правая часть с легендой и текстом (25%)
             text_frame = ctk.CTkFrame(self.content_container, fg_color="transparent", width=500)
@@ -541,22 +746,8 @@ class VoiceAnalyzeGUI:
             text_frame.pack_propagate(False)
             
             # --- Легенда ---
-            try:
-                legend_buf = self.timeline.get_legend_figure()
-                legend_img = Image.open(legend_buf)
-                legend_img_resized = legend_img.copy()
-                legend_img_resized = legend_img_resized.resize((350, 400), Image.LANCZOS)
-                legend_ctk = ctk.CTkImage(light_image=legend_img_resized, dark_image=legend_img_resized, size=(350, 400))
-                legend_label = ctk.CTkLabel(text_frame, image=legend_ctk, text="")
-                legend_label.pack(pady=(10, 5), anchor="n")
-            finally:
-                # Закрываем ресурсы
-                if 'legend_buf' in locals():
-                    legend_buf.close()
-                if 'legend_img' in locals():
-                    legend_img.close()
-                if 'legend_img_resized' in locals() and legend_img_resized != legend_img:
-                    legend_img_resized.close()
+            legend_label = self.create_image_label(text_frame, self.get_legend_image())
+            legend_label.pack(pady=(10, 5), anchor="n")
             
             # --- Текстовый анализ ---
             text_widget = ctk.CTkTextbox(
@@ -566,12 +757,26 @@ class VoiceAnalyzeGUI:
                 height=333
             )
             text_widget.pack(fill="x", expand=False, padx=10, pady=(0, 10), side="bottom")
-            results_text = self.format_results(timeline_data)
-            text_widget.insert("1.0", results_text)
-            text_widget.configure(state="disabled")
+            self.results_text = text_widget
+            self.set_results_text(timeline_data, aggregator)
+            
+            # Прогресс и отмена, пока анализ продолжается
+            if in_progress:
+                self.progress_label = ctk.CTkLabel(text_frame, text="", font=("Arial", 14))
+                self.progress_label.pack(pady=(5, 5))
+                self.update_progress_label()
+                self.add_cancel_button(text_frame)
+            elif cancelled:
+                ctk.CTkLabel(
+                    text_frame,
+                    text="Анализ отменен, показаны неполные результаты",
+                    font=("Arial", 14),
+                    text_color="orange"
+                ).pack(pady=(5, 5))
             
             # Разблокируем все кнопки после отображения результатов
-            self.set_buttons_state("normal")
+            if not in_progress:
+                self.set_buttons_state("normal")
             
         except Exception as e:
             logger.error(f"Ошибка при отображении результатов: {str(e)}")
@@ -579,13 +784,62 @@ class VoiceAnalyzeGUI:
             # Разблокируем кнопки в случае ошибки
             self.set_buttons_state("normal")
     
+    def set_results_text(self, timeline_data, aggregator=None):
+        """Текстовый анализ на экране результатов"""
+        self.results_text.configure(state="normal")
+        self.results_text.delete("1.0", "end")
+        self.results_text.insert("1.0", self.format_results(timeline_data, aggregator))
+        self.results_text.configure(state="disabled")
+    
+    def update_progress_label(self):
+        job = self.followed_job
+        if self.progress_label is not None and job is not None and job.total:
+            self.progress_label.configure(text=f"Анализ продолжается: {job.processed} из {job.total} окон")
+    
+    def update_results(self, timeline_data, aggregator=None):
+        """Дополнение открытого экрана результатов новыми точками"""
+        try:
+            self.timeline.plot_timeline(timeline_data, self.ax)
+            self.results_canvas.draw_idle()
+            self.set_results_text(timeline_data, aggregator)
+            self.update_progress_label()
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении результатов: {e}")
+    
+    def create_image_label(self, parent, image):
+        """Метка с изображением, общим для всех экранов (логотип, кадры анимации, легенда)"""
+        label = ctk.CTkLabel(parent, text="", image=image)
+        self.image_labels.append(label)
+        return label
+    
+    def release_image_labels(self):
+        """Отвязка общих изображений от меток экрана перед их уничтожением
+
+        CTkLabel.destroy не снимает колбэк, который метка регистрирует в CTkImage, поэтому
+        общее изображение держало бы ссылки на все когда-либо показанные метки.
+        """
+        for label in self.image_labels:
+            try:
+                label.configure(image=None)
+            except Exception as e:
+                logger.error(f"Ошибка при освобождении изображения: {e}")
+        self.image_labels = []
+    
     def clear_content(self):
         """Очистка контейнера с контентом"""
         # Останавливаем анимацию перед уничтожением виджетов
         self.stop_animation()
+        self.release_image_labels()
+        self.results_canvas = None
+        self.results_text = None
+        self.progress_label = None
+        self.cancel_button = None
         
-        # Очищаем все виджеты
+        # Очищаем все виджеты; рамка графика только скрывается
         for widget in self.content_container.winfo_children():
+            if widget is self.plot_frame:
+                widget.pack_forget()
+                continue
             try:
                 widget.destroy()
             except Exception as e:
@@ -597,12 +851,56 @@ class VoiceAnalyzeGUI:
     def change_language(self, language):
         """Смена языка"""
         self.selected_language = language
-        self.predictor.update_model_for_language(language)
+        self.scheduler.set_language(language)
+        
+    def change_window_settings(self, _value=None):
+        """Смена размера окна или шага; показанный файл или запись анализируется заново с новой сеткой"""
+        try:
+            self.scheduler.set_window_params(float(self.window_size_menu.get()), float(self.step_menu.get()))
+        except ValueError as e:
+            self.show_error(f"Некорректные параметры анализа:\n{e}")
+            return
+        job = self.followed_job
+        if job is not None and not job.active and job.status == "done":
+            new_job = self.scheduler.resubmit(job)
+            if new_job is not None:
+                self.follow_job(new_job)
+            else:
+                self.show_notice("Запись уже не хранится в памяти: новые параметры применятся "
+                                 "к следующим записям и файлам")
         
     def run(self):
         """Запуск приложения"""
         self.window.mainloop()
     
+    def preload_shared_weights(self, language):
+        try:
+            self.shared_weights.handle(language)
+        except Exception as e:
+            logger.error(f"Ошибка при размещении весов в разделяемой памяти: {e}")
+    
+    def on_close(self):
+        """Закрытие окна с остановкой процесса анализа"""
+        self.stop_animation()
+        self.scheduler.close()
+        if self.shared_weights is not None:
+            self.shared_weights.close()
+        self.results_store.close()
+        self.window.destroy()
+    
+    def show_notice(self, message):
+        """Сообщение на экране результатов без его очистки"""
+        if self.results_text is None:
+            self.show_error(message)
+            return
+        ctk.CTkLabel(
+            self.results_text.master,
+            text=message,
+            font=("Arial", 14),
+            wraplength=450,
+            text_color="orange"
+        ).pack(pady=(5, 5))
+
     def show_error(self, message):
         """Показать сообщение об ошибке"""
         # Очищаем контент
@@ -627,6 +925,9 @@ class VoiceAnalyzeGUI:
         # Очищаем ссылки на виджеты анимации
         self.animation_widgets = {'wave_label': None, 'animation_label': None}
 
-def launch_gui():
-    app = VoiceAnalyzeGUI()
+def launch_gui(cascade_threshold=None, analysis_backend="process", mmap_weights=False, max_concurrent_jobs=1,
+               window_size=DEFAULT_WINDOW_SIZE, step=DEFAULT_STEP, shared_weights=False):
+    app = VoiceAnalyzeGUI(cascade_threshold=cascade_threshold, analysis_backend=analysis_backend,
+                          mmap_weights=mmap_weights, max_concurrent_jobs=max_concurrent_jobs,
+                          window_size=window_size, step=step, shared_weights=shared_weights)
     app.run()
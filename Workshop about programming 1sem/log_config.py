@@ -0,0 +1,110 @@
+import sys
+import atexit
+import queue
+import logging
+import logging.handlers
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = 'voice_analyze.log'
+
+# Ротация лог-файла по размеру
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+LOG_MODES = ("sync", "async")
+
+_listener = None
+_hot_path_sample_every = 1
+
+
+def setup_logging(mode="async", level=logging.DEBUG, log_file=LOG_FILE,
+                  max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT,
+                  sample_every=1):
+    """Настройка логирования приложения
+
+    Args:
+        mode (str): 'sync' - запись в файл в вызывающем потоке,
+            'async' - запись в файл через фоновый QueueListener (сообщение
+            подставляется в вызывающем потоке)
+        level (int): Уровень логирования корневого логгера
+        log_file (str): Путь к лог-файлу (ротируется по размеру)
+        max_bytes (int): Максимальный размер лог-файла до ротации
+        backup_count (int): Количество хранимых старых лог-файлов
+        sample_every (int): Логировать только каждую N-ю отладочную запись горячего пути
+    """
+    global _listener
+
+    if mode not in LOG_MODES:
+        raise ValueError(f"Неизвестный режим логирования: {mode}")
+
+    shutdown_logging()
+    set_hot_path_sample_rate(sample_every)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    stream_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+
+    if mode == "async":
+        # Вызывающий поток подставляет аргументы в сообщение (QueueHandler.prepare) и кладет
+        # запись в очередь; формат строки лога и запись применяются в потоке слушателя
+        log_queue = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(
+            log_queue, file_handler, stream_handler, respect_handler_level=True
+        )
+        _listener.start()
+    else:
+        root.addHandler(file_handler)
+        root.addHandler(stream_handler)
+
+    return _listener
+
+
+@atexit.register
+def shutdown_logging():
+    """Остановка фонового слушателя с записью оставшихся сообщений"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def set_hot_path_sample_rate(sample_every):
+    """Установка частоты выборки отладочных логов горячего пути"""
+    global _hot_path_sample_every
+    _hot_path_sample_every = max(1, int(sample_every))
+
+
+class HotPathLog:
+    """Дешевая проверка перед отладочным логированием на горячем пути
+
+    Пример:
+        hot_log = HotPathLog(logger)
+        if hot_log.enabled():
+            logger.debug("Данные: %s", data)
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._counter = 0
+
+    def enabled(self):
+        """Нужно ли логировать текущее событие (уровень DEBUG и выборка)"""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return False
+        if _hot_path_sample_every == 1:
+            return True
+        self._counter += 1
+        return self._counter % _hot_path_sample_every == 0
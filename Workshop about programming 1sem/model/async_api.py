@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from .predict import EmotionPredictor
+from audio.audio_utils import AudioProcessor, DEFAULT_RESAMPLE_QUALITY
+from analysis.job import TimelineJob, DEFAULT_WINDOW_SIZE, DEFAULT_STEP
+
+logger = logging.getLogger(__name__)
+
+# Потоков декодирования аудиофайлов (чтение и ресэмплинг в основном вне GIL)
+DEFAULT_DECODE_WORKERS = 4
+# Одновременных вызовов модели: предиктор общий, а PyTorch сам распределяет потоки внутри вызова
+DEFAULT_INFERENCE_WORKERS = 1
+
+
+class AsyncEmotionPredictor:
+    """Асинхронные варианты загрузки аудио и предсказания эмоций для сервисов на asyncio
+
+    Блокирующие вызовы не выполняются в цикле событий: декодирование идет в пуле потоков,
+    инференс - в отдельном пуле с ограниченным числом потоков, поэтому лишние запросы ждут
+    своей очереди, не занимая модель. Отмена задачи asyncio, ожидающей результат, снимает
+    еще не начатый вызов из очереди; расчет шкалы останавливается после текущего батча
+    (как TimelineJob.cancel). Уже начатый проход модели прервать нельзя.
+    """
+
+    def __init__(self, predictor=None, max_concurrent_inference=DEFAULT_INFERENCE_WORKERS,
+                 decode_workers=DEFAULT_DECODE_WORKERS):
+        """
+        Args:
+            predictor: EmotionPredictor (по умолчанию создается новый)
+            max_concurrent_inference (int): Сколько вызовов модели выполняется одновременно;
+                больше 1 - только если предиктор допускает параллельные вызовы
+            decode_workers (int): Потоков декодирования аудиофайлов
+        """
+        if max_concurrent_inference <= 0 or decode_workers <= 0:
+            raise ValueError("Число потоков инференса и декодирования должно быть положительным")
+        self.predictor = predictor or EmotionPredictor()
+        self._decode_executor = ThreadPoolExecutor(decode_workers, thread_name_prefix="audio-decode")
+        self._inference_executor = ThreadPoolExecutor(max_concurrent_inference,
+                                                      thread_name_prefix="emotion-inference")
+
+    async def _run_inference(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._inference_executor, functools.partial(func, *args, **kwargs))
+
+    async def initialize(self):
+        """Загрузка модели в потоке инференса"""
+        await self._run_inference(self.predictor.initialize)
+
+    async def update_model_for_language(self, language):
+        await self._run_inference(self.predictor.update_model_for_language, language)
+
+    async def load_audio(self, file_path, mono=True, quality=DEFAULT_RESAMPLE_QUALITY):
+        """Загрузка аудиофайла (AudioProcessor.load_audio) в пуле декодирования"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._decode_executor, functools.partial(AudioProcessor.load_audio, file_path, mono=mono, quality=quality)
+        )
+
+    async def predict_emotion(self, audio_data, sample_rate):
+        """Предсказание эмоций для одного окна (EmotionPredictor.predict_emotion)"""
+        return await self._run_inference(self.predictor.predict_emotion, audio_data, sample_rate)
+
+    async def iter_emotion_timeline(self, audio_data, sample_rate, window_size=DEFAULT_WINDOW_SIZE,
+                                    step=DEFAULT_STEP, checkpoint_dir=None):
+        """Асинхронный итератор точек временной шкалы по мере расчета батчей
+
+        Расчет выполняется как TimelineJob в пуле инференса. Если итератор закрыт до конца
+        (выход из async for, отмена задачи), расчет останавливается после текущего батча.
+
+        Yields:
+            dict: Точка шкалы {'time', 'emotions'}
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        job = TimelineJob(self.predictor, audio_data, sample_rate, window_size, step,
+                          first_windows=1, publish_interval=0, checkpoint_dir=checkpoint_dir)
+
+        def send(kind, value):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+            except RuntimeError:
+                # Цикл событий уже закрыт: результат некому передать
+                job.cancel()
+
+        def run():
+            if job.cancelled:
+                return
+            try:
+                _, cancelled = job.run(lambda points, processed, total: send('points', points))
+                send('done', cancelled)
+            except Exception as e:
+                send('error', e)
+
+        worker = loop.run_in_executor(self._inference_executor, run)
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == 'points':
+                    for point in value:
+                        yield point
+                elif kind == 'error':
+                    raise value
+                else:
+                    return
+        finally:
+            job.cancel()
+            # Задача, не успевшая начаться, снимается из очереди пула
+            worker.cancel()
+
+    async def get_emotion_timeline(self, audio_data, sample_rate, window_size=DEFAULT_WINDOW_SIZE,
+                                   step=DEFAULT_STEP):
+        """Временная шкала эмоций целиком (как EmotionPredictor.get_emotion_timeline)"""
+        try:
+            timeline = [point async for point in self.iter_emotion_timeline(audio_data, sample_rate,
+                                                                            window_size, step)]
+            logger.info(f"Временная шкала эмоций создана успешно: {len(timeline)} точек")
+            return timeline
+        except Exception as e:
+            logger.error(f"Ошибка при создании временной шкалы: {e}")
+            return []
+
+    def close(self, wait=True):
+        """Остановка пулов потоков; ожидающие в очереди вызовы отменяются"""
+        self._decode_executor.shutdown(wait=wait, cancel_futures=True)
+        self._inference_executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.close)
@@ -0,0 +1,162 @@
+import os
+import time
+import queue
+import itertools
+import logging
+import multiprocessing
+from datetime import datetime
+import numpy as np
+import torch
+
+from .backends import BACKENDS
+from .model_loader import EmotionModelLoader
+from .runtime_profile import apply_thread_settings, save_runtime_profile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16)
+
+def default_thread_options():
+    """Варианты количества intra-op потоков для текущей машины"""
+    cpu_count = os.cpu_count() or 1
+    options = {1, 2, 4, 8, 16, 32, 64, cpu_count, max(1, cpu_count // 2)}
+    return sorted(n for n in options if n <= cpu_count)
+
+def default_interop_options():
+    """Варианты количества inter-op потоков для текущей машины"""
+    cpu_count = os.cpu_count() or 1
+    return sorted(n for n in {1, 2, 4} if n <= cpu_count)
+
+def make_synthetic_windows(count, window_seconds=2.0, sample_rate=16000, seed=0):
+    """Синтетические окна аудио для замеров (шум с амплитудой речи)"""
+    rng = np.random.default_rng(seed)
+    windows = rng.standard_normal((count, int(window_seconds * sample_rate))).astype(np.float32)
+    windows *= 0.1
+    return list(windows)
+
+def measure_throughput(classifier, windows, batch_size, repeats=3):
+    """Пропускная способность классификатора в окнах в секунду (медиана повторов)"""
+    classifier(windows[:batch_size], batch_size=batch_size)  # Прогрев
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        classifier(windows, batch_size=batch_size)
+        timings.append(time.perf_counter() - start)
+    return len(windows) / float(np.median(timings))
+
+def benchmark_configurations(model_loader, inter_op_threads, thread_options=None,
+                             batch_sizes=DEFAULT_BATCH_SIZES, backends=BACKENDS,
+                             n_windows=32, window_seconds=2.0, repeats=3, exhaustive=False):
+    """Замеры конфигураций в текущем процессе для уже загруженной модели
+
+    По умолчанию параметры подбираются покоординатно (потоки, затем размер батча,
+    затем бэкенд), при exhaustive=True перебираются все сочетания.
+
+    Returns:
+        list: Результаты замеров для каждой проверенной конфигурации
+    """
+    thread_options = thread_options or default_thread_options()
+    windows = make_synthetic_windows(n_windows, window_seconds)
+    results = []
+
+    def run(threads, batch_size, backend):
+        torch.set_num_threads(threads)
+        classifier = model_loader.set_backend(backend)
+        windows_per_sec = measure_throughput(classifier, windows, batch_size, repeats)
+        result = {
+            'intra_op_threads': threads,
+            'inter_op_threads': inter_op_threads,
+            'batch_size': batch_size,
+            'backend': backend,
+            'windows_per_sec': windows_per_sec
+        }
+        logger.info("Автонастройка: потоки %d/%d, батч %d, бэкенд %s - %.2f окон/сек",
+                    threads, inter_op_threads, batch_size, backend, windows_per_sec)
+        results.append(result)
+        return result
+
+    if exhaustive:
+        for threads, batch_size, backend in itertools.product(thread_options, batch_sizes, backends):
+            run(threads, batch_size, backend)
+        return results
+
+    def best_of(candidates):
+        return max(candidates, key=lambda r: r['windows_per_sec'])
+
+    initial_batch = min(batch_sizes, key=lambda b: abs(b - 4))
+    best = best_of([run(t, initial_batch, backends[0]) for t in thread_options])
+    best = best_of([best] + [run(best['intra_op_threads'], b, backends[0])
+                             for b in batch_sizes if b != initial_batch])
+    best_of([best] + [run(best['intra_op_threads'], best['batch_size'], backend)
+                      for backend in backends if backend != backends[0]])
+    return results
+
+def _benchmark_worker(result_queue, models_dir, language, inter_op_threads, options):
+    """Замеры в отдельном процессе: inter-op потоки задаются до любой работы torch"""
+    try:
+        apply_thread_settings(inter_op_threads=inter_op_threads)
+        model_loader = EmotionModelLoader(models_dir)
+        if not model_loader.load_model(language):
+            raise RuntimeError(f"Не удалось загрузить модель для языка {language}")
+        result_queue.put(('ok', benchmark_configurations(model_loader, inter_op_threads, **options)))
+    except Exception as e:
+        result_queue.put(('error', str(e)))
+
+def autotune(models_dir=None, language="English", thread_options=None, interop_options=None,
+             batch_sizes=DEFAULT_BATCH_SIZES, backends=BACKENDS, n_windows=32,
+             window_seconds=2.0, repeats=3, exhaustive=False, save=True):
+    """Подбор лучшей конфигурации инференса на CPU для текущей машины
+
+    Количество inter-op потоков torch нельзя изменить после начала работы,
+    поэтому каждый вариант проверяется в отдельном процессе со своей загрузкой модели.
+
+    Returns:
+        tuple: (лучший профиль, список всех результатов)
+    """
+    models_dir = models_dir or os.path.join(os.getcwd(), 'models')
+    options = {
+        'thread_options': thread_options,
+        'batch_sizes': tuple(batch_sizes),
+        'backends': tuple(backends),
+        'n_windows': n_windows,
+        'window_seconds': window_seconds,
+        'repeats': repeats,
+        'exhaustive': exhaustive
+    }
+    context = multiprocessing.get_context('spawn')
+    all_results = []
+
+    for inter_op_threads in interop_options or default_interop_options():
+        result_queue = context.Queue()
+        process = context.Process(
+            target=_benchmark_worker,
+            args=(result_queue, models_dir, language, inter_op_threads, options)
+        )
+        process.start()
+        while True:
+            try:
+                status, payload = result_queue.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    status, payload = 'error', f"процесс завершился с кодом {process.exitcode}"
+                    break
+        process.join()
+        if status == 'ok':
+            for result in payload:
+                logger.info("Inter-op %(inter_op_threads)d, intra-op %(intra_op_threads)d, "
+                            "батч %(batch_size)d, %(backend)s: %(windows_per_sec).2f окон/сек", result)
+            all_results.extend(payload)
+        else:
+            logger.error(f"Ошибка при замерах с {inter_op_threads} inter-op потоками: {payload}")
+
+    if not all_results:
+        raise RuntimeError("Автонастройка не дала ни одного результата")
+
+    best = max(all_results, key=lambda r: r['windows_per_sec'])
+    profile = dict(best, window_seconds=window_seconds, language=language,
+                   tuned_at=datetime.now().isoformat(timespec='seconds'))
+    logger.info("Лучшая конфигурация: %s", profile)
+    if save:
+        save_runtime_profile(models_dir, profile)
+    return profile, all_results
@@ -0,0 +1,90 @@
+import numpy as np
+import torch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pipeline - стандартный pipeline transformers, direct - прямой вызов модели без pipeline
+BACKENDS = ("pipeline", "direct")
+
+class DirectAudioClassifier:
+    """Классификатор аудио с интерфейсом pipeline, вызывающий модель напрямую
+
+    Окна батча склеиваются в один тензор, без DataLoader и постобработки pipeline.
+    Формат результата совпадает с pipeline("audio-classification").
+    """
+
+    def __init__(self, model, feature_extractor, device="cpu", top_k=5):
+        self.model = model.eval()
+        self.feature_extractor = feature_extractor
+        self.device = torch.device(device)
+        self.top_k = top_k
+        self.id2label = model.config.id2label
+        self.sampling_rate = feature_extractor.sampling_rate
+
+    @classmethod
+    def from_pipeline(cls, audio_pipeline):
+        """Создание классификатора из уже загруженного pipeline (без повторной загрузки весов)"""
+        return cls(audio_pipeline.model, audio_pipeline.feature_extractor, audio_pipeline.device)
+
+    def __call__(self, inputs, batch_size=None, top_k=None):
+        single = isinstance(inputs, np.ndarray)
+        items = [inputs] if single else list(inputs)
+        batch_size = batch_size or 1
+        top_k = min(top_k or self.top_k, len(self.id2label))
+
+        results = []
+        for start in range(0, len(items), batch_size):
+            logits = self.forward(items[start:start + batch_size])
+            scores, ids = logits.softmax(-1).topk(top_k)
+            for row_scores, row_ids in zip(scores.tolist(), ids.tolist()):
+                results.append([
+                    {'label': self.id2label[label_id], 'score': score}
+                    for score, label_id in zip(row_scores, row_ids)
+                ])
+        return results[0] if single else results
+
+    def forward(self, segments):
+        """Логиты модели для списка окон"""
+        features = self.feature_extractor(
+            segments,
+            sampling_rate=self.sampling_rate,
+            return_tensors="pt",
+            padding=True
+        )
+        with torch.inference_mode():
+            return self.model(**features.to(self.device)).logits
+
+    def forward_embeddings(self, segments):
+        """Эмбеддинги окон (усредненный по кадрам вход головы) и логиты за один проход
+
+        Вход головы (projector, а при его отсутствии classifier) перехватывается
+        forward pre-hook, поэтому логиты те же, что и у forward(). Окна должны быть
+        одной длины: усреднение выполняется без маски паддинга.
+
+        Returns:
+            tuple: (эмбеддинги (окна, размер), логиты (окна, метки)) в float32
+        """
+        head = getattr(self.model, 'projector', None) or self.model.classifier
+        captured = {}
+        handle = head.register_forward_pre_hook(lambda module, inputs: captured.update(hidden=inputs[0]))
+        try:
+            logits = self.forward(segments)
+        finally:
+            handle.remove()
+        hidden = captured['hidden']
+        pooled = hidden.mean(dim=1) if hidden.dim() == 3 else hidden
+        return pooled.float().cpu().numpy(), logits.float().cpu().numpy()
+
+    def head_logits(self, pooled):
+        """Логиты головы модели по сохраненным эмбеддингам
+
+        projector линейный, поэтому его применение к среднему по кадрам совпадает
+        со средним по кадрам после projector, как в самой модели.
+        """
+        with torch.inference_mode():
+            hidden = torch.tensor(np.array(pooled, dtype=np.float32), device=self.device)
+            projector = getattr(self.model, 'projector', None)
+            if projector is not None:
+                hidden = projector(hidden)
+            return self.model.classifier(hidden).float().cpu().numpy()
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "MANIFEST.json"
+VERIFIED_STAMP = ".verified"
+BUNDLE_EXTENSION = ".vabundle"
+CHUNK_SIZE = 4 * 1024 * 1024
+
+class BundleError(Exception):
+    """Ошибка упаковки, распаковки или проверки пакета модели"""
+
+def file_sha256(file_path):
+    """SHA-256 файла, читаемого блоками"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _model_files(model_path):
+    """Файлы модели относительно ее каталога (без служебных файлов пакета)"""
+    files = []
+    for root, _, names in os.walk(model_path):
+        for name in names:
+            relative = os.path.relpath(os.path.join(root, name), model_path).replace(os.sep, '/')
+            if relative not in (MANIFEST_NAME, VERIFIED_STAMP):
+                files.append(relative)
+    return sorted(files)
+
+def pack_model(model_path, bundle_path, language, workers=4):
+    """Упаковка каталога модели в один архив с манифестом контрольных сумм
+
+    Веса уже сжаты плохо, поэтому файлы хранятся без сжатия (ZIP_STORED):
+    это позволяет распаковывать их параллельно и потоково.
+
+    Returns:
+        dict: Манифест пакета
+    """
+    files = _model_files(model_path)
+    if not files:
+        raise BundleError(f"Каталог модели {model_path} пуст")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        checksums = list(executor.map(lambda name: file_sha256(os.path.join(model_path, name)), files))
+
+    manifest = {
+        'language': language,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'files': {
+            name: {'size': os.path.getsize(os.path.join(model_path, name)), 'sha256': checksum}
+            for name, checksum in zip(files, checksums)
+        }
+    }
+
+    tmp_path = bundle_path + ".tmp"
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+        for name in files:
+            archive.write(os.path.join(model_path, name), arcname=name)
+    os.replace(tmp_path, bundle_path)
+    logger.info(f"Модель {language} упакована в {bundle_path} ({len(files)} файлов)")
+    return manifest
+
+def read_manifest(bundle_path):
+    """Чтение манифеста из пакета"""
+    with zipfile.ZipFile(bundle_path) as archive:
+        try:
+            return json.loads(archive.read(MANIFEST_NAME))
+        except KeyError:
+            raise BundleError(f"В пакете {bundle_path} нет манифеста")
+
+def _extract_member(bundle_path, name, expected, target_dir):
+    """Потоковая распаковка одного файла с проверкой размера и контрольной суммы
+
+    Каждый поток открывает архив отдельно, поэтому файлы распаковываются параллельно.
+    """
+    target_path = os.path.join(target_dir, *name.split('/'))
+    if not os.path.abspath(target_path).startswith(os.path.abspath(target_dir) + os.sep):
+        raise BundleError(f"Недопустимый путь в пакете: {name}")
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    with zipfile.ZipFile(bundle_path) as archive, archive.open(name) as src, open(target_path, 'wb') as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    if size != expected['size'] or digest.hexdigest() != expected['sha256']:
+        raise BundleError(f"Контрольная сумма файла {name} не совпадает")
+    return size
+
+def unpack_model(bundle_path, models_dir, language=None, workers=4):
+    """Распаковка пакета в models_dir/<язык> с проверкой контрольных сумм
+
+    Файлы распаковываются во временный каталог и переносятся на место только
+    после успешной проверки всех контрольных сумм.
+
+    Returns:
+        str: Путь к каталогу модели
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(bundle_path)
+    language = language or manifest['language']
+    model_path = os.path.join(models_dir, language)
+    tmp_dir = model_path + ".unpacking"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_extract_member, bundle_path, name, expected, tmp_dir)
+                for name, expected in manifest['files'].items()
+            ]
+            total_size = sum(future.result() for future in futures)
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        _write_stamp(tmp_dir, manifest)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if os.path.exists(model_path):
+        shutil.rmtree(model_path)
+    os.replace(tmp_dir, model_path)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Пакет {bundle_path} распакован в {model_path}: "
+                f"{total_size / 1024 / 1024:.0f} МБ за {elapsed:.1f} сек")
+    return model_path
+
+def _file_state(model_path, manifest):
+    """Размеры и время изменения файлов модели для быстрой повторной проверки"""
+    state = {}
+    for name in manifest['files']:
+        stat = os.stat(os.path.join(model_path, *name.split('/')))
+        state[name] = [stat.st_size, stat.st_mtime_ns]
+    return state
+
+def _write_stamp(model_path, manifest):
+    with open(os.path.join(model_path, VERIFIED_STAMP), 'w', encoding='utf-8') as f:
+        json.dump(_file_state(model_path, manifest), f)
+
+def verify_model_dir(model_path, workers=4):
+    """Проверка целостности каталога модели по манифесту
+
+    Полная проверка SHA-256 выполняется один раз, затем результат запоминается
+    по размерам и времени изменения файлов.
+
+    Returns:
+        bool: True, если каталог содержит манифест и все файлы совпадают с ним
+
+    Raises:
+        BundleError: если манифест есть, но файлы повреждены или отсутствуют
+    """
+    manifest_path = os.path.join(model_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    try:
+        state = _file_state(model_path, manifest)
+    except OSError as e:
+        raise BundleError(f"В каталоге модели {model_path} не хватает файлов: {e}")
+    for name, (size, _) in state.items():
+        if size != manifest['files'][name]['size']:
+            raise BundleError(f"Размер файла {name} в {model_path} не совпадает с манифестом")
+
+    stamp_path = os.path.join(model_path, VERIFIED_STAMP)
+    if os.path.exists(stamp_path):
+        with open(stamp_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == json.loads(json.dumps(state)):
+                return True
+
+    names = list(manifest['files'])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        checksums = executor.map(lambda name: file_sha256(os.path.join(model_path, *name.split('/'))), names)
+        for name, checksum in zip(names, checksums):
+            if checksum != manifest['files'][name]['sha256']:
+                raise BundleError(f"Контрольная сумма файла {name} в {model_path} не совпадает")
+    _write_stamp(model_path, manifest)
+    logger.info(f"Целостность модели в {model_path} проверена")
+    return True
+
+def find_bundle(models_dir, language):
+    """Поиск пакета модели языка в каталоге моделей (<язык>.vabundle)"""
+    bundle_path = os.path.join(models_dir, language + BUNDLE_EXTENSION)
+    return bundle_path if os.path.exists(bundle_path) else None
@@ -0,0 +1,211 @@
+import os
+import copy
+import json
+import time
+import logging
+import numpy as np
+import torch
+from torch import nn
+from transformers import AutoModelForAudioClassification
+
+from .backends import DirectAudioClassifier
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3')
+REPORT_FILE = "distill_report.json"
+
+def build_student(teacher_model, num_layers):
+    """Ученик из первых num_layers слоев трансформера учителя и новой головы
+
+    Сверточный энкодер и оставленные слои копируются из учителя и замораживаются,
+    обучаются только веса слоев и голова (projector + classifier).
+    """
+    if not 0 < num_layers <= teacher_model.config.num_hidden_layers:
+        raise ValueError(f"Количество слоев должно быть от 1 до {teacher_model.config.num_hidden_layers}")
+
+    config = copy.deepcopy(teacher_model.config)
+    config.num_hidden_layers = num_layers
+    config.use_weighted_layer_sum = True
+    student = AutoModelForAudioClassification.from_config(config)
+
+    teacher_state = teacher_model.state_dict()
+    student_state = {
+        name: tensor for name, tensor in teacher_state.items()
+        if name.startswith("wav2vec2.") and _layer_index(name) < num_layers
+    }
+    # Голову инициализируем весами учителя: пространство признаков у них общее
+    for name in ("projector.weight", "projector.bias", "classifier.weight", "classifier.bias"):
+        student_state[name] = teacher_state[name]
+    missing, _ = student.load_state_dict(student_state, strict=False)
+    logger.debug("Ученик: %d слоев, новые параметры: %s", num_layers, missing)
+
+    student.freeze_base_model()
+    return student.eval()
+
+def _layer_index(name):
+    """Номер слоя трансформера в имени параметра (-1 для остальных параметров)"""
+    marker = ".encoder.layers."
+    if marker not in name:
+        return -1
+    return int(name.split(marker, 1)[1].split(".", 1)[0])
+
+def iter_audio_files(audio_dir):
+    """Аудиофайлы в каталоге (рекурсивно, в отсортированном порядке)"""
+    for root, _, files in sorted(os.walk(audio_dir)):
+        for file_name in sorted(files):
+            if file_name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(root, file_name)
+
+def collect_windows(audio_dir, window_size=2.0, step=1.0, max_windows=None):
+    """Нарезка аудио из каталога на окна фиксированной длины"""
+    from audio.audio_utils import AudioProcessor
+
+    windows = []
+    for file_path in iter_audio_files(audio_dir):
+        try:
+            audio, sr = AudioProcessor.load_audio(file_path)
+        except Exception as e:
+            logger.warning(f"Файл {file_path} пропущен: {e}")
+            continue
+        window_samples = int(window_size * sr)
+        step_samples = int(step * sr)
+        for start in range(0, len(audio) - window_samples, step_samples):
+            windows.append(np.ascontiguousarray(audio[start:start + window_samples]))
+            if max_windows and len(windows) >= max_windows:
+                return windows
+    return windows
+
+def extract_layer_features(student, feature_extractor, windows, batch_size=8):
+    """Усредненные по времени скрытые состояния всех слоев ученика, (окна, слои, признаки)
+
+    Голова ученика линейна до усреднения по времени, поэтому для обучения
+    достаточно один раз прогнать замороженную часть и сохранить эти признаки.
+    """
+    features = []
+    with torch.inference_mode():
+        for start in range(0, len(windows), batch_size):
+            inputs = feature_extractor(windows[start:start + batch_size],
+                                       sampling_rate=feature_extractor.sampling_rate,
+                                       return_tensors="pt", padding=True)
+            outputs = student.wav2vec2(inputs['input_values'], output_hidden_states=True)
+            hidden = torch.stack(outputs.hidden_states, dim=1)
+            features.append(hidden.mean(dim=2))
+    return torch.cat(features)
+
+def head_logits(student, layer_features):
+    """Логиты головы ученика по усредненным признакам слоев"""
+    weights = nn.functional.softmax(student.layer_weights, dim=-1)
+    pooled = (layer_features * weights.view(1, -1, 1)).sum(dim=1)
+    return student.classifier(student.projector(pooled))
+
+def train_head(student, layer_features, teacher_logits, epochs=30, lr=1e-3, temperature=2.0, batch_size=64):
+    """Обучение головы ученика повторять распределение учителя (KL-дивергенция)"""
+    parameters = [student.layer_weights] + list(student.projector.parameters()) + list(student.classifier.parameters())
+    optimizer = torch.optim.Adam(parameters, lr=lr)
+    kl_loss = nn.KLDivLoss(reduction="batchmean")
+    targets = nn.functional.softmax(teacher_logits / temperature, dim=-1)
+    generator = torch.Generator().manual_seed(0)
+
+    student.train()
+    for epoch in range(epochs):
+        order = torch.randperm(len(layer_features), generator=generator)
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            index = order[start:start + batch_size]
+            logits = head_logits(student, layer_features[index])
+            loss = kl_loss(nn.functional.log_softmax(logits / temperature, dim=-1), targets[index])
+            loss = loss * temperature ** 2
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(index)
+        logger.debug("Эпоха %d: loss %.4f", epoch + 1, total / len(order))
+    student.eval()
+    return student
+
+def _timed_logits(classifier, windows, batch_size):
+    start = time.perf_counter()
+    logits = torch.cat([classifier.forward(windows[i:i + batch_size])
+                        for i in range(0, len(windows), batch_size)])
+    return logits, time.perf_counter() - start
+
+def evaluate_student(teacher, student, windows, batch_size=8, thresholds=(0.6, 0.7, 0.8, 0.9)):
+    """Отчет об ускорении ученика и совпадении меток с учителем
+
+    Args:
+        teacher, student: DirectAudioClassifier для учителя и ученика
+        thresholds: Пороги уверенности каскада, для которых считается доля эскалаций
+    """
+    teacher_logits, teacher_time = _timed_logits(teacher, windows, batch_size)
+    student_logits, student_time = _timed_logits(student, windows, batch_size)
+    teacher_labels = teacher_logits.argmax(-1)
+    student_probs = student_logits.softmax(-1)
+    student_conf, student_labels = student_probs.max(-1)
+    agree = student_labels == teacher_labels
+
+    report = {
+        'windows': len(windows),
+        'teacher_sec': teacher_time,
+        'student_sec': student_time,
+        'speedup': teacher_time / student_time if student_time else None,
+        'label_agreement': agree.float().mean().item(),
+        'cascade': []
+    }
+    for threshold in thresholds:
+        escalated = student_conf < threshold
+        escalated_share = escalated.float().mean().item()
+        # Эскалированные окна получают ответ учителя
+        cascade_agree = (agree | escalated).float().mean().item()
+        cascade_time = student_time + escalated_share * teacher_time
+        report['cascade'].append({
+            'threshold': threshold,
+            'escalated_share': escalated_share,
+            'label_agreement': cascade_agree,
+            'speedup': teacher_time / cascade_time if cascade_time else None
+        })
+    return report
+
+def distill(model_loader, audio_dir, language="English", num_layers=4, window_size=2.0, step=1.0,
+            epochs=30, holdout=0.2, max_windows=None, batch_size=8):
+    """Построение и обучение ученика для модели языка по локальному каталогу с аудио
+
+    Сеть не используется: учитель берется из models/<language>, ученик сохраняется
+    в models/<language>-student вместе с отчетом distill_report.json.
+
+    Returns:
+        dict: Отчет об ускорении и совпадении меток на отложенной части окон
+    """
+    if not model_loader.load_model(language):
+        raise RuntimeError(f"Не удалось загрузить модель для языка {language}")
+    teacher = DirectAudioClassifier.from_pipeline(model_loader.pipeline)
+
+    windows = collect_windows(audio_dir, window_size, step, max_windows)
+    if len(windows) < 10:
+        raise ValueError(f"В каталоге {audio_dir} слишком мало аудио для обучения ({len(windows)} окон)")
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(windows))
+    split = max(1, int(len(windows) * holdout))
+    eval_windows = [windows[i] for i in order[:split]]
+    train_windows = [windows[i] for i in order[split:]]
+    logger.info("Дистилляция: %d окон для обучения, %d для проверки", len(train_windows), len(eval_windows))
+
+    student_model = build_student(teacher.model, num_layers)
+    teacher_logits = torch.cat([teacher.forward(train_windows[i:i + batch_size])
+                                for i in range(0, len(train_windows), batch_size)])
+    layer_features = extract_layer_features(student_model, teacher.feature_extractor, train_windows, batch_size)
+    train_head(student_model, layer_features, teacher_logits, epochs=epochs)
+
+    student = DirectAudioClassifier(student_model, teacher.feature_extractor, teacher.device)
+    report = evaluate_student(teacher, student, eval_windows, batch_size)
+    report.update({'language': language, 'num_layers': num_layers, 'train_windows': len(train_windows)})
+
+    student_path = model_loader.get_student_path(language)
+    student_model.save_pretrained(student_path)
+    teacher.feature_extractor.save_pretrained(student_path)
+    with open(os.path.join(student_path, REPORT_FILE), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    logger.info("Ученик сохранен в %s: ускорение %.2fx, совпадение меток %.1f%%",
+                student_path, report['speedup'], report['label_agreement'] * 100)
+    return report
@@ -0,0 +1,104 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from audio.ingest import audio_digest
+
+logger = logging.getLogger(__name__)
+
+# Каталог кэша эмбеддингов окон (относительно рабочего каталога)
+EMBEDDING_CACHE_DIR = "embeddings"
+EMBEDDING_CACHE_VERSION = 1
+
+
+class CachedEmbeddings:
+    """Эмбеддинги и логиты всех окон одной записи (массивы отображены в память)"""
+
+    def __init__(self, meta, pooled, logits):
+        self.meta = meta
+        self.pooled = pooled
+        self.logits = logits
+        self.labels = meta['labels']
+        self.sample_rate = meta['key']['sample_rate']
+        self.step_samples = meta['step_samples']
+
+    def __len__(self):
+        return len(self.logits)
+
+    def times(self):
+        """Время начала каждого окна в секундах"""
+        return [index * self.step_samples / self.sample_rate for index in range(len(self))]
+
+
+class EmbeddingCache:
+    """Кэш усредненных эмбеддингов и логитов окон по хешу аудио и сетке окон
+
+    На запись приходятся три файла: <имя>.pooled.npy (окна, размер эмбеддинга),
+    <имя>.logits.npy (окна, метки) и <имя>.json с ключом и метками. JSON пишется
+    последним, поэтому запись без него считается незавершенной. Массивы читаются
+    через np.load(mmap_mode='r'): повторная оценка не загружает их целиком.
+    """
+
+    def __init__(self, cache_dir=EMBEDDING_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def key(self, audio_data, sample_rate, window_size, step, model_id):
+        """Ключ записи: (имя файлов, словарь ключа)"""
+        key = {
+            'audio': audio_digest(audio_data),
+            'samples': int(len(audio_data)),
+            'sample_rate': int(sample_rate),
+            'window_size': float(window_size),
+            'step': float(step),
+            'model': model_id,
+        }
+        name = hashlib.blake2b(json.dumps(key, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+        return name, key
+
+    def _path(self, name, suffix):
+        return os.path.join(self.cache_dir, name + suffix)
+
+    def load(self, name, key):
+        """Запись кэша или None, если ее нет или ключ не совпал"""
+        try:
+            with open(self._path(name, ".json"), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != EMBEDDING_CACHE_VERSION or meta.get('key') != key:
+                return None
+            pooled = np.load(self._path(name, ".pooled.npy"), mmap_mode='r')
+            logits = np.load(self._path(name, ".logits.npy"), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Не удалось прочитать кэш эмбеддингов {name}: {e}")
+            return None
+        logger.debug("Эмбеддинги %d окон загружены из кэша %s", len(logits), name)
+        return CachedEmbeddings(meta, pooled, logits)
+
+    def save(self, name, key, pooled, logits, labels, step_samples):
+        """Сохранение эмбеддингов (окна, размер) и логитов (окна, метки) записи"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for suffix, array in ((".pooled.npy", pooled), (".logits.npy", logits)):
+                tmp_path = self._path(name, suffix) + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, np.asarray(array, dtype=np.float32))
+                os.replace(tmp_path, self._path(name, suffix))
+            meta = {'version': EMBEDDING_CACHE_VERSION, 'key': key, 'labels': list(labels),
+                    'step_samples': int(step_samples)}
+            tmp_path = self._path(name, ".json") + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(name, ".json"))
+            logger.debug("Эмбеддинги %d окон сохранены в кэш %s", len(logits), name)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш эмбеддингов {name}: {e}")
+
+
+def softmax(logits, temperature=1.0):
+    """Вероятности меток по логитам (построчно) с температурой"""
+    scaled = np.asarray(logits, dtype=np.float64) / temperature
+    scaled -= scaled.max(axis=-1, keepdims=True)
+    exp = np.exp(scaled)
+    return exp / exp.sum(axis=-1, keepdims=True)
@@ -0,0 +1,146 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Сколько окон хранится в кэше (вытесняются давно не использованные)
+DEFAULT_FINGERPRINT_ENTRIES = 10000
+# Сетка отпечатка: временные кадры окна и частотные полосы (логарифмические, 100 Гц - 7.6 кГц)
+FINGERPRINT_FRAMES = 16
+FINGERPRINT_BANDS = 24
+FINGERPRINT_MIN_HZ = 100.0
+FINGERPRINT_MAX_HZ = 7600.0
+# Энергии ниже -30 дБ от самой громкой ячейки окна выравниваются: биты тишины не зависят от шума
+FINGERPRINT_FLOOR = 1e-3
+# Доля различающихся битов, при которой окна еще считаются одинаковыми
+MAX_BIT_ERROR_RATE = 0.2
+
+# Число единичных битов в каждом байте
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint16)
+
+
+class FingerprintCache:
+    """Кэш предсказаний окон по спектральному отпечатку: повторы одного звука не доходят до модели
+
+    Отпечаток - знаки разностей логарифмических энергий соседних полос в соседних кадрах
+    (как в акустических отпечатках Haitsma-Kalker). Он не зависит от громкости и мало
+    меняется от шума и перекодирования, поэтому почти одинаковые окна (музыка ожидания,
+    подсказки IVR, сигналы) дают близкие отпечатки, а разная речь отличается примерно
+    в половине битов. Точное совпадение ищется по словарю, иначе - ближайший отпечаток
+    по расстоянию Хэмминга среди всех хранимых (один векторный проход NumPy).
+    Окна сравниваются только при совпадении сетки: сдвиг больше ~10 мс дает промах.
+    """
+
+    def __init__(self, max_entries=DEFAULT_FINGERPRINT_ENTRIES, max_bit_error_rate=MAX_BIT_ERROR_RATE,
+                 frames=FINGERPRINT_FRAMES, bands=FINGERPRINT_BANDS):
+        if max_entries <= 0:
+            raise ValueError("Размер кэша отпечатков должен быть положительным")
+        self.max_entries = max_entries
+        self.frames = frames
+        self.bands = bands
+        self.bits = (frames - 1) * (bands - 1)
+        self.max_distance = int(self.bits * max_bit_error_rate)
+        # Отпечатки хранятся в ячейках фиксированного массива; ячейка вытесненного окна переиспользуется
+        self._fingerprints = np.zeros((max_entries, -(-self.bits // 8)), dtype=np.uint8)
+        self._slot_namespace = np.full(max_entries, -1, dtype=np.int64)
+        self._slots = OrderedDict()  # ячейка -> (ключ точного совпадения, предсказания), порядок LRU
+        self._exact = {}             # (пространство, байты отпечатка) -> ячейка
+        self._namespaces = {}
+        self._edges = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def namespace(model_id, window_samples, sample_rate):
+        """Пространство ключей: предсказания разных моделей и длин окон не смешиваются"""
+        return json.dumps(model_id, sort_keys=True), int(window_samples), int(sample_rate)
+
+    def _band_edges(self, frame_samples, sample_rate):
+        """Границы полос в номерах бинов rfft кадра"""
+        key = (frame_samples, sample_rate)
+        if key not in self._edges:
+            max_hz = min(FINGERPRINT_MAX_HZ, sample_rate / 2)
+            hz = np.geomspace(FINGERPRINT_MIN_HZ, max_hz, self.bands + 1)
+            bins = np.round(hz * frame_samples / sample_rate).astype(int)
+            # В каждой полосе хотя бы один бин
+            bins = np.maximum(bins, np.arange(len(bins)) + bins[0])
+            self._edges[key] = np.minimum(bins, frame_samples // 2)
+        return self._edges[key]
+
+    def fingerprint(self, window, sample_rate):
+        """Отпечаток окна: (frames - 1) * (bands - 1) битов, упакованных в массив uint8"""
+        window = np.asarray(window, dtype=np.float32)
+        frame_samples = len(window) // self.frames
+        frames = window[:frame_samples * self.frames].reshape(self.frames, frame_samples)
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_samples), axis=1)) ** 2
+        edges = self._band_edges(frame_samples, sample_rate)
+        energy = np.add.reduceat(spectrum[:, :edges[-1]], edges[:-1], axis=1)
+        energy = np.log(energy + energy.max() * FINGERPRINT_FLOOR + 1e-10)
+        band_diff = energy[:, :-1] - energy[:, 1:]
+        bits = (band_diff[1:] - band_diff[:-1]) > 0
+        return np.packbits(bits.reshape(-1))
+
+    def _namespace_id(self, namespace):
+        return self._namespaces.setdefault(namespace, len(self._namespaces))
+
+    def get(self, namespace, fingerprint):
+        """Предсказания ближайшего окна с тем же пространством ключей или None"""
+        with self._lock:
+            namespace_id = self._namespace_id(namespace)
+            slot = self._exact.get((namespace_id, fingerprint.tobytes()))
+            distance = 0
+            if slot is None and self._slots:
+                distances = _POPCOUNT[np.bitwise_xor(self._fingerprints, fingerprint)].sum(axis=1)
+                distances[self._slot_namespace != namespace_id] = self.bits + 1
+                slot = int(distances.argmin())
+                distance = int(distances[slot])
+                if distance > self.max_distance:
+                    slot = None
+            if slot is None:
+                self.misses += 1
+                return None
+            self._slots.move_to_end(slot)
+            self.hits += 1
+            if distance:
+                self.near_hits += 1
+            return self._slots[slot][1]
+
+    def put(self, namespace, fingerprint, predictions):
+        """Сохранение предсказаний окна; при переполнении вытесняется давно не использованное"""
+        with self._lock:
+            namespace_id = self._namespace_id(namespace)
+            exact_key = (namespace_id, fingerprint.tobytes())
+            if exact_key in self._exact:
+                slot = self._exact[exact_key]
+            elif len(self._slots) < self.max_entries:
+                slot = len(self._slots)
+            else:
+                slot, (evicted_key, _) = self._slots.popitem(last=False)
+                del self._exact[evicted_key]
+                self.evictions += 1
+            self._fingerprints[slot] = fingerprint
+            self._slot_namespace[slot] = namespace_id
+            self._exact[exact_key] = slot
+            self._slots[slot] = (exact_key, predictions)
+            self._slots.move_to_end(slot)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Метрики кэша: попадания (в том числе неточные), промахи, вытеснения, размер"""
+        return {'hits': self.hits, 'near_hits': self.near_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self._slots), 'hit_rate': self.hit_rate()}
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._exact.clear()
+            self._slot_namespace.fill(-1)
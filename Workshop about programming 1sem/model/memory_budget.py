@@ -0,0 +1,164 @@
+import os
+import re
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Переменная окружения, через которую бюджет наследуют дочерние процессы (процесс анализа GUI)
+BUDGET_ENV = "VOICE_ANALYZE_MEMORY_BUDGET"
+# Доля бюджета, оставляемая под неучтенные выделения (аллокатор, интерпретатор)
+DEFAULT_HEADROOM = 0.15
+
+CGROUP_LIMIT_FILES = (
+    "/sys/fs/cgroup/memory.max",                     # cgroup v2
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",   # cgroup v1
+)
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+OOM_MESSAGES = ("out of memory", "can't allocate memory", "not enough memory", "cannot allocate memory")
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def parse_size(value):
+    """Размер в байтах из строки вида '512M', '2G', '1.5G' или числа"""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)i?B?\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Некорректный размер памяти: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss - пиковое значение (в КБ на Linux), лучше чем ничего
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def cgroup_memory_limit():
+    """Лимит памяти cgroup в байтах (None, если лимита нет)"""
+    for path in CGROUP_LIMIT_FILES:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value == "max":
+            return None
+        limit = int(value)
+        # cgroup v1 без лимита сообщает огромное число
+        return limit if limit < 1 << 60 else None
+    return None
+
+
+def is_out_of_memory(error):
+    """Признак нехватки памяти: MemoryError или ошибка аллокатора torch"""
+    if isinstance(error, MemoryError):
+        return True
+    return isinstance(error, RuntimeError) and any(text in str(error).lower() for text in OOM_MESSAGES)
+
+
+def estimate_window_bytes(config, window_samples):
+    """Оценка памяти на одно окно при инференсе wav2vec2 по размерам тензоров
+
+    Доминируют выходы сверточного энкодера (первый слой - conv_dim[0] каналов на
+    window_samples / conv_stride[0] кадров, плюс копия после нормализации) и скрытые
+    состояния всех слоев трансформера, которые хранятся для взвешенной суммы слоев.
+    """
+    float_size = 4
+    total = window_samples * float_size
+    frames = window_samples
+    for channels, stride in zip(getattr(config, 'conv_dim', (512,)), getattr(config, 'conv_stride', (5,))):
+        frames = max(1, frames // stride)
+        total = max(total, 2 * channels * frames * float_size + window_samples * float_size)
+    hidden = getattr(config, 'hidden_size', 768)
+    layers = getattr(config, 'num_hidden_layers', 12)
+    heads = getattr(config, 'num_attention_heads', 12)
+    intermediate = getattr(config, 'intermediate_size', 4 * hidden)
+    transformer = ((layers + 1) * frames * hidden + frames * intermediate + heads * frames * frames) * float_size
+    return int(1.5 * (total + transformer))
+
+
+class MemoryBudget:
+    """Бюджет памяти процесса: размеры батчей и буферов подбираются так, чтобы RSS не превысил лимит
+
+    Лимит - меньшее из явно заданного значения и лимита cgroup. После нехватки
+    памяти максимальный размер батча запоминается уменьшенным вдвое.
+    """
+
+    def __init__(self, limit_bytes=None, headroom=DEFAULT_HEADROOM):
+        cgroup_limit = cgroup_memory_limit()
+        limits = [limit for limit in (limit_bytes, cgroup_limit) if limit]
+        if not limits:
+            raise ValueError("Не задан лимит памяти и лимит cgroup не найден")
+        self.limit_bytes = min(limits)
+        self.headroom = headroom
+        self.max_batch = None
+        self._lock = threading.Lock()
+        logger.info("Бюджет памяти: %.0f МБ (cgroup: %s)", self.limit_bytes / 1024 ** 2,
+                    f"{cgroup_limit / 1024 ** 2:.0f} МБ" if cgroup_limit else "нет")
+
+    @property
+    def usable_bytes(self):
+        return int(self.limit_bytes * (1 - self.headroom))
+
+    def available(self):
+        """Сколько еще байт можно выделить, оставаясь в бюджете"""
+        return max(0, self.usable_bytes - current_rss())
+
+    def batch_size(self, requested, item_bytes):
+        """Наибольший батч не больше requested, помещающийся в свободную память (минимум 1)"""
+        fits = self.available() // max(1, item_bytes)
+        size = max(1, min(requested, fits))
+        if self.max_batch is not None:
+            size = min(size, self.max_batch)
+        return size
+
+    def record_oom(self, batch_size):
+        """Нехватка памяти на батче batch_size: дальше используются вдвое меньшие батчи"""
+        with self._lock:
+            limit = max(1, batch_size // 2)
+            if self.max_batch is None or limit < self.max_batch:
+                self.max_batch = limit
+                logger.warning("Нехватка памяти на батче %d, максимальный батч уменьшен до %d",
+                               batch_size, limit)
+
+    def block_frames(self, bytes_per_frame, fraction=0.1, minimum=16384, maximum=1 << 22):
+        """Размер блока чтения: доля свободной памяти в кадрах, в заданных пределах"""
+        frames = int(self.available() * fraction) // max(1, bytes_per_frame)
+        return max(minimum, min(maximum, frames))
+
+    def fits(self, nbytes, fraction=0.5):
+        """Помещается ли буфер nbytes в заданную долю свободной памяти"""
+        return nbytes <= self.available() * fraction
+
+
+def set_memory_budget(limit):
+    """Включение режима бюджета памяти для процесса и его дочерних процессов
+
+    Args:
+        limit: Размер ('2G', байты) или 'auto' - по лимиту cgroup; None отключает режим
+    """
+    global _budget
+    with _budget_lock:
+        if limit is None:
+            _budget = None
+            os.environ.pop(BUDGET_ENV, None)
+            return None
+        _budget = MemoryBudget(None if str(limit).lower() == "auto" else parse_size(limit))
+        os.environ[BUDGET_ENV] = str(_budget.limit_bytes)
+        return _budget
+
+
+def get_memory_budget():
+    """Текущий бюджет памяти (None, если режим не включен)"""
+    global _budget
+    with _budget_lock:
+        if _budget is None and os.environ.get(BUDGET_ENV):
+            _budget = MemoryBudget(int(os.environ[BUDGET_ENV]))
+        return _budget
@@ -1,17 +1,83 @@
-from transformers import pipeline, AutoModelForAudioClassification, AutoFeatureExtractor
-from transformers.utils import WEIGHTS_NAME, CONFIG_NAME
+from transformers import pipeline, AutoConfig, AutoModelForAudioClassification, AutoFeatureExtractor
+from transformers.utils import WEIGHTS_NAME, CONFIG_NAME, SAFE_WEIGHTS_NAME
 import torch
 import os
+import json
+import struct
 import shutil
 import logging
+import threading
 import requests
 from pathlib import Path
+from .backends import BACKENDS, DirectAudioClassifier
+from .bundle import BundleError, verify_model_dir, find_bundle, unpack_model
 
 logger = logging.getLogger(__name__)
 
+# Типы тензоров в формате safetensors
+SAFETENSORS_DTYPES = {
+    'F64': torch.float64,
+    'F32': torch.float32,
+    'F16': torch.float16,
+    'BF16': torch.bfloat16,
+    'I64': torch.int64,
+    'I32': torch.int32,
+    'I16': torch.int16,
+    'I8': torch.int8,
+    'U8': torch.uint8,
+    'BOOL': torch.bool,
+}
+
+def mmap_safetensors(file_path):
+    """Тензоры из файла safetensors, отображенного в память
+
+    Данные не копируются: страницы файла читаются с диска при первом обращении
+    и разделяются через page cache между процессами, открывшими тот же файл.
+    """
+    with open(file_path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    data_start = 8 + header_size
+    storage = torch.UntypedStorage.from_file(file_path, shared=False, nbytes=os.path.getsize(file_path))
+
+    tensors = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = SAFETENSORS_DTYPES[info['dtype']]
+        element_size = torch.empty(0, dtype=dtype).element_size()
+        offset = data_start + info['data_offsets'][0]
+        if offset % element_size:
+            raise ValueError(f"Тензор {name} не выровнен в файле {file_path}")
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, offset // element_size, info['shape'])
+    return tensors
+
 class EmotionModelLoader:
-    def __init__(self, models_dir=None):
+    _shared_instances = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, models_dir=None):
+        """Общий загрузчик для каталога моделей, чтобы веса загружались один раз на процесс"""
+        key = os.path.abspath(models_dir if models_dir else os.path.join(os.getcwd(), 'models'))
+        with cls._shared_lock:
+            if key not in cls._shared_instances:
+                cls._shared_instances[key] = cls(key)
+            return cls._shared_instances[key]
+
+    def __init__(self, models_dir=None, backend="pipeline", mmap_weights=False):
+        """
+        Args:
+            models_dir (str): Каталог с моделями (по умолчанию ./models)
+            backend (str): Бэкенд инференса из BACKENDS
+            mmap_weights (bool): Загружать веса из safetensors через отображение в память
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд инференса: {backend}")
         self.model = None
+        self.pipeline = None
+        self.backend = backend
+        self.mmap_weights = mmap_weights
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.current_language = "English"
         logger.info(f"Device set to use {self.device}")
@@ -34,10 +100,48 @@ class EmotionModelLoader:
         """Получить локальный путь для модели конкретного языка"""
         return os.path.join(self.models_dir, language)
     
+    def get_student_path(self, language):
+        """Получить локальный путь для облегченной модели-ученика языка"""
+        return os.path.join(self.models_dir, f"{language}-student")
+
     def is_model_downloaded(self, language):
         """Проверить, скачана ли модель для данного языка"""
         model_path = self.get_model_path(language)
-        return os.path.exists(os.path.join(model_path, CONFIG_NAME))
+        if not os.path.exists(os.path.join(model_path, CONFIG_NAME)):
+            return False
+        try:
+            # Каталоги из пакетов проверяются по манифесту, недокопированные не проходят
+            verify_model_dir(model_path)
+            return True
+        except BundleError as e:
+            logger.error(f"Модель для языка {language} повреждена: {e}")
+            return False
+
+    def prepare_model(self, language):
+        """Подготовка локальной модели перед загрузкой
+
+        Если модель пришла из пакета (есть манифест) или рядом лежит пакет
+        models/<язык>.vabundle, сеть не используется: проверяется целостность,
+        при необходимости пакет распаковывается заново.
+        """
+        model_path = self.get_model_path(language)
+        bundle_path = find_bundle(self.models_dir, language)
+        try:
+            if verify_model_dir(model_path):
+                return True
+        except BundleError as e:
+            logger.error(f"Модель для языка {language} повреждена: {e}")
+            if bundle_path is None:
+                return False
+
+        if bundle_path is not None:
+            logger.info(f"Модель для языка {language} распаковывается из {bundle_path}")
+            unpack_model(bundle_path, self.models_dir, language)
+            return True
+
+        if not os.path.exists(os.path.join(model_path, CONFIG_NAME)):
+            return self.download_model(language)
+        return True
     
     def download_model(self, language):
         """Скачать модель для конкретного языка"""
@@ -68,24 +172,118 @@ class EmotionModelLoader:
             if language:
                 self.current_language = language
             
-            # Проверяем, скачана ли модель
-            if not self.is_model_downloaded(self.current_language):
-                if not self.download_model(self.current_language):
-                    raise Exception(f"Не удалось загрузить модель для языка {self.current_language}")
+            # Проверяем модель (пакет, целостность) и при необходимости скачиваем
+            if not self.prepare_model(self.current_language):
+                raise Exception(f"Не удалось загрузить модель для языка {self.current_language}")
             
             # Загружаем модель из локального пути
             model_path = self.get_model_path(self.current_language)
-            self.model = pipeline(
-                "audio-classification",
-                model=model_path,
-                device=self.device
-            )
-            logger.info(f"Модель успешно загружена из {model_path}")
+            if self.mmap_weights and self.device == "cpu":
+                self.pipeline = self._load_mmap_pipeline(model_path)
+            else:
+                self.pipeline = pipeline(
+                    "audio-classification",
+                    model=model_path,
+                    device=self.device
+                )
+            self.model = self._wrap_backend(self.pipeline)
+            logger.info(f"Модель успешно загружена из {model_path} (бэкенд: {self.backend})")
             return True
             
         except Exception as e:
             logger.error(f"Ошибка при загрузке модели: {e}")
             return False
+
+    def ensure_safetensors(self, model_path):
+        """Однократное преобразование весов модели в формат safetensors"""
+        safetensors_path = os.path.join(model_path, SAFE_WEIGHTS_NAME)
+        if not os.path.exists(safetensors_path):
+            logger.info(f"Преобразование весов {model_path} в safetensors...")
+            model = AutoModelForAudioClassification.from_pretrained(model_path)
+            model.save_pretrained(model_path, safe_serialization=True)
+        return safetensors_path
+
+    def _load_mmap_pipeline(self, model_path):
+        """Сборка pipeline из модели, веса которой отображены в память из safetensors"""
+        safetensors_path = self.ensure_safetensors(model_path)
+        audio_pipeline = self._pipeline_from_tensors(model_path, mmap_safetensors(safetensors_path), safetensors_path)
+        logger.info(f"Веса модели отображены в память из {safetensors_path}")
+        return audio_pipeline
+
+    def load_shared_weights(self, handle):
+        """Подключение модели к весам в разделяемой памяти (см. model/shared_weights.py)
+
+        Веса не копируются и доступны только для чтения; используется в процессах
+        анализа вместо load_model.
+        """
+        from .shared_weights import attach_shared_weights
+
+        tensors = attach_shared_weights(handle)
+        self.pipeline = self._pipeline_from_tensors(handle['model_path'], tensors, handle['name'])
+        self.model = self._wrap_backend(self.pipeline)
+        self.current_language = handle['language']
+        logger.info(f"Модель подключена к разделяемым весам {handle['name']} (бэкенд: {self.backend})")
+        return self.model
+
+    def _pipeline_from_tensors(self, model_path, tensors, source):
+        """Сборка pipeline из готовых тензоров весов (без копирования)"""
+        config = AutoConfig.from_pretrained(model_path)
+        # Модель создается без выделения памяти под веса, затем параметры
+        # заменяются переданными тензорами
+        with torch.device("meta"):
+            model = AutoModelForAudioClassification.from_config(config)
+        missing, unexpected = model.load_state_dict(tensors, strict=False, assign=True)
+        if unexpected:
+            logger.debug("Лишние тензоры в %s: %s", source, unexpected)
+        not_loaded = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+                      if tensor.is_meta]
+        if missing or not_loaded:
+            raise RuntimeError(f"В {source} нет тензоров: {missing or not_loaded}")
+        model.eval()
+        feature_extractor = AutoFeatureExtractor.from_pretrained(model_path)
+        return pipeline(
+            "audio-classification",
+            model=model,
+            feature_extractor=feature_extractor,
+            device=self.device
+        )
+
+    def load_student_model(self, language=None):
+        """Загрузка модели-ученика (см. model/distill.py) для каскадного режима
+
+        Returns:
+            Классификатор с интерфейсом pipeline или None, если ученик не обучен
+        """
+        student_path = self.get_student_path(language or self.current_language)
+        if not os.path.exists(os.path.join(student_path, CONFIG_NAME)):
+            logger.warning(f"Модель-ученик не найдена в {student_path}")
+            return None
+        try:
+            student_pipeline = pipeline(
+                "audio-classification",
+                model=student_path,
+                device=self.device
+            )
+            logger.info(f"Модель-ученик загружена из {student_path}")
+            return self._wrap_backend(student_pipeline)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке модели-ученика: {e}")
+            return None
+
+    def _wrap_backend(self, audio_pipeline):
+        """Обертка загруженного pipeline в выбранный бэкенд инференса"""
+        if self.backend == "direct":
+            return DirectAudioClassifier.from_pipeline(audio_pipeline)
+        return audio_pipeline
+
+    def set_backend(self, backend):
+        """Смена бэкенда инференса без повторной загрузки весов"""
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд инференса: {backend}")
+        self.backend = backend
+        if self.pipeline is not None:
+            self.model = self._wrap_backend(self.pipeline)
+        return self.model
     
     def get_model(self, language=None):
         """Получить загруженную модель"""
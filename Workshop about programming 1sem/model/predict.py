@@ -1,33 +1,113 @@
 import logging
 from .model_loader import EmotionModelLoader
+from .runtime_profile import load_runtime_profile, apply_thread_settings
+from .memory_budget import get_memory_budget, is_out_of_memory, estimate_window_bytes
+from .backends import DirectAudioClassifier
+from .embedding_cache import softmax
+from .window_memo import WindowMemo
+from .fingerprint_cache import FingerprintCache
+from audio.ingest import audio_digest
+from log_config import HotPathLog
 import numpy as np
 
 logger = logging.getLogger(__name__)
+# Окно тишины для прогрева модели в режиме бюджета памяти (2 сек при 16 кГц)
+WARM_UP_SAMPLES = 32000
+hot_log = HotPathLog(logger)
 
 class EmotionPredictor:
-    def __init__(self):
-        self.model_loader = EmotionModelLoader()
+    def __init__(self, cascade_threshold=None, embedding_cache=None, fingerprint_cache=None):
+        """
+        Args:
+            cascade_threshold (float): Включить каскад: окна, где уверенность модели-ученика
+                ниже порога, передаются полной модели
+            embedding_cache: EmbeddingCache - сохранять эмбеддинги и логиты окон, повторный
+                анализ той же записи пересчитывает только оценки (каскад при этом не используется)
+            fingerprint_cache: FingerprintCache - окна, почти совпадающие по спектру с уже
+                проанализированными (в любых записях), не передаются модели
+        """
+        self.model_loader = EmotionModelLoader.shared()
         self.model = None
+        self.student_model = None
+        self.cascade_threshold = cascade_threshold
+        self.cascade_stats = {'windows': 0, 'escalated': 0}
+        self.batch_size = 1
+        self.embedding_cache = embedding_cache
+        # Температура softmax при оценке по кэшированным логитам
+        self.temperature = 1.0
+        self._direct_classifier = None
+        # Предсказания окон последних записей: смена шага или окна не повторяет готовые окна
+        self.window_memo = WindowMemo()
+        self.fingerprint_cache = fingerprint_cache
+        self.memory_budget = get_memory_budget()
+        self._warmed_model = None
+        self.runtime_profile = load_runtime_profile(self.model_loader.models_dir)
+        if self.runtime_profile:
+            self.apply_runtime_profile(self.runtime_profile)
         logger.debug("EmotionPredictor initialized")
+
+    def apply_runtime_profile(self, profile):
+        """Применение профиля выполнения, подобранного командой autotune"""
+        apply_thread_settings(profile.get('intra_op_threads'), profile.get('inter_op_threads'))
+        self.batch_size = int(profile.get('batch_size', 1))
+        self.model_loader.set_backend(profile.get('backend', 'pipeline'))
+        if self.model is not None:
+            self.model = self.model_loader.model
+        logger.info("Применен профиль выполнения: потоки %s/%s, батч %d, бэкенд %s",
+                    profile.get('intra_op_threads'), profile.get('inter_op_threads'),
+                    self.batch_size, self.model_loader.backend)
         
     def initialize(self):
         """Инициализация предиктора"""
         try:
             self.model = self.model_loader.get_model()
+            if self.cascade_threshold is not None:
+                self.student_model = self.model_loader.load_student_model()
+            self._warm_up()
             logger.info("Предиктор успешно инициализирован")
         except Exception as e:
             logger.error(f"Ошибка при инициализации предиктора: {e}")
             raise
+
+    def model_id(self):
+        """Описание модели, от которого зависят предсказания (для ключей кэшей и контрольных точек)"""
+        return {
+            'language': self.model_loader.current_language,
+            'backend': self.model_loader.backend,
+            'cascade_threshold': self.cascade_threshold,
+        }
         
     def update_model_for_language(self, language):
         """Обновление модели для выбранного языка"""
         try:
             self.model = self.model_loader.get_model(language)
+            if self.cascade_threshold is not None:
+                self.student_model = self.model_loader.load_student_model(language)
+            self._warm_up()
             logger.info(f"Модель обновлена для языка: {language}")
         except Exception as e:
             logger.error(f"Ошибка при обновлении модели для языка {language}: {e}")
             raise
         
+    def _warm_up(self):
+        """Прогон окна тишины через модель в режиме бюджета памяти
+
+        Первый вызов модели разово выделяет рабочую память (сотни МБ), которую оценка
+        на окно не учитывает. После прогрева она уже входит в RSS, и батчи и буферы
+        чтения подбираются от действительно свободной памяти.
+        """
+        if self.memory_budget is None or self.model is self._warmed_model:
+            return
+        window = np.zeros(WARM_UP_SAMPLES, dtype=np.float32)
+        try:
+            self.model(window)
+            if self.student_model is not None:
+                self.student_model([window], batch_size=1)
+        except Exception as e:
+            logger.warning(f"Прогрев модели не выполнен: {e}")
+            return
+        self._warmed_model = self.model
+
     def normalize_emotion_label(self, label):
         """Нормализация метки эмоции"""
         label = label.lower().strip()
@@ -53,6 +133,71 @@ class EmotionPredictor:
         }
         return emotion_map.get(label, label)
 
+    def _classify(self, segments, batch_size=1, sample_rate=16000):
+        """Сырые предсказания для списка окон (через кэш отпечатков и каскад, если они включены)"""
+        if self.fingerprint_cache is None:
+            return self._run_models(segments, batch_size)
+
+        cache = self.fingerprint_cache
+        namespace = FingerprintCache.namespace(self.model_id(), len(segments[0]), sample_rate)
+        fingerprints = [cache.fingerprint(segment, sample_rate) for segment in segments]
+        predictions = [cache.get(namespace, fingerprint) for fingerprint in fingerprints]
+        missing = [i for i, window_predictions in enumerate(predictions) if window_predictions is None]
+        if missing:
+            computed = self._run_models([segments[i] for i in missing], batch_size)
+            for i, window_predictions in zip(missing, computed):
+                predictions[i] = window_predictions
+                cache.put(namespace, fingerprints[i], window_predictions)
+        return predictions
+
+    def _run_models(self, segments, batch_size=1):
+        """Сырые предсказания модели для списка окон (через каскад, если он включен)"""
+        if self.student_model is None:
+            if len(segments) == 1:
+                return [self.model(segments[0])]
+            return self.model(segments, batch_size=batch_size)
+
+        predictions = self.student_model(segments, batch_size=batch_size)
+        uncertain = [
+            i for i, window_predictions in enumerate(predictions)
+            if window_predictions[0]['score'] < self.cascade_threshold
+        ]
+        if uncertain:
+            escalated = self.model([segments[i] for i in uncertain], batch_size=batch_size)
+            for i, window_predictions in zip(uncertain, escalated):
+                predictions[i] = window_predictions
+        self.cascade_stats['windows'] += len(segments)
+        self.cascade_stats['escalated'] += len(uncertain)
+        return predictions
+
+    def _normalize_predictions(self, predictions):
+        """Нормализация меток одного окна, объединение одинаковых и сортировка"""
+        log_window = hot_log.enabled()
+        if log_window:
+            logger.debug("Сырые предсказания от модели: %s", predictions)
+        
+        # Нормализуем метки эмоций и объединяем одинаковые
+        normalized_predictions = {}
+        for pred in predictions:
+            norm_label = self.normalize_emotion_label(pred['label'])
+            if log_window:
+                logger.debug("Нормализация метки: %s -> %s", pred['label'], norm_label)
+            if norm_label not in normalized_predictions or pred['score'] > normalized_predictions[norm_label]['score']:
+                normalized_predictions[norm_label] = {
+                    'label': norm_label,
+                    'score': pred['score']
+                }
+        
+        # Сортируем предсказания по уверенности
+        sorted_predictions = sorted(normalized_predictions.values(), key=lambda x: x['score'], reverse=True)
+        
+        if log_window:
+            logger.debug("Нормализованные предсказания: %s", sorted_predictions)
+            # Итог по всей шкале пишется один раз в get_emotion_timeline
+            logger.debug("Успешно определены эмоции: %s (%.2f)",
+                         sorted_predictions[0]['label'], sorted_predictions[0]['score'])
+        return sorted_predictions
+
     def predict_emotion(self, audio_data, sample_rate):
         """Предсказание эмоций из аудио"""
         if self.model is None:
@@ -64,64 +209,310 @@ class EmotionPredictor:
                 raise ValueError("Получены пустые аудио данные")
                 
             # Получаем предсказания модели
-            predictions = self.model(audio_data)
-            logger.debug(f"Сырые предсказания от модели: {predictions}")
-            
-            # Нормализуем метки эмоций и объединяем одинаковые
-            normalized_predictions = {}
-            for pred in predictions:
-                norm_label = self.normalize_emotion_label(pred['label'])
-                logger.debug(f"Нормализация метки: {pred['label']} -> {norm_label}")
-                if norm_label not in normalized_predictions or pred['score'] > normalized_predictions[norm_label]['score']:
-                    normalized_predictions[norm_label] = {
-                        'label': norm_label,
-                        'score': pred['score']
-                    }
-            
-            # Сортируем предсказания по уверенности
-            sorted_predictions = sorted(normalized_predictions.values(), key=lambda x: x['score'], reverse=True)
-            
-            logger.debug(f"Нормализованные предсказания: {sorted_predictions}")
-            logger.info(f"Успешно определены эмоции: {sorted_predictions[0]['label']} ({sorted_predictions[0]['score']:.2f})")
-            return sorted_predictions
+            predictions = self._classify([audio_data], sample_rate=sample_rate)[0]
+            return self._normalize_predictions(predictions)
             
         except Exception as e:
             logger.error(f"Ошибка при предсказании эмоций: {e}")
             return None
 
-    def get_emotion_timeline(self, audio_data, sample_rate, window_size=2.0, step=0.5):
-        """Получение временной шкалы эмоций"""
+    def predict_emotion_batch(self, segments, sample_rate, batch_size=8):
+        """Предсказание эмоций для списка окон за один батчевый проход модели
+
+        Returns:
+            list: Предсказания для каждого окна (None для окон с ошибкой)
+        """
+        if self.model is None:
+            logger.debug("Модель не инициализирована, выполняю инициализацию")
+            self.initialize()
+
+        if not segments:
+            return []
         try:
-            timeline = []
-            audio_length = len(audio_data) / sample_rate
-            window_samples = int(window_size * sample_rate)
-            step_samples = int(step * sample_rate)
-            
-            logger.debug(f"Анализ аудио длительностью {audio_length:.1f} сек")
-            logger.debug(f"Размер окна: {window_size} сек, шаг: {step} сек")
-            
-            total_steps = (len(audio_data) - window_samples) // step_samples
-            processed_steps = 0
-            
-            for start in range(0, len(audio_data) - window_samples, step_samples):
-                end = start + window_samples
-                audio_segment = audio_data[start:end]
-                
-                predictions = self.predict_emotion(audio_segment, sample_rate)
+            batch_predictions = self._classify(list(segments), batch_size=batch_size, sample_rate=sample_rate)
+            return [self._normalize_predictions(predictions) for predictions in batch_predictions]
+        except Exception as e:
+            if is_out_of_memory(e) and len(segments) > 1:
+                # Деградация вместо падения: батч делится пополам
+                if self.memory_budget is not None:
+                    self.memory_budget.record_oom(len(segments))
+                half = len(segments) // 2
+                logger.warning(f"Нехватка памяти на батче из {len(segments)} окон, батч делится пополам")
+                return (self.predict_emotion_batch(segments[:half], sample_rate, batch_size=half)
+                        + self.predict_emotion_batch(segments[half:], sample_rate, batch_size=half))
+            logger.error(f"Ошибка при батчевом предсказании эмоций: {e}")
+            return [None] * len(segments)
+
+    def _batch_size_for(self, window_samples):
+        """Размер батча с учетом бюджета памяти (по оценке размеров тензоров на окно)"""
+        if self.memory_budget is None or self.batch_size == 1:
+            return self.batch_size
+        if self.model is None:
+            self.initialize()
+        config = getattr(getattr(self.model, 'model', None), 'config', None)
+        return self.memory_budget.batch_size(self.batch_size, estimate_window_bytes(config, window_samples))
+
+    def iter_emotion_timeline(self, audio_data, sample_rate, window_size=2.0, step=0.5, start_window=0):
+        """Инкрементальный расчет временной шкалы эмоций
+
+        Модель вызывается по одному батчу окон за шаг генератора, поэтому
+        вызывающий код может остановить расчет между батчами.
+
+        Args:
+            start_window (int): Номер первого окна (продолжение с контрольной точки)
+
+        Yields:
+            tuple: (новые точки шкалы, обработано окон, всего окон)
+        """
+        if self.embedding_cache is not None:
+            yield from self._iter_embedding_timeline(audio_data, sample_rate, window_size, step, start_window)
+            return
+
+        window_samples = int(window_size * sample_rate)
+        step_samples = int(step * sample_rate)
+        all_starts = range(0, len(audio_data) - window_samples, step_samples)
+        total_steps = len(all_starts)
+        starts = all_starts[start_window:]
+        processed_steps = min(start_window, total_steps)
+
+        logger.debug(f"Анализ аудио длительностью {len(audio_data) / sample_rate:.1f} сек")
+        logger.debug(f"Размер окна: {window_size} сек, шаг: {step} сек")
+
+        memo = self._memo_windows(audio_data, sample_rate)
+        batch_index = 0
+        while batch_index < len(starts):
+            batch_size = self._batch_size_for(window_samples)
+            # В батч набираются окна, которых нет в памяти; известные окна идут между ними
+            batch_starts, missing = [], []
+            while batch_index < len(starts) and len(missing) < batch_size:
+                start = starts[batch_index]
+                batch_index += 1
+                batch_starts.append(start)
+                if memo is None or (start, window_samples) not in memo:
+                    missing.append(start)
+
+            if not missing:
+                computed = []
+            elif batch_size == 1:
+                computed = [
+                    self.predict_emotion(audio_data[start:start + window_samples], sample_rate)
+                    for start in missing
+                ]
+            else:
+                computed = self.predict_emotion_batch(
+                    [audio_data[start:start + window_samples] for start in missing],
+                    sample_rate,
+                    batch_size=batch_size
+                )
+            if memo is None:
+                batch_predictions = computed
+            else:
+                for start, predictions in zip(missing, computed):
+                    if predictions:
+                        memo[(start, window_samples)] = predictions
+                batch_predictions = [memo.get((start, window_samples)) for start in batch_starts]
+                self.window_memo.hits += len(batch_starts) - len(missing)
+                self.window_memo.misses += len(missing)
+
+            points = []
+            for start, predictions in zip(batch_starts, batch_predictions):
                 if predictions:
-                    time_point = start / sample_rate
-                    timeline.append({
-                        'time': time_point,
+                    points.append({
+                        'time': start / sample_rate,
                         'emotions': predictions
                     })
-                
+
                 processed_steps += 1
                 if processed_steps % 10 == 0:  # Логируем каждый 10-й шаг
-                    logger.debug(f"Прогресс анализа: {processed_steps}/{total_steps}")
-                    
+                    logger.debug("Прогресс анализа: %d/%d", processed_steps, total_steps)
+            yield points, processed_steps, total_steps
+
+    def _memo_windows(self, audio_data, sample_rate):
+        """Предсказания уже рассчитанных окон этой записи (None, если память окон отключена)"""
+        if self.window_memo is None or len(audio_data) == 0:
+            return None
+        key = WindowMemo.recording_key(audio_digest(audio_data), sample_rate, self.model_id())
+        return self.window_memo.recording(key)
+
+    def embedding_model_id(self):
+        """Модель, от которой зависят эмбеддинги (без бэкенда и каскада)"""
+        language = self.model_loader.current_language
+        return {'language': language, 'model': self.model_loader.language_models.get(language)}
+
+    def _embedding_classifier(self):
+        """Прямой классификатор полной модели для извлечения эмбеддингов"""
+        if self.model is None:
+            self.initialize()
+        if isinstance(self.model, DirectAudioClassifier):
+            return self.model
+        pipeline = self.model_loader.pipeline
+        if self._direct_classifier is None or self._direct_classifier.model is not pipeline.model:
+            self._direct_classifier = DirectAudioClassifier.from_pipeline(pipeline)
+        return self._direct_classifier
+
+    def embed_windows(self, segments):
+        """Эмбеддинги и логиты для списка окон одной длины: (эмбеддинги, логиты, метки)"""
+        classifier = self._embedding_classifier()
+        pooled, logits = classifier.forward_embeddings(list(segments))
+        labels = [classifier.id2label[i] for i in range(logits.shape[1])]
+        return pooled, logits, labels
+
+    def predictions_from_logits(self, logits, labels, temperature=None):
+        """Нормализованные предсказания окон по логитам (как у модели, но без ее прогона)"""
+        probabilities = softmax(logits, self.temperature if temperature is None else temperature)
+        return [
+            self._normalize_predictions([{'label': label, 'score': float(score)}
+                                         for label, score in zip(labels, row)])
+            for row in probabilities
+        ]
+
+    def rescore(self, cached, head=None, temperature=None, labels=None):
+        """Временная шкала по кэшированным эмбеддингам без прогона wav2vec2
+
+        Args:
+            cached: CachedEmbeddings
+            head: Другая голова: функция эмбеддинги (окна, размер) -> логиты (окна, метки);
+                по умолчанию сохраненные логиты модели
+            temperature (float): Температура softmax (по умолчанию self.temperature)
+            labels (list): Метки выходов head (по умолчанию метки модели)
+        """
+        logits = cached.logits if head is None else head(np.asarray(cached.pooled))
+        predictions = self.predictions_from_logits(logits, labels or cached.labels, temperature)
+        return [{'time': time_point, 'emotions': window_predictions}
+                for time_point, window_predictions in zip(cached.times(), predictions)]
+
+    def _iter_embedding_timeline(self, audio_data, sample_rate, window_size, step, start_window=0):
+        """Шкала через кэш эмбеддингов: при попадании модель не вызывается"""
+        window_samples = int(window_size * sample_rate)
+        step_samples = int(step * sample_rate)
+        starts = range(0, len(audio_data) - window_samples, step_samples)
+        total_steps = len(starts)
+        name, key = self.embedding_cache.key(audio_data, sample_rate, window_size, step, self.embedding_model_id())
+
+        cached = self.embedding_cache.load(name, key)
+        if cached is not None:
+            logger.info(f"Эмбеддинги {total_steps} окон взяты из кэша, модель не вызывается")
+            yield self.rescore(cached)[start_window:], total_steps, total_steps
+            return
+
+        pooled_batches, logits_batches, labels = [], [], None
+        complete = True
+        batch_index = start_window
+        while batch_index < total_steps:
+            batch_starts = starts[batch_index:batch_index + max(1, self._batch_size_for(window_samples))]
+            batch_index += len(batch_starts)
+            windows, batch_labels = self._embed_batch(
+                [audio_data[start:start + window_samples] for start in batch_starts]
+            )
+            labels = batch_labels or labels
+            embedded = [(start, window) for start, window in zip(batch_starts, windows) if window is not None]
+            complete = complete and len(embedded) == len(batch_starts)
+            points = []
+            if embedded:
+                pooled = np.stack([window[0] for _, window in embedded])
+                logits = np.stack([window[1] for _, window in embedded])
+                pooled_batches.append(pooled)
+                logits_batches.append(logits)
+                points = [{'time': start / sample_rate, 'emotions': predictions}
+                          for (start, _), predictions in zip(embedded, self.predictions_from_logits(logits, labels))]
+            yield points, batch_index, total_steps
+
+        # Кэш сохраняется только для полного прохода с первого окна без окон с ошибкой
+        if start_window == 0 and complete and logits_batches:
+            self.embedding_cache.save(name, key, np.concatenate(pooled_batches), np.concatenate(logits_batches),
+                                      labels, step_samples)
+
+    def _embed_batch(self, segments):
+        """embed_windows с той же деградацией, что и predict_emotion_batch
+
+        Returns:
+            tuple: (список (эмбеддинг, логиты) для каждого окна, None для окон с ошибкой; метки или None)
+        """
+        try:
+            pooled, logits, labels = self.embed_windows(segments)
+            return list(zip(pooled, logits)), labels
+        except Exception as e:
+            if is_out_of_memory(e) and len(segments) > 1:
+                if self.memory_budget is not None:
+                    self.memory_budget.record_oom(len(segments))
+                half = len(segments) // 2
+                logger.warning(f"Нехватка памяти на батче эмбеддингов из {len(segments)} окон, батч делится пополам")
+                first, first_labels = self._embed_batch(segments[:half])
+                second, second_labels = self._embed_batch(segments[half:])
+                return first + second, first_labels or second_labels
+            logger.error(f"Ошибка при извлечении эмбеддингов окон: {e}")
+            return [None] * len(segments), None
+
+    def get_emotion_timeline(self, audio_data, sample_rate, window_size=2.0, step=0.5):
+        """Получение временной шкалы эмоций"""
+        try:
+            timeline = []
+            for points, _, _ in self.iter_emotion_timeline(audio_data, sample_rate, window_size, step):
+                timeline.extend(points)
+
             logger.info(f"Временная шкала эмоций создана успешно: {len(timeline)} точек")
+            if self.student_model is not None:
+                logger.info("Каскад: полной модели передано %d из %d окон",
+                            self.cascade_stats['escalated'], self.cascade_stats['windows'])
+            if self.fingerprint_cache is not None:
+                logger.info("Кэш отпечатков: попаданий %.1f%%, в кэше %d окон",
+                            self.fingerprint_cache.hit_rate() * 100, self.fingerprint_cache.stats()['entries'])
             return timeline
             
         except Exception as e:
             logger.error(f"Ошибка при создании временной шкалы: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_multichannel_timeline(self, audio_data, sample_rate, window_size=2.0, step=0.5, batch_size=8):
+        """Получение временной шкалы эмоций для каждого канала
+
+        Окна всех каналов для одного момента времени попадают в один батч,
+        поэтому модель выполняет общий проход вместо отдельного прогона на канал.
+
+        Args:
+            audio_data: Аудио формы (сэмплы, каналы)
+            batch_size (int): Размер батча (округляется вверх до кратного числу каналов)
+
+        Returns:
+            list: Временная шкала для каждого канала
+        """
+        try:
+            if audio_data.ndim == 1:
+                return [self.get_emotion_timeline(audio_data, sample_rate, window_size, step)]
+
+            channels = audio_data.shape[1]
+            timelines = [[] for _ in range(channels)]
+            window_samples = int(window_size * sample_rate)
+            step_samples = int(step * sample_rate)
+            windows_per_batch = max(1, -(-batch_size // channels))
+
+            logger.debug("Многоканальный анализ: %d каналов, %.1f сек",
+                         channels, len(audio_data) / sample_rate)
+
+            starts = list(range(0, len(audio_data) - window_samples, step_samples))
+            for batch_index in range(0, len(starts), windows_per_batch):
+                batch_starts = starts[batch_index:batch_index + windows_per_batch]
+                segments = []
+                for start in batch_starts:
+                    window = audio_data[start:start + window_samples]
+                    segments.extend(np.ascontiguousarray(window[:, channel]) for channel in range(channels))
+
+                batch_predictions = self.predict_emotion_batch(
+                    segments, sample_rate, batch_size=len(segments)
+                )
+                for i, start in enumerate(batch_starts):
+                    for channel in range(channels):
+                        predictions = batch_predictions[i * channels + channel]
+                        if predictions:
+                            timelines[channel].append({
+                                'time': start / sample_rate,
+                                'emotions': predictions
+                            })
+
+            logger.info(f"Временные шкалы эмоций созданы для {channels} каналов: "
+                        f"{len(timelines[0])} точек на канал")
+            return timelines
+
+        except Exception as e:
+            logger.error(f"Ошибка при создании многоканальной временной шкалы: {e}")
+            return []
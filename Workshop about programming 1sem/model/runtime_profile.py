@@ -0,0 +1,71 @@
+import os
+import json
+import socket
+import platform
+import logging
+import torch
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE = "runtime_profile.json"
+
+def machine_signature():
+    """Идентификатор машины, для которой подобран профиль"""
+    return f"{socket.gethostname()}|{platform.machine()}|{os.cpu_count()}cpu|torch-{torch.__version__}"
+
+def get_profile_path(models_dir):
+    """Путь к файлу с профилями выполнения"""
+    return os.path.join(models_dir, PROFILE_FILE)
+
+def load_runtime_profile(models_dir):
+    """Загрузка профиля выполнения для текущей машины
+
+    Returns:
+        dict: Профиль (intra_op_threads, inter_op_threads, batch_size, backend) или None
+    """
+    path = get_profile_path(models_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+        profile = profiles.get('hosts', {}).get(machine_signature())
+        if profile is None:
+            logger.debug("В %s нет профиля для этой машины", path)
+        return profile
+    except Exception as e:
+        logger.error(f"Ошибка при чтении профиля выполнения {path}: {e}")
+        return None
+
+def save_runtime_profile(models_dir, profile):
+    """Сохранение профиля выполнения для текущей машины (профили других машин сохраняются)"""
+    path = get_profile_path(models_dir)
+    profiles = {'hosts': {}}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                profiles = json.load(f)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать старые профили {path}: {e}")
+    profiles.setdefault('hosts', {})[machine_signature()] = profile
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Профиль выполнения сохранен в {path}")
+    return path
+
+def apply_thread_settings(intra_op_threads=None, inter_op_threads=None):
+    """Установка количества потоков torch
+
+    Количество inter-op потоков можно задать только до начала параллельной работы,
+    поэтому ошибка при его установке не считается фатальной.
+    """
+    if intra_op_threads:
+        torch.set_num_threads(int(intra_op_threads))
+    if inter_op_threads and torch.get_num_interop_threads() != int(inter_op_threads):
+        try:
+            torch.set_num_interop_threads(int(inter_op_threads))
+        except RuntimeError as e:
+            logger.warning(f"Не удалось установить inter-op потоки ({inter_op_threads}): {e}")
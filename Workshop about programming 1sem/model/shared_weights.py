@@ -0,0 +1,147 @@
+import os
+import sys
+import mmap
+import logging
+import threading
+import warnings
+from multiprocessing import shared_memory
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Выравнивание тензоров в сегменте, байты
+SHARED_WEIGHTS_ALIGNMENT = 64
+# Каталог, в котором Linux размещает сегменты POSIX shared memory
+SHM_DIR = "/dev/shm"
+# Процессы анализа открывают сегмент как файл в SHM_DIR: это есть только в Linux
+SHARED_WEIGHTS_SUPPORTED = sys.platform.startswith("linux")
+
+
+class SharedModelWeights:
+    """Веса модели в разделяемой памяти: одна копия на все процессы анализа
+
+    Родительский процесс загружает модель языка один раз, копирует все тензоры
+    в сегмент разделяемой памяти и освобождает исходную модель. Процессы анализа
+    получают описание сегмента (handle) и собирают модель из тензоров, которые
+    смотрят прямо в сегмент, отображенный только для чтения: запись в веса приводит
+    к ошибке доступа, а не к тихой порче модели у всех процессов. Память на процесс -
+    только активации инференса.
+
+    Сегменты живут, пока не вызван close() (обычно при завершении родителя).
+    """
+
+    def __init__(self, model_loader):
+        """
+        Args:
+            model_loader: EmotionModelLoader - откуда берутся модели языков
+        """
+        if not SHARED_WEIGHTS_SUPPORTED:
+            raise OSError(f"Разделяемые веса модели поддерживаются только в Linux (платформа {sys.platform})")
+        self.model_loader = model_loader
+        self._segments = {}
+        self._creating = {}
+        self._lock = threading.Lock()
+
+    def handle(self, language=None):
+        """Описание сегмента с весами модели языка (сегмент создается при первом запросе)
+
+        Создание сегмента загружает модель, поэтому не вызывается из потока окна.
+
+        Returns:
+            dict: Имя и размер сегмента, путь к модели (конфигурация, feature extractor)
+                и положение каждого тензора; передается в процесс анализа
+        """
+        language = language or self.model_loader.current_language
+        with self._lock:
+            creating = self._creating.setdefault(language, threading.Lock())
+        # Модель загружается без self._lock: ready_handle во время загрузки не ждет
+        with creating:
+            with self._lock:
+                if language in self._segments:
+                    return self._segments[language][1]
+            segment = self._create_segment(language)
+            with self._lock:
+                self._segments[language] = segment
+            return segment[1]
+
+    def ready_handle(self, language=None):
+        """Описание уже созданного сегмента языка без ожидания (None, если его еще нет)"""
+        language = language or self.model_loader.current_language
+        with self._lock:
+            segment = self._segments.get(language)
+        return None if segment is None else segment[1]
+
+    def _create_segment(self, language):
+        from transformers import AutoModelForAudioClassification
+
+        if not self.model_loader.prepare_model(language):
+            raise RuntimeError(f"Не удалось загрузить модель для языка {language}")
+        model_path = self.model_loader.get_model_path(language)
+        model = AutoModelForAudioClassification.from_pretrained(model_path)
+        state_dict = model.state_dict()
+
+        layout, size = {}, 0
+        for name, tensor in state_dict.items():
+            size = -(-size // SHARED_WEIGHTS_ALIGNMENT) * SHARED_WEIGHTS_ALIGNMENT
+            layout[name] = (str(tensor.dtype).replace('torch.', ''), tuple(tensor.shape), size)
+            size += tensor.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            segment = torch.frombuffer(shm.buf, dtype=torch.uint8)
+            for name, tensor in state_dict.items():
+                _, shape, offset = layout[name]
+                _view(segment, tensor.dtype, shape, offset).copy_(tensor)
+            del segment
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+        del model, state_dict
+        # Родитель сам не выполняет инференс: отображение закрывается, сегмент остается
+        shm.close()
+        logger.info(f"Веса модели {language} размещены в разделяемой памяти {shm.name}: "
+                    f"{size / 2 ** 20:.0f} МБ, {len(layout)} тензоров")
+        handle = {'name': shm.name, 'size': size, 'language': language,
+                  'model_path': os.path.abspath(model_path), 'tensors': layout}
+        return shm, handle
+
+    def close(self):
+        """Удаление сегментов; подключенные процессы сохраняют свои отображения до выхода"""
+        with self._lock:
+            segments, self._segments = self._segments, {}
+        for shm, _ in segments.values():
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _view(segment, dtype, shape, offset):
+    """Тензор dtype формы shape, начинающийся с байта offset сегмента"""
+    nbytes = torch.empty(0, dtype=dtype).element_size() * int(torch.Size(shape).numel())
+    return segment[offset:offset + nbytes].view(dtype).view(shape)
+
+
+def attach_shared_weights(handle):
+    """Тензоры весов из сегмента SharedModelWeights, отображенного только для чтения
+
+    Сегмент открывается напрямую, а не через SharedMemory: так он не регистрируется
+    в resource_tracker процесса анализа и не удаляется при его завершении.
+
+    Returns:
+        dict: Имя тензора -> тензор (state_dict модели)
+    """
+    if not SHARED_WEIGHTS_SUPPORTED:
+        raise OSError(f"Разделяемые веса модели поддерживаются только в Linux (платформа {sys.platform})")
+    fd = os.open(os.path.join(SHM_DIR, handle['name'].lstrip('/')), os.O_RDONLY)
+    try:
+        buffer = mmap.mmap(fd, max(handle['size'], 1), flags=mmap.MAP_SHARED, prot=mmap.PROT_READ)
+    finally:
+        os.close(fd)
+    with warnings.catch_warnings():
+        # torch предупреждает, что буфер недоступен для записи: это и требуется
+        warnings.simplefilter("ignore", UserWarning)
+        segment = torch.frombuffer(buffer, dtype=torch.uint8)
+    return {name: _view(segment, getattr(torch, dtype), shape, offset)
+            for name, (dtype, shape, offset) in handle['tensors'].items()}
@@ -0,0 +1,41 @@
+import json
+import threading
+from collections import OrderedDict
+
+# Сколько записей хранится в памяти (вытесняются давно не использованные)
+DEFAULT_MEMO_RECORDINGS = 8
+
+
+class WindowMemo:
+    """Предсказания окон по точному положению (начало, длина в сэмплах) для последних записей
+
+    Сетки окон с разным шагом или смещением пересекаются: окна шага 1.0 с - подмножество
+    окон шага 0.5 с. Поэтому при смене параметров анализа модель вызывается только
+    для окон, которых еще не было.
+    """
+
+    def __init__(self, max_recordings=DEFAULT_MEMO_RECORDINGS):
+        self.max_recordings = max_recordings
+        self._recordings = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def recording_key(digest, sample_rate, model_id):
+        return digest, int(sample_rate), json.dumps(model_id, sort_keys=True)
+
+    def recording(self, key):
+        """Словарь {(начало, длина): предсказания} записи; запись становится последней использованной"""
+        with self._lock:
+            windows = self._recordings.pop(key, None)
+            if windows is None:
+                windows = {}
+            self._recordings[key] = windows
+            while len(self._recordings) > self.max_recordings:
+                self._recordings.popitem(last=False)
+            return windows
+
+    def clear(self):
+        with self._lock:
+            self._recordings.clear()